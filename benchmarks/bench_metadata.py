@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+bench_metadata.py — metadata engine vs the original per-line heuristics
+
+Runs on a synthetic corpus (synthetic_pdf.py, titles set in 18pt) or on a
+folder of real PDFs and prints one JSON document:
+
+  heuristics     the original guess_title/guess_authors (every pattern
+                 re-searched per line) vs the single-pass classifier, on the
+                 same first-page text
+  legacy_scan    full PyPDF2 parse + original heuristics, per PDF
+  scan           scan_metadata(): first page only, cold and warm cache,
+                 sequential and with a process pool
+  agreement      how often the new text heuristics match the old ones, and
+                 how often the final title (layout-aware) matches the
+                 embedded /Title when the PDF has one
+
+    python benchmarks/bench_metadata.py --papers 500 --pages 10
+    python benchmarks/bench_metadata.py --data-dir data/sample_papers
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+for p in (PROJECT_ROOT, Path(__file__).resolve().parent):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from synthetic_pdf import generate_corpus  # noqa: E402
+
+# --- the heuristics as they were before the single-pass engine ---------------
+LEGACY_BANNERS = [
+    r"provided proper attribution is provided",
+    r"permission to (?:use|reproduce)",
+    r"google (?:hereby )?grants permission",
+    r"arxiv:",
+    r"conference on",
+    r"proceedings of",
+]
+
+
+def legacy_is_banner(text: str) -> bool:
+    t = text.lower()
+    return any(re.search(p, t) for p in LEGACY_BANNERS)
+
+
+def legacy_title(lines: List[str]) -> Optional[str]:
+    pre_abstract = []
+    for ln in lines:
+        if re.match(r"^\s*abstract\b", ln, flags=re.I):
+            break
+        pre_abstract.append(ln)
+    candidates = []
+    for ln in pre_abstract[:20]:
+        if legacy_is_banner(ln):
+            continue
+        if re.search(r"@|university|institute|laboratory|department", ln, flags=re.I):
+            continue
+        if 3 <= len(ln.split()) <= 20:
+            candidates.append(ln)
+    if not candidates:
+        return None
+
+    def title_score(s: str):
+        words = s.split()
+        tc = sum(1 for w in words if re.match(r"^[A-Z][a-zA-Z0-9\-]*$", w))
+        return (tc / max(1, len(words)), len(s))
+
+    candidates.sort(key=title_score, reverse=True)
+    return candidates[0]
+
+
+def legacy_authors(lines: List[str]) -> Optional[str]:
+    for ln in lines[:30]:
+        if legacy_is_banner(ln):
+            continue
+        if re.search(r"@|university|institute|laboratory|department", ln, flags=re.I):
+            continue
+        if re.search(r"\bet al\.?\b", ln, flags=re.I):
+            return ln
+        parts = [p.strip() for p in ln.split(",") if p.strip()]
+        if 2 <= len(parts) <= 12:
+            caps_like = sum(1 for p in parts if re.search(r"^[A-Z][a-z]+(?: [A-Z][a-z]+)*$", p))
+            if caps_like >= max(2, len(parts) // 2):
+                return ln
+    return None
+
+
+def legacy_lines(raw: str) -> List[str]:
+    raw = re.sub(r"[ \t]+", " ", raw)
+    raw = re.sub(r"\n{3,}", "\n\n", raw)
+    return [ln for ln in (ln.strip() for ln in raw.splitlines()) if ln]
+
+
+def legacy_metadata(pdf_path: Path) -> dict:
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(str(pdf_path))
+    pages = [(page.extract_text() or "") for page in reader.pages]
+    lines = legacy_lines(pages[0] if pages else "")
+    title = legacy_title(lines)
+    if not title:
+        title = getattr(reader.metadata or {}, "title", None)
+    return {"title": title, "authors": legacy_authors(lines)}
+
+
+# ------------------------------------------------------------------------------
+def timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def rate(n: int, seconds: float) -> dict:
+    return {"seconds": round(seconds, 4), "per_s": round(n / seconds, 1) if seconds else None}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--papers", type=int, default=200)
+    ap.add_argument("--pages", type=int, default=10)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--data-dir", type=Path, default=None, help="benchmark these PDFs instead of a synthetic corpus")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes for the parallel scan")
+    ap.add_argument("--repeat", type=int, default=20, help="heuristics-only passes over the first pages")
+    ap.add_argument("--out", type=Path, default=None, help="also write the JSON result here")
+    args = ap.parse_args()
+
+    tmp = tempfile.TemporaryDirectory(prefix="rgpt-bench-meta-")
+    work = Path(tmp.name)
+    os.environ["RGPT_CACHE_DIR"] = str(work / "cache")  # read by src.config at import time
+    from src import cache_utils
+    from src.metadata_utils import (
+        classify_lines, extract_metadata, first_page_lines, guess_authors, guess_title, scan_metadata,
+    )
+    from src.pdf_utils import extract_first_page
+
+    if args.data_dir:
+        pdfs = sorted(args.data_dir.glob("*.pdf"))
+    else:
+        pdfs = generate_corpus(work / "corpus", args.papers, args.pages, seed=args.seed)
+    print(f"Metadata benchmark: {len(pdfs)} PDFs", file=sys.stderr)
+    result = {"benchmark": "metadata", "papers": len(pdfs), "args": {k: str(v) for k, v in vars(args).items()}}
+
+    legacy = {}
+    result["legacy_scan"] = rate(len(pdfs), timed(lambda: legacy.update((p, legacy_metadata(p)) for p in pdfs)))
+
+    scanned = {}
+    result["scan"] = {
+        "cold": rate(len(pdfs), timed(lambda: scanned.update(scan_metadata(pdfs)))),
+        "warm": rate(len(pdfs), timed(lambda: list(scan_metadata(pdfs)))),
+    }
+    # Fresh cache for the pooled run (forked workers inherit the module-level cache).
+    os.environ["RGPT_CACHE_DIR"] = str(work / "cache_pool")
+    cache_utils._extraction_cache = cache_utils.ExtractionCache(work / "cache_pool" / "extraction")
+    result["scan"][f"cold_workers_{args.workers}"] = rate(
+        len(pdfs), timed(lambda: list(scan_metadata(pdfs, workers=args.workers)))
+    )
+
+    records = [extract_first_page(p) for p in pdfs]
+    pages = [legacy_lines(r["first_page"]) for r in records]
+
+    def old_pass():
+        for r in records:
+            lines = legacy_lines(r["first_page"])
+            legacy_title(lines)
+            legacy_authors(lines)
+
+    def new_pass():
+        for r in records:
+            lines = first_page_lines(r["first_page"])
+            kinds = classify_lines(lines)
+            guess_title(lines, kinds)
+            guess_authors(lines, kinds)
+
+    n = len(pages) * args.repeat
+    old_s = timed(lambda: [old_pass() for _ in range(args.repeat)])
+    new_s = timed(lambda: [new_pass() for _ in range(args.repeat)])
+    result["heuristics"] = {
+        "legacy": rate(n, old_s),
+        "single_pass": rate(n, new_s),
+        "speedup": round(old_s / new_s, 2) if new_s else None,
+    }
+
+    same_title = sum(legacy_title(lines) == guess_title(lines) for lines in pages)
+    same_authors = sum(legacy_authors(lines) == guess_authors(lines) for lines in pages)
+    final = [extract_metadata(p) for p in pdfs]
+    truth = [(r.get("embedded_title") or "").strip() for r in records]
+    with_truth = [i for i, t in enumerate(truth) if t]
+    result["agreement"] = {
+        "text_title_same_as_legacy": round(same_title / len(pages), 4) if pages else None,
+        "authors_same_as_legacy": round(same_authors / len(pages), 4) if pages else None,
+        "scan_same_as_full_extract": sum(scanned.get(p) == m for p, m in zip(pdfs, final)),
+        "with_embedded_title": len(with_truth),
+        "title_matches_embedded": {
+            "legacy": sum((legacy[pdfs[i]]["title"] or "").strip() == truth[i] for i in with_truth),
+            "layout_aware": sum((final[i]["title"] or "").strip() == truth[i] for i in with_truth),
+        },
+    }
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
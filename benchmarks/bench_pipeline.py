@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+bench_pipeline.py — offline end-to-end pipeline benchmark
+
+Generates a synthetic PDF corpus (synthetic_pdf.py), starts the local stub
+LLM server (stub_llm.py) and measures every stage with no API key or
+network access:
+
+  extract        PyPDF2 extraction, uncached and from the extraction cache
+  chunk          character and token chunkers over the extracted pages
+  index          building the persistent corpus TF-IDF index
+  retrieval      single-query latency and batched throughput
+  end_to_end     run_batch against the stub (parse pool + LLM threads)
+
+Each stage reports throughput, latency p50/p95/p99 and peak traced Python
+memory, as one JSON document tagged with the git commit. Pass --baseline
+with an earlier result file to print per-stage changes (exit code 1 if a
+stage slowed down by more than --max-regression).
+
+    python benchmarks/bench_pipeline.py --papers 40 --pages 12 --out bench.json
+    python benchmarks/bench_pipeline.py --papers 40 --pages 12 --baseline bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+for p in (PROJECT_ROOT, Path(__file__).resolve().parent):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from stub_llm import StubLLM  # noqa: E402
+from synthetic_pdf import generate_corpus  # noqa: E402
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=10,
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def latency_summary(seconds: Sequence[float]) -> Dict[str, float]:
+    from src.profiling import percentile
+
+    ms = sorted(s * 1000.0 for s in seconds)
+    return {f"p{q}": round(percentile(ms, q), 3) for q in (50, 95, 99)} | {"max": round(ms[-1], 3) if ms else 0.0}
+
+
+def peak_memory_mb(fn: Callable[[], object]) -> float:
+    """Peak traced Python allocations while fn runs (separate pass, so timings stay untraced)."""
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+    finally:
+        tracemalloc.stop()
+
+
+def per_item(name: str, fn: Callable, items: Sequence, unit_counts: Optional[Sequence[int]] = None,
+             unit: str = "items", memory: bool = True) -> dict:
+    """Time fn(item) for every item; throughput in items/s and, if given, units/s."""
+    lat: List[float] = []
+    t0 = time.perf_counter()
+    for item in items:
+        t = time.perf_counter()
+        fn(item)
+        lat.append(time.perf_counter() - t)
+    total = time.perf_counter() - t0
+    result = {
+        "n": len(items),
+        "seconds": round(total, 4),
+        "per_s": round(len(items) / total, 2) if total else None,
+        "latency_ms": latency_summary(lat),
+    }
+    if unit_counts is not None:
+        result[f"{unit}_per_s"] = round(sum(unit_counts) / total, 2) if total else None
+    if memory:
+        result["peak_mb"] = peak_memory_mb(lambda: [fn(item) for item in items])
+    print(f"  {name:<18} {result['seconds']:>8.3f}s  p50={result['latency_ms']['p50']:.2f}ms", file=sys.stderr)
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--papers", type=int, default=20)
+    ap.add_argument("--pages", type=int, default=10)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="end-to-end parse processes")
+    ap.add_argument("--llm-concurrency", type=int, default=4)
+    ap.add_argument("--latency-ms", type=float, default=50.0, help="stub LLM latency per request")
+    ap.add_argument("--jitter-ms", type=float, default=10.0)
+    ap.add_argument("--rpm", type=float, default=None, help="stub rate limit (429 above it)")
+    ap.add_argument("--extractor", default="pypdf2", help="PDF text backend (pypdf2, pypdf, pymupdf)")
+    ap.add_argument("--page-workers", type=int, default=1, help="page-range extraction processes for large PDFs")
+    ap.add_argument("--dedup-threshold", type=float, default=0.0, help="near-duplicate reuse in the end-to-end run (0 = off)")
+    ap.add_argument("--skip-e2e", action="store_true", help="only the CPU stages")
+    ap.add_argument("--no-memory", action="store_true", help="skip the traced peak-memory passes")
+    ap.add_argument("--work-dir", type=Path, default=None, help="keep the corpus and caches here (default: temp dir)")
+    ap.add_argument("--out", type=Path, default=None, help="also write the JSON result here")
+    ap.add_argument("--baseline", type=Path, default=None, help="earlier result JSON to compare against")
+    ap.add_argument("--max-regression", type=float, default=0.2, help="allowed slowdown per stage with --baseline")
+    args = ap.parse_args()
+    memory = not args.no_memory
+
+    tmp = tempfile.TemporaryDirectory(prefix="rgpt-bench-") if args.work_dir is None else None
+    work = Path(tmp.name) if tmp else args.work_dir
+    work.mkdir(parents=True, exist_ok=True)
+
+    stub = StubLLM(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, rpm=args.rpm, seed=args.seed).start()
+    # src.config reads these at import time, so set them before importing the pipeline.
+    os.environ.update({
+        "RGPT_CACHE_DIR": str(work / "cache"),
+        "RGPT_MANIFEST_PATH": str(work / "run_manifest.sqlite"),
+        "MISTRAL_SERVER_URL": stub.url,
+        "MISTRAL_API_KEY": "stub",
+    })
+    from src.corpus_index import CorpusIndex
+    from src.llm_client import DEFAULT_MODEL, set_cache_mode
+    from src.pdf_utils import ExtractionSettings, extract_pdf, set_extraction
+    from src.pipeline import OutputDirs, PipelineOptions, run_batch
+    from src.text_utils import chunk_text, chunk_tokens_for_model, clean_text, iter_chunks
+
+    set_extraction(ExtractionSettings(args.extractor, args.page_workers))
+    stages: Dict[str, dict] = {}
+    print(f"Benchmark corpus: {args.papers} papers x {args.pages} pages in {work}", file=sys.stderr)
+    t0 = time.perf_counter()
+    pdfs = generate_corpus(work / "corpus", args.papers, args.pages, seed=args.seed)
+    stages["generate"] = {
+        "seconds": round(time.perf_counter() - t0, 4),
+        "bytes": sum(p.stat().st_size for p in pdfs),
+    }
+
+    page_counts = [args.pages] * len(pdfs)
+    stages["extract"] = per_item(
+        "extract", lambda p: extract_pdf(p, use_cache=False), pdfs, page_counts, "pages", memory,
+    )
+    for p in pdfs:
+        extract_pdf(p)  # warm the extraction cache
+    stages["extract_cached"] = per_item("extract_cached", extract_pdf, pdfs, page_counts, "pages", memory)
+
+    pages = [extract_pdf(p)["pages"] for p in pdfs]
+    max_tokens = chunk_tokens_for_model(DEFAULT_MODEL)
+    stages["chunk_chars"] = per_item(
+        "chunk_chars", lambda pg: chunk_text(clean_text("\n\n".join(pg)), max_chars=1500, overlap=150),
+        pages, page_counts, "pages", memory,
+    )
+    stages["chunk_tokens"] = per_item(
+        "chunk_tokens", lambda pg: list(iter_chunks(pg, max_tokens=max_tokens, overlap_tokens=max_tokens // 10)),
+        pages, page_counts, "pages", memory,
+    )
+
+    index_root = work / "index"
+    t0 = time.perf_counter()
+    corpus = CorpusIndex.load(index_root)
+    corpus.update(pdfs)
+    index_s = time.perf_counter() - t0
+    stages["index"] = {
+        "seconds": round(index_s, 4),
+        "chunks": len(corpus),
+        "chunks_per_s": round(len(corpus) / index_s, 2) if index_s else None,
+    }
+    if memory:
+        stages["index"]["peak_mb"] = peak_memory_mb(lambda: CorpusIndex.load(work / "index_mem").update(pdfs))
+    print(f"  {'index':<18} {index_s:>8.3f}s  {len(corpus)} chunks", file=sys.stderr)
+
+    rng = np.random.default_rng(args.seed + 1)
+    words = sorted({w for pg in pages[:5] for w in " ".join(pg).lower().split() if w.isalpha() and len(w) > 4})
+    queries = [" ".join(rng.choice(words, size=4)) for _ in range(args.queries)]
+    corpus = CorpusIndex.load(index_root)  # fresh, memory-mapped, like a new process would see it
+    stages["retrieval"] = per_item("retrieval", lambda q: corpus.search(q, k=5), queries, memory=memory)
+    t0 = time.perf_counter()
+    corpus.search_batch(queries, k=5)
+    batch_s = time.perf_counter() - t0
+    stages["retrieval"]["batch_qps"] = round(len(queries) / batch_s, 1) if batch_s else None
+
+    if not args.skip_e2e:
+        set_cache_mode("off")  # every request goes to the stub
+        out = work / "results"
+        dirs = OutputDirs(out / "summaries", out / "analyses", out / "metadata")
+        for d in (dirs.summaries, dirs.analyses, dirs.metadata):
+            d.mkdir(parents=True, exist_ok=True)
+        t0 = time.perf_counter()
+        results = run_batch(
+            pdfs, "What problem does this paper solve?", dirs, "stub",
+            parse_workers=max(1, args.workers), llm_concurrency=args.llm_concurrency,
+            options=PipelineOptions(
+                extractor=args.extractor, page_workers=args.page_workers, dedup_threshold=args.dedup_threshold,
+            ),
+        )
+        e2e_s = time.perf_counter() - t0
+        stages["end_to_end"] = {
+            "n": len(results),
+            "failed": len(pdfs) - len(results),
+            "seconds": round(e2e_s, 4),
+            "papers_per_s": round(len(results) / e2e_s, 3) if e2e_s else None,
+            "latency_ms": latency_summary([r.duration for r in results]),
+            "llm_requests": stub.stats["requests"],
+            "duplicates_reused": sum(r.duplicate_of is not None for r in results),
+            "llm_rate_limited": stub.stats["rate_limited"],
+            "workers": args.workers,
+            "llm_concurrency": args.llm_concurrency,
+        }
+        print(f"  {'end_to_end':<18} {e2e_s:>8.3f}s  {len(results)}/{len(pdfs)} papers", file=sys.stderr)
+    stub.stop()
+
+    usage_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    usage_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    result = {
+        "benchmark": "pipeline",
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        },
+        "stages": stages,
+        "max_rss_mb": {"self": round(usage_self / 1024, 1), "children": round(usage_children / 1024, 1)},
+    }
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+    if tmp:
+        tmp.cleanup()
+
+    if args.baseline:
+        sys.exit(compare(json.loads(args.baseline.read_text(encoding="utf-8")), result, args.max_regression))
+
+
+def compare(baseline: dict, current: dict, max_regression: float) -> int:
+    """Print per-stage wall-time changes; 1 if any stage regressed beyond max_regression."""
+    failed = False
+    print(f"\nvs baseline {baseline.get('meta', {}).get('commit')}:", file=sys.stderr)
+    old_args = baseline.get("meta", {}).get("args", {})
+    new_args = current["meta"]["args"]
+    differs = [k for k in ("papers", "pages", "queries", "workers", "llm_concurrency", "latency_ms", "extractor", "page_workers", "dedup_threshold") if old_args.get(k) != new_args.get(k)]
+    if differs:
+        print(f"  note: corpus/settings differ ({', '.join(differs)}); timings are not directly comparable", file=sys.stderr)
+    for name, stage in current["stages"].items():
+        old = baseline.get("stages", {}).get(name, {}).get("seconds")
+        new = stage.get("seconds")
+        if not old or new is None:
+            continue
+        change = new / old - 1.0
+        flag = "REGRESSION" if change > max_regression else ""
+        failed |= bool(flag)
+        print(f"  {name:<18} {old:>8.3f}s -> {new:>8.3f}s  {change:+7.1%} {flag}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    main()
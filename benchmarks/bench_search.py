@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+bench_search.py — TF-IDF retrieval benchmark
+
+Compares the original per-query search (dense cosine_similarity row + full
+argsort) against indexer.search_batch (one sparse product per query block +
+argpartition) on a synthetic corpus. No PDFs or API key needed.
+
+    python benchmarks/bench_search.py --chunks 50000 --queries 500 --k 5
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.indexer import build_index, search_batch  # noqa: E402
+
+
+def synthetic_chunks(n_chunks: int, words_per_chunk: int, vocab_size: int, seed: int):
+    """Zipf-distributed pseudo-words, roughly the shape of real paper text."""
+    rng = np.random.default_rng(seed)
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    ranks = np.minimum(rng.zipf(1.2, size=(n_chunks, words_per_chunk)), vocab_size) - 1
+    return [(f"paper{i // 40} [chunk {i % 40 + 1}]", " ".join(vocab[r] for r in row)) for i, row in enumerate(ranks)], vocab
+
+
+def legacy_search(index, query, k):
+    """The pre-batching implementation, kept here as the baseline."""
+    qv = index.vectorizer.transform([query])
+    sims = cosine_similarity(qv, index.matrix)[0]
+    top_idx = sims.argsort()[-k:][::-1]
+    return [(float(sims[i]), index.docs[i]) for i in top_idx]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--chunks", type=int, default=20000)
+    ap.add_argument("--words", type=int, default=200, help="words per chunk")
+    ap.add_argument("--vocab", type=int, default=30000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    docs, vocab = synthetic_chunks(args.chunks, args.words, args.vocab, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = [" ".join(rng.choice(vocab[:5000], size=6)) for _ in range(args.queries)]
+
+    t0 = time.perf_counter()
+    index = build_index(docs)
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    legacy = [legacy_search(index, q, args.k) for q in queries]
+    legacy_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batched = search_batch(index, queries, k=args.k)
+    batched_s = time.perf_counter() - t0
+
+    # Same top-k sets (order may differ only between exactly tied scores)
+    agree = sum(
+        {lbl for _s, (lbl, _t) in a} == {lbl for _s, (lbl, _t) in b}
+        for a, b in zip(legacy, batched)
+    ) / max(1, len(queries))
+
+    result = {
+        "benchmark": "search",
+        "chunks": args.chunks,
+        "queries": args.queries,
+        "k": args.k,
+        "build_s": round(build_s, 4),
+        "legacy_s": round(legacy_s, 4),
+        "batched_s": round(batched_s, 4),
+        "legacy_qps": round(args.queries / legacy_s, 1),
+        "batched_qps": round(args.queries / batched_s, 1),
+        "speedup": round(legacy_s / batched_s, 2),
+        "topk_agreement": round(agree, 4),
+    }
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py — CLI start-up time and import cost
+
+Runs each scenario in a fresh interpreter with `python -X importtime`, in an
+empty working directory, and prints one JSON document:
+
+  wall_ms        process wall time, median of --repeat runs
+  import_ms      sum of the per-module self times reported by -X importtime
+  modules        number of modules imported
+  top            the slowest top-level imports (cumulative ms)
+  heavy          which of numpy/scipy/sklearn/mistralai/httpx/PyPDF2 were loaded
+  files_created  anything the process wrote to the working directory
+
+Scenarios: `main.py --help`, a usage error, `import main`, and importing the
+pipeline and server modules (which still pay numpy at import, but not
+scikit-learn or the Mistral SDK). Exit code 1 when a CLI scenario loads a
+heavy module, writes a file or exceeds --max-ms, or, with --baseline, when
+a scenario's import time grew by more than --max-regression.
+
+    python benchmarks/bench_startup.py --out startup.json
+    python benchmarks/bench_startup.py --baseline startup.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+MAIN = PROJECT_ROOT / "main.py"
+HEAVY = ("numpy", "scipy", "sklearn", "mistralai", "httpx", "PyPDF2")
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _import(module: str) -> List[str]:
+    return ["-c", f"import sys; sys.path.insert(0, {str(PROJECT_ROOT)!r}); import {module}"]
+
+
+# name -> (interpreter arguments, must stay light)
+SCENARIOS = {
+    "help": ([str(MAIN), "--help"], True),
+    "usage_error": ([str(MAIN), "search"], True),
+    "import_main": (_import("main"), True),
+    "import_pipeline": (_import("src.pipeline"), False),
+    "import_server": (_import("src.server"), False),
+}
+
+
+def parse_importtime(stderr: str) -> List[dict]:
+    rows = []
+    for m in _LINE.finditer(stderr):
+        rows.append({
+            "module": m.group(4), "self_us": int(m.group(1)), "cumulative_us": int(m.group(2)),
+            "depth": len(m.group(3)) // 2,
+        })
+    return rows
+
+
+def baseline_modules() -> set:
+    """Modules every interpreter imports before running anything (site, encodings, ...)."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True)
+    return {r["module"] for r in parse_importtime(out.stderr)}
+
+
+def run_scenario(argv: List[str], repeat: int, startup: set, top: int) -> dict:
+    walls: List[float] = []
+    rows: List[dict] = []
+    created: List[str] = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix="rgpt-bench-startup-") as cwd:
+            t0 = time.perf_counter()
+            out = subprocess.run([sys.executable, "-X", "importtime", *argv], cwd=cwd, capture_output=True, text=True)
+            walls.append(time.perf_counter() - t0)
+            rows = [r for r in parse_importtime(out.stderr) if r["module"] not in startup]
+            created = sorted(str(p.relative_to(cwd)) for p in Path(cwd).rglob("*"))
+    loaded = {r["module"] for r in rows}
+    top_level = sorted((r for r in rows if r["depth"] == 0), key=lambda r: r["cumulative_us"], reverse=True)
+    return {
+        "wall_ms": round(statistics.median(walls) * 1000, 1),
+        "import_ms": round(sum(r["self_us"] for r in rows) / 1000, 1),
+        "modules": len(rows),
+        "top": {r["module"]: round(r["cumulative_us"] / 1000, 1) for r in top_level[:top]},
+        "heavy": [h for h in HEAVY if h in loaded],
+        "files_created": created,
+    }
+
+
+def check(result: dict, max_ms: float) -> List[str]:
+    problems = []
+    for name, sc in result["scenarios"].items():
+        if not SCENARIOS[name][1]:
+            continue
+        if sc["heavy"]:
+            problems.append(f"{name}: imports {', '.join(sc['heavy'])}")
+        if sc["files_created"]:
+            problems.append(f"{name}: wrote {', '.join(sc['files_created'])}")
+        if sc["import_ms"] > max_ms:
+            problems.append(f"{name}: {sc['import_ms']}ms of imports (budget {max_ms}ms)")
+    return problems
+
+
+def compare(baseline: dict, current: dict, max_regression: float) -> int:
+    """Print per-scenario import-time changes; 1 if any grew beyond max_regression."""
+    failed = False
+    print(f"\nvs baseline ({baseline.get('python')}):", file=sys.stderr)
+    for name, sc in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name, {}).get("import_ms")
+        new = sc["import_ms"]
+        if not old:
+            continue
+        change = new / old - 1.0
+        flag = "REGRESSION" if change > max_regression else ""
+        failed |= bool(flag)
+        print(f"  {name:<16} {old:>8.1f}ms -> {new:>8.1f}ms  {change:+7.1%} {flag}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=5, help="runs per scenario (the median wall time is reported)")
+    ap.add_argument("--top", type=int, default=8, help="slowest top-level imports to list per scenario")
+    ap.add_argument("--max-ms", type=float, default=150.0, help="import-time budget for the CLI scenarios")
+    ap.add_argument("--out", type=Path, default=None, help="also write the JSON result here")
+    ap.add_argument("--baseline", type=Path, default=None, help="earlier result JSON to compare against")
+    ap.add_argument("--max-regression", type=float, default=0.5, help="allowed import-time growth with --baseline")
+    args = ap.parse_args()
+
+    startup = baseline_modules()
+    result: Dict[str, object] = {
+        "benchmark": "startup",
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "scenarios": {
+            name: run_scenario(argv, args.repeat, startup, args.top) for name, (argv, _light) in SCENARIOS.items()
+        },
+    }
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.out:
+        args.out.write_text(text, encoding="utf-8")
+
+    status = 0
+    for problem in check(result, args.max_ms):
+        print(f"[FAIL] {problem}", file=sys.stderr)
+        status = 1
+    if args.baseline:
+        status |= compare(json.loads(args.baseline.read_text(encoding="utf-8")), result, args.max_regression)
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+stub_llm.py — local stand-in for the Mistral chat completions API
+
+Speaks just enough of POST /v1/chat/completions for the mistralai SDK:
+deterministic replies (section-delimited when the prompt asks for
+"=== SECTION: ... ===" markers), usage counts, configurable latency and an
+optional requests-per-minute limit answered with 429 + Retry-After.
+"stream": true requests get server-sent events: the first token after
+--latency-ms, then one event per word paced by --ms-per-token.
+
+Standalone:
+    python benchmarks/stub_llm.py --port 8000 --latency-ms 300 --rpm 120
+    MISTRAL_SERVER_URL=http://127.0.0.1:8000 MISTRAL_API_KEY=stub python main.py ...
+
+Embedded (benchmarks): `with StubLLM(latency_ms=50) as stub: ... stub.url`
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+_SECTION_MARKER = re.compile(r"^=== SECTION: (.+?) ===$", re.M)
+
+
+class _Limiter:
+    """Token bucket of `rpm` requests per minute; returns seconds to wait (0 = allowed)."""
+
+    def __init__(self, rpm: Optional[float]):
+        self.rate = rpm / 60.0 if rpm else None
+        self.capacity = max(1.0, rpm / 60.0) if rpm else 0.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        if self.rate is None:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return 0.0
+            return (1.0 - self.tokens) / self.rate
+
+
+def stub_reply(messages: List[Dict[str, str]], completion_tokens: int) -> str:
+    prompt = messages[-1].get("content", "") if messages else ""
+    words = re.findall(r"[A-Za-z]{4,}", prompt)[:200] or ["stub"]
+    bullets_words = max(4, completion_tokens // 4)
+
+    def bullets(seed: int) -> str:
+        picked = [words[(seed * 7 + i * 13) % len(words)] for i in range(bullets_words)]
+        return "\n".join(f"- {' '.join(picked[i:i + 8])}" for i in range(0, len(picked), 8))
+
+    sections = _SECTION_MARKER.findall(prompt)
+    if sections:
+        return "\n".join(f"=== SECTION: {name} ===\n{bullets(i)}" for i, name in enumerate(sections))
+    return bullets(len(prompt))
+
+
+class StubLLM:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 50.0,
+        jitter_ms: float = 0.0,
+        ms_per_token: float = 0.0,
+        rpm: Optional[float] = None,
+        completion_tokens: int = 120,
+        seed: int = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.ms_per_token = ms_per_token
+        self.completion_tokens = completion_tokens
+        self.limiter = _Limiter(rpm)
+        self.rng = random.Random(seed)
+        self.stats = {"requests": 0, "rate_limited": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._stats_lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, **deltas) -> None:
+        with self._stats_lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload: dict, headers: Optional[Dict[str, str]] = None) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    self._send(404, {"message": f"stub: unknown path {self.path}"})
+                    return
+                wait = stub.limiter.acquire()
+                if wait:
+                    stub._count(rate_limited=1)
+                    self._send(429, {"message": "stub: rate limit exceeded"}, {"Retry-After": f"{wait:.3f}"})
+                    return
+
+                messages = request.get("messages", [])
+                content = stub_reply(messages, stub.completion_tokens)
+                prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+                completion_tokens = len(content) // 4
+                usage = {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                }
+                first_ms = stub.latency_ms + (stub.rng.uniform(0, stub.jitter_ms) if stub.jitter_ms else 0.0)
+                stub._count(requests=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+                if request.get("stream"):
+                    time.sleep(first_ms / 1000.0)
+                    self._stream(request.get("model", "stub"), content, usage)
+                    return
+                time.sleep((first_ms + stub.ms_per_token * completion_tokens) / 1000.0)
+                self._send(200, {
+                    "id": f"stub-{stub.stats['requests']}",
+                    "object": "chat.completion",
+                    "model": request.get("model", "stub"),
+                    "created": int(time.time()),
+                    "choices": [{
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }],
+                    "usage": usage,
+                })
+
+            def _stream(self, model: str, content: str, usage: dict) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def event(payload) -> None:
+                    data = f"data: {payload if isinstance(payload, str) else json.dumps(payload)}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+
+                pieces = re.findall(r"\S+\s*", content) or [""]
+                for i, piece in enumerate(pieces):
+                    if i and stub.ms_per_token:
+                        time.sleep(stub.ms_per_token * max(1, len(piece) // 4) / 1000.0)
+                    last = i == len(pieces) - 1
+                    chunk = {
+                        "id": "stub-stream",
+                        "object": "chat.completion.chunk",
+                        "model": model,
+                        "created": int(time.time()),
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"role": "assistant", "content": piece} if i == 0 else {"content": piece},
+                            "finish_reason": "stop" if last else None,
+                        }],
+                    }
+                    if last:
+                        chunk["usage"] = usage
+                    event(chunk)
+                event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+    def start(self) -> "StubLLM":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "StubLLM":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--latency-ms", type=float, default=200.0, help="fixed latency per request")
+    ap.add_argument("--jitter-ms", type=float, default=0.0, help="extra uniform random latency")
+    ap.add_argument("--ms-per-token", type=float, default=0.0, help="extra latency per completion token")
+    ap.add_argument("--rpm", type=float, default=None, help="requests per minute before answering 429")
+    ap.add_argument("--completion-tokens", type=int, default=120)
+    args = ap.parse_args()
+
+    stub = StubLLM(
+        args.host, args.port, args.latency_ms, args.jitter_ms, args.ms_per_token, args.rpm, args.completion_tokens,
+    )
+    print(f"Stub Mistral API on {stub.url} (Ctrl+C to stop)")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.server.server_close()
+        print(json.dumps(stub.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -47,15 +47,15 @@ def confirm_outputs():
 
 # --- Step 1: Single PDF processing ---
 print("\n=== STEP 1: Single PDF Summarization & Analysis ===")
-run_cmd(f"python main.py --pdf {PDF1}")
+run_cmd(f"python main.py pdf {PDF1}")
 
 # --- Step 2: Batch mode processing ---
 print("\n=== STEP 2: Batch Mode with CSV Report ===")
-run_cmd(f"python main.py --data-dir data/sample_papers --report")
+run_cmd(f"python main.py batch --data-dir data/sample_papers --report")
 
 # --- Step 3: Bonus comparison mode ---
 print("\n=== STEP 3: Bonus - Compare Two Papers ===")
-run_cmd(f"python main.py --compare {PDF1} {PDF2}")
+run_cmd(f"python main.py compare {PDF1} {PDF2}")
 
 # --- Step 4: Validate outputs ---
 print("\n=== STEP 4: Validate Outputs ===")
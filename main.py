@@ -6,203 +6,744 @@ Main entry point for:
   - Summarization and analysis
   - Metadata + CSV report saving
   - Bonus: PDF comparison feature
+
+Commands: batch (default), pdf, compare, digest, index, search, ask, serve,
+scan-metadata, similar, similarity-matrix, results. Only the standard
+library and the option lists are loaded up front; numpy, scikit-learn,
+PyPDF2 and the Mistral SDK are imported by the command that needs them,
+and nothing is written to disk (results/, caches) until a command runs.
+The older flag style (--pdf, --compare, --index, --search, --serve,
+--scan-metadata, --digest, --similar) is still accepted.
 """
 
 import os
+import sys
 import json
 import time
 import argparse
+from dataclasses import replace
 from pathlib import Path
-from typing import List, Tuple
-
-from mistralai import Mistral  # ✅ new API client (replaces MistralClient)
-
-# --- Project imports ---
-from src.config import MISTRAL_API_KEY
-from src.pdf_utils import load_all_pdfs_text
-from src.text_utils import clean_text, chunk_text
-from src.indexer import build_index, search
-from src.summarizer import summarize_chunks
-from src.analyst import analyze_chunks
-from src.io_utils import safe_stem
-from src.metadata_utils import extract_metadata
-from src.report_utils import append_report_row
-
-# --- Constants & directories ---
+from typing import List, Optional, Tuple
+
+# --- Project imports (light: no numpy/sklearn/SDK, no file access) ---
+from src import profiling
+from src.extractors import DEFAULT_EXTRACTOR, EXTRACTORS
+from src.options import CHUNKERS, DEDUP_THRESHOLD, REASONING_TEMPLATES, RETRIEVERS, SUMMARY_MODES, PipelineOptions
+
+# --- Constants & directories (created by the commands that write to them) ---
 DATA_DIR = Path("data/sample_papers")
 RESULTS_DIR = Path("results")
 SUM_DIR = RESULTS_DIR / "summaries"
 ANA_DIR = RESULTS_DIR / "analyses"
 META_DIR = RESULTS_DIR / "metadata"
 COMP_DIR = RESULTS_DIR / "comparisons"
-for d in [SUM_DIR, ANA_DIR, META_DIR, COMP_DIR]:
-    d.mkdir(parents=True, exist_ok=True)
+DIGEST_DIR = RESULTS_DIR / "digests"
+PATH_PREFETCH = 64  # batch mode: paths listed and hashed ahead of the workers
+DEFAULT_QUERY = "What problem does this paper solve?"
 
 
 # ---------------------------------------------------------------
 # Utility Functions
 # ---------------------------------------------------------------
 
-def ensure_api_key():
-    """Ensure MISTRAL_API_KEY is loaded or raise a clear error."""
+def ensure_api_key() -> str:
+    """Return MISTRAL_API_KEY (from the environment or .env) or raise a clear error."""
+    from src.config import MISTRAL_API_KEY
+
     if not MISTRAL_API_KEY:
         raise RuntimeError(
             "❌ MISTRAL_API_KEY not found. Please add it to .env and reload the environment."
         )
+    return MISTRAL_API_KEY
+
+def make_dirs(*dirs: Path) -> None:
+    for d in dirs:
+        d.mkdir(parents=True, exist_ok=True)
+
+def output_dirs():
+    """Summary/analysis/metadata folders for the per-paper pipeline, created on first use."""
+    from src.pipeline import OutputDirs
+
+    make_dirs(SUM_DIR, ANA_DIR, META_DIR)
+    return OutputDirs(summaries=SUM_DIR, analyses=ANA_DIR, metadata=META_DIR)
+
+def pipeline_options(args, echo: bool = False, dedup_threshold: float = 0.0, markdown: bool = True) -> PipelineOptions:
+    return PipelineOptions(
+        combined=args.combined, chunker=args.chunker, summary_mode=args.summary_mode, profile=bool(args.profile),
+        stream=args.stream, echo=echo,
+        extractor=args.extractor, page_workers=args.page_workers, page_timeout=args.page_timeout,
+        dedup_threshold=dedup_threshold, markdown=markdown,
+    )
 
-def summarize_and_analyze_pdf(pdf_path: Path, raw_text: str, query: str) -> Tuple[Path, Path, float]:
+def summarize_and_analyze_pdf(
+    pdf_path: Path,
+    raw_text: str,
+    query: str,
+    api_key: str,
+    options: Optional[PipelineOptions] = None,
+) -> Tuple[Path, Path, float, Optional[float]]:
     """Perform the summarization and analysis pipeline for a single PDF."""
-    start_time = time.time()
-
-    md = extract_metadata(pdf_path)
-    title = md.get("title", pdf_path.stem)
-    authors = md.get("authors", "Unknown")
-    abstract = md.get("abstract")
-
-    txt = clean_text(raw_text)
-    chunks = chunk_text(txt, max_chars=1500, overlap=150)
-    if not chunks:
-        raise ValueError(f"No extractable text from {pdf_path.name}")
-
-    labeled_chunks: List[Tuple[str, str]] = [(f"{pdf_path.stem} [chunk {i+1}]", ch) for i, ch in enumerate(chunks)]
-    index = build_index(labeled_chunks)
-    hits = search(index, query, k=5)
-    top_chunks = [text for _s, (_lbl, text) in hits]
-
-    # Summarization
-    header = f"# {title}\n\n**Authors:** {authors}\n\n"
-    if abstract:
-        header += f"**Abstract:** {abstract}\n\n---\n\n"
-    summary_md = header + summarize_chunks(MISTRAL_API_KEY, title, top_chunks)
-    sum_path = SUM_DIR / f"{safe_stem(pdf_path)}_summary.md"
-    sum_path.write_text(summary_md, encoding="utf-8")
-
-    # Analysis
-    analysis_md = analyze_chunks(MISTRAL_API_KEY, title, top_chunks)
-    ana_path = ANA_DIR / f"{safe_stem(pdf_path)}_analysis.md"
-    ana_path.write_text(analysis_md, encoding="utf-8")
-
-    # Metadata JSON
-    meta = {
-        "file": pdf_path.name,
-        "pdf_path": str(pdf_path),
-        "title": title,
-        "authors": authors,
-        "abstract": abstract,
-        "query_used": query,
-        "outputs": {
-            "summary_md": str(sum_path),
-            "analysis_md": str(ana_path),
-        },
-    }
-    meta_path = META_DIR / f"{safe_stem(pdf_path)}_meta.json"
-    meta_path.write_text(json.dumps(meta, indent=2), encoding="utf-8")
-
-    duration = round(time.time() - start_time, 2)
-    return sum_path, ana_path, duration
+    from src.pipeline import prepare_paper, write_outputs
+
+    paper = prepare_paper(pdf_path, query, raw_text=raw_text, options=options)
+    result = write_outputs(paper, query, output_dirs(), api_key, options=options)
+    return result.summary_path, result.analysis_path, result.duration, result.ttft
 
 
 # ---------------------------------------------------------------
 # Bonus Feature: Compare Two PDFs
 # ---------------------------------------------------------------
 
-def compare_pdfs(pdf1: Path, pdf2: Path):
-    """Compare two PDFs using the new Mistral SDK."""
+def compare_pdfs(pdf1: Path, pdf2: Path, api_key: str, stream: bool = False):
+    """Compare two PDFs through the shared Mistral client (stream=True prints it as it is written)."""
+    from src.io_utils import MarkdownStream, atomic_write_text, safe_stem
+    from src.llm_client import get_client
+    from src.pipeline import COMPARE_MODEL, comparison_context, comparison_prompt
+
     print("🧠 Comparing papers:")
     print(f"  1️⃣ {pdf1.name} \n  2️⃣ {pdf2.name}")
 
-    pairs1 = load_all_pdfs_text(pdf1.parent)
-    pairs2 = load_all_pdfs_text(pdf2.parent)
-    raw1 = next((r for p, r in pairs1 if p == pdf1), None)
-    raw2 = next((r for p, r in pairs2 if p == pdf2), None)
+    # Token-budgeted excerpts from the whole paper, not just its first page
+    ctx1 = comparison_context(pdf1)
+    ctx2 = comparison_context(pdf2)
 
-    if not raw1 or not raw2:
+    if not ctx1 or not ctx2:
         raise ValueError("Could not extract text from one or both PDFs.")
 
-    # ✅ Use new Mistral client
-    client = Mistral(api_key=MISTRAL_API_KEY)
+    # ✅ Shared, rate-limited client (pooled connections, retries on 429)
+    client = get_client(api_key)
+    prompt = comparison_prompt(pdf1.name, ctx1, pdf2.name, ctx2)
 
-    prompt = f"""
-Compare the following two research papers in terms of:
-- Main research questions
-- Methodologies
-- Findings
-- Strengths and limitations
-- Overall impact and novelty
+    make_dirs(COMP_DIR)
+    output_path = COMP_DIR / f"compare_{safe_stem(pdf1)}_vs_{safe_stem(pdf2)}.md"
+    if stream:
+        with MarkdownStream(output_path, echo=True) as out:
+            comparison_text = client.complete(
+                model=COMPARE_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                on_delta=out.write,
+            )
+            out.finish(comparison_text)
+        if out.ttft is not None:
+            print(f"⏱ First token after {out.ttft:.2f}s")
+    else:
+        comparison_text = client.complete(
+            model=COMPARE_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        atomic_write_text(output_path, comparison_text)
 
-Paper 1 ({pdf1.name}):
-{raw1[:2000]}
+    print(f"✅ Comparison saved to: {output_path}")
+    return output_path
 
-Paper 2 ({pdf2.name}):
-{raw2[:2000]}
 
-Provide a concise, well-structured comparison summary.
-"""
+# ---------------------------------------------------------------
+# Corpus Digest (hierarchical map-reduce over every paper)
+# ---------------------------------------------------------------
 
-    # ✅ New client call syntax
-    response = client.chat.complete(
-        model="mistral-large-latest",
-        messages=[{"role": "user", "content": prompt}],
-    )
+def digest_folder(data_dir: Path, api_key: str, chunker: str = "chars", concurrency: int = 8) -> Path:
+    """Summarize every paper in full, then reduce the summaries into one digest."""
+    from src.io_utils import atomic_write_text, safe_stem
+    from src.mapreduce import corpus_digest
+    from src.metadata_utils import extract_metadata
+    from src.pdf_utils import list_pdfs
+    from src.pipeline import labeled_chunks_for
+
+    pdfs = list_pdfs(data_dir)
+    if not pdfs:
+        raise ValueError(f"No PDFs found in {data_dir}")
+    print(f"🗂 Building digest of {len(pdfs)} papers in {data_dir}")
+
+    papers = []
+    for pdf_path in pdfs:
+        try:
+            title = extract_metadata(pdf_path).get("title") or pdf_path.stem
+            chunks = [text for _lbl, text in labeled_chunks_for(pdf_path, chunker)]
+        except Exception as e:
+            print(f"[WARN] {pdf_path.name}: {e}")
+            continue
+        if chunks:
+            papers.append((title, chunks))
+    if not papers:
+        raise ValueError(f"No extractable text in the PDFs in {data_dir}")
+
+    digest, _summaries, stats = corpus_digest(api_key, papers, concurrency=concurrency)
+    make_dirs(DIGEST_DIR)
+    output_path = DIGEST_DIR / f"digest_{safe_stem(data_dir.resolve())}.md"
+    body = "\n".join(f"- {title}" for title, _c in papers)
+    atomic_write_text(output_path, f"# Corpus Digest: {data_dir}\n\n{digest}\n\n---\n\n**Papers:**\n{body}\n")
+    print(f"✅ Digest saved to: {output_path} ({stats.calls} summary nodes, {stats.reused} reused, {stats.levels} levels)")
+    return output_path
 
-    # ✅ FIXED: Use the correct response structure for Mistral AI SDK
-    comparison_text = response.choices[0].message.content
-    
-    output_path = COMP_DIR / f"compare_{safe_stem(pdf1)}_vs_{safe_stem(pdf2)}.md"
-    output_path.write_text(comparison_text, encoding="utf-8")
 
-    print(f"✅ Comparison saved to: {output_path}")
-    return output_path
+# ---------------------------------------------------------------
+# Command Line
+# ---------------------------------------------------------------
+
+COMMANDS = (
+    "batch", "pdf", "compare", "digest", "index", "search", "ask", "serve", "scan-metadata", "similar",
+    "similarity-matrix", "results",
+)
+RESULT_EXPORTS = ("csv", "jsonl", "markdown")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    # Option groups shared between commands
+    source = argparse.ArgumentParser(add_help=False)
+    source.add_argument("--data-dir", type=str, default=str(DATA_DIR), help="Directory containing PDFs")
+    source.add_argument("--recursive", action="store_true", help="Also process PDFs in subdirectories of --data-dir")
+    source.add_argument("--paths-from", type=str, metavar="FILE", help="Read PDF paths (one per line) from FILE, or from stdin with '-', instead of --data-dir")
+
+    extraction = argparse.ArgumentParser(add_help=False)
+    extraction.add_argument("--extractor", choices=EXTRACTORS, default=DEFAULT_EXTRACTOR, help="PDF text backend: pypdf2 (default), pypdf or pymupdf (optional packages)")
+    extraction.add_argument("--page-workers", type=int, default=1, help="Split large PDFs into page ranges extracted by this many processes")
+    extraction.add_argument("--page-timeout", type=float, default=None, metavar="SECONDS", help="Skip (leave empty) any page whose text takes longer than this to extract. Enforced with SIGALRM on the main thread, so a sequential batch prepares papers there instead of ahead in a background thread; extraction on other threads (serve) runs in a page-worker process that opens the PDF again")
+
+    paper = argparse.ArgumentParser(add_help=False)
+    paper.add_argument("--query", type=str, default=DEFAULT_QUERY, help="User query for summarization")
+    paper.add_argument("--combined", action="store_true", help="One LLM request per paper for summary + all analysis sections")
+    paper.add_argument("--chunker", choices=CHUNKERS, default="chars", help="chars: fixed 1500-char windows; tokens: sentence/section-aware, token-sized, with page numbers")
+    paper.add_argument("--summary-mode", choices=SUMMARY_MODES, default="retrieval", help="retrieval: summarize top hits; mapreduce: hierarchical summary of every chunk")
+    paper.add_argument("--stream", action="store_true", help="Stream replies into the output files as they are generated (and to the terminal for a single PDF)")
+
+    cache = argparse.ArgumentParser(add_help=False)
+    cache_group = cache.add_mutually_exclusive_group()
+    cache_group.add_argument("--no-cache", action="store_true", help="Bypass the LLM response cache")
+    cache_group.add_argument("--refresh-cache", action="store_true", help="Ignore cached LLM responses but store fresh ones")
+
+    llm = argparse.ArgumentParser(add_help=False, parents=[cache])
+    llm.add_argument("--profile", nargs="?", const=str(RESULTS_DIR / "profile.json"), metavar="JSON", help="Record per-stage timings and write a percentile report (default: results/profile.json)")
+    llm.add_argument("--profile-capture", choices=profiling.CAPTURE_MODES, help="With --profile: also capture cProfile stats or tracemalloc allocations (runs sequentially)")
+
+    index = argparse.ArgumentParser(add_help=False)
+    index.add_argument("--index-dir", type=str, default=None, help="Where the corpus index is stored (default: RGPT_INDEX_DIR or .cache/corpus_index)")
+    index.add_argument("--retriever", choices=RETRIEVERS, default="tfidf", help="Retrieval backend (dense/hybrid build an embedding index)")
+
+    parser = argparse.ArgumentParser(description="ResearchGPT Assistant CLI")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    p = commands.add_parser("batch", parents=[source, extraction, paper, llm], help="Summarize and analyze every PDF in the source (default)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel PDF parsing processes (1 = sequential)")
+    p.add_argument("--llm-concurrency", type=int, default=4, help="Max papers with LLM requests in flight")
+    p.add_argument("--report", dest="report", action="store_true", default=True, help="Write results/batch_report.csv for the papers this run processed (the default)")
+    p.add_argument("--no-report", dest="report", action="store_false", help="Skip the CSV report (the results store still has every row)")
+    p.add_argument("--all-runs", action="store_true", help="Export every paper in the results store to the CSV report, not just this run's")
+    p.add_argument("--no-markdown", dest="markdown", action="store_false", help="Keep summaries, analyses and metadata only in the results store (no per-paper files; export them later with `results --export markdown`)")
+    p.add_argument("--resume", action="store_true", help="Skip papers the run manifest records as done with the same PDF and settings")
+    p.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD, metavar="JACCARD", help=f"Papers at least this similar (MinHash estimate) to one earlier in the run reuse its summary and analysis (default {DEDUP_THRESHOLD})")
+    p.add_argument("--no-dedup", dest="dedup_threshold", action="store_const", const=0.0, help="Send every paper to the LLM, even near-duplicates")
+    p.set_defaults(handler=run, needs_llm=True)
+
+    p = commands.add_parser("pdf", parents=[extraction, paper, llm], help="Summarize and analyze a single PDF")
+    p.add_argument("pdf", type=str, help="Path to a single PDF file")
+    p.set_defaults(handler=run_pdf, needs_llm=True)
+
+    p = commands.add_parser("compare", parents=[extraction, llm], help="Compare two research papers")
+    p.add_argument("compare", nargs=2, metavar=("PDF1", "PDF2"))
+    p.add_argument("--stream", action="store_true", help="Print the comparison as it is generated")
+    p.set_defaults(handler=run_compare, needs_llm=True)
+
+    p = commands.add_parser("digest", parents=[extraction, llm], help="Write a map-reduce digest across all papers in --data-dir")
+    p.add_argument("--data-dir", type=str, default=str(DATA_DIR), help="Directory containing PDFs")
+    p.add_argument("--chunker", choices=CHUNKERS, default="chars", help="How papers are split before summarizing")
+    p.add_argument("--llm-concurrency", type=int, default=8, help="Max summary requests in flight")
+    p.set_defaults(handler=run_digest, needs_llm=True)
+
+    p = commands.add_parser("index", parents=[source, extraction, index], help="Build/update the persistent corpus index (no LLM calls)")
+    p.set_defaults(handler=run_index, needs_llm=False, index=True, search=None)
+
+    p = commands.add_parser("search", parents=[source, extraction, index], help="Search the corpus index (no LLM calls)")
+    p.add_argument("search", metavar="QUERY")
+    p.add_argument("--top-k", type=int, default=5, help="Number of hits")
+    p.add_argument("--update", dest="index", action="store_true", help="Update the index from the source first")
+    p.set_defaults(handler=run_index, needs_llm=False)
+
+    p = commands.add_parser("ask", parents=[index, llm], help="Answer questions from the corpus index with sampled reasoning that stops once the samples agree")
+    p.add_argument("ask", metavar="QUERY", nargs="?", help="Question to answer (or use --questions)")
+    p.add_argument("--questions", type=str, metavar="FILE", help="Answer every question in FILE (one per line, '-' for stdin) concurrently; JSON lines on stdout")
+    p.add_argument("--template", choices=REASONING_TEMPLATES, default="self_consistency", help="Prompt from prompts/ used for each sample")
+    p.add_argument("--samples", type=int, default=5, help="Most samples per question")
+    p.add_argument("--agree", type=int, default=3, help="Samples in the first wave; sampling stops once this many give the same answer, and the rest start together only when they disagree")
+    p.add_argument("--no-verify", dest="verify", action="store_false", help="Skip the verification pass run when the samples disagree")
+    p.add_argument("--top-k", type=int, default=8, help="Index hits packed into each question's context")
+    p.add_argument("--llm-concurrency", type=int, default=8, help="Max LLM requests in flight across all questions")
+    p.set_defaults(handler=run_ask, needs_llm=True)
+
+    p = commands.add_parser("serve", parents=[source, extraction, index, cache], help="Keep the corpus index loaded and answer search/summarize/analyze/compare over local HTTP/JSON")
+    p.add_argument("--host", type=str, default="127.0.0.1", help="Address to bind")
+    p.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    p.add_argument("--reload-interval", type=float, default=5.0, help="Seconds between checks for changed PDFs (0 = only on POST /reload)")
+    p.set_defaults(handler=run_serve, needs_llm=False)
+
+    p = commands.add_parser("scan-metadata", parents=[source, extraction], help="Print title/authors/abstract of every PDF as JSON lines (first page only, no LLM calls)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel first-page parsing processes")
+    p.set_defaults(handler=run_metadata_scan, needs_llm=False)
+
+    p = commands.add_parser("similar", parents=[source, extraction], help="Papers in the source most similar to PDF (MinHash, no LLM calls)")
+    p.add_argument("similar", metavar="PDF")
+    p.add_argument("--top-k", type=int, default=10, help="Number of papers to list")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel processes for papers not shingled yet")
+    p.set_defaults(handler=run_similar, needs_llm=False)
+
+    p = commands.add_parser("similarity-matrix", parents=[source, extraction], help="N x N similarity matrix of the source as CSV, plus near-duplicate pairs (no LLM calls)")
+    p.add_argument("--out", type=str, default=str(RESULTS_DIR / "similarity_matrix.csv"), help="CSV file to write")
+    p.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD, metavar="JACCARD", help="Similarity at which papers are listed as near-duplicates")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel processes for papers not shingled yet")
+    p.set_defaults(handler=run_similarity_matrix, needs_llm=False)
+
+    p = commands.add_parser("results", help="Aggregates, SQL queries and exports over the batch results store (no LLM calls)")
+    p.add_argument("--db", type=str, default=None, help="Results store to read (default: results/results.sqlite or RGPT_RESULTS_DB_PATH)")
+    p.add_argument("--export", choices=RESULT_EXPORTS, help="csv: batch report; jsonl: every column; markdown: the per-paper files a batch run writes")
+    p.add_argument("--out", type=str, default=None, help="Export file (csv, jsonl) or results folder (markdown); default under results/")
+    p.add_argument("--sql", type=str, default=None, help="Read-only SQL over the `papers` table or the `results` view, printed as JSON lines")
+    p.set_defaults(handler=run_results, needs_llm=False)
+    return parser
+
+
+def legacy_command(argv: List[str]) -> Optional[List[str]]:
+    """
+    Rewrite a flag-style invocation (main.py --pdf X ..., main.py --data-dir D)
+    as the equivalent command line; None if argv already names a command.
+    Mode flags are resolved in the order the old CLI checked them.
+    """
+    if not argv or argv[0] in COMMANDS or argv[0] in ("-h", "--help"):
+        return None
+    modes = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    modes.add_argument("--pdf")
+    modes.add_argument("--compare", nargs=2)
+    modes.add_argument("--search")
+    modes.add_argument("--similar")
+    for flag in ("--index", "--serve", "--scan-metadata", "--digest"):
+        modes.add_argument(flag, action="store_true")
+    mode, rest = modes.parse_known_args(argv)
+    if mode.search:
+        return ["search", mode.search, *(["--update"] if mode.index else []), *rest]
+    if mode.index:
+        return ["index", *rest]
+    if mode.similar:
+        return ["similar", mode.similar, *rest]
+    if mode.scan_metadata:
+        return ["scan-metadata", *rest]
+    if mode.serve:
+        return ["serve", *rest]
+    if mode.digest:
+        return ["digest", *rest]
+    if mode.compare:
+        return ["compare", *mode.compare, *rest]
+    if mode.pdf:
+        return ["pdf", mode.pdf, *rest]
+    return ["batch", *rest]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    parser = build_parser()
+    translated = legacy_command(argv)
+    if translated is None:
+        args = parser.parse_args(argv)
+        if args.command is None:
+            args = parser.parse_args(["batch"])
+        return args
+    # The old single-parser CLI accepted every flag in every mode; keep
+    # tolerating the ones that do not apply, but say so.
+    args, ignored = parser.parse_known_args(translated)
+    if ignored:
+        print(f"[WARN] Ignoring options not used by '{args.command}': {' '.join(ignored)}", file=sys.stderr)
+    return args
 
 
 # ---------------------------------------------------------------
 # Main Entry Point
 # ---------------------------------------------------------------
 
-def main():
-    parser = argparse.ArgumentParser(description="ResearchGPT Assistant CLI")
-    parser.add_argument("--pdf", type=str, help="Path to a single PDF file")
-    parser.add_argument("--data-dir", type=str, default="data/sample_papers", help="Directory containing PDFs")
-    parser.add_argument("--query", type=str, default="What problem does this paper solve?", help="User query for summarization")
-    parser.add_argument("--report", action="store_true", help="Generate batch CSV report")
-    parser.add_argument("--compare", nargs=2, metavar=("PDF1", "PDF2"), help="Compare two research papers")
-    args = parser.parse_args()
-
-    ensure_api_key()
-
-    if args.compare:
-        pdf1 = Path(args.compare[0])
-        pdf2 = Path(args.compare[1])
-        compare_pdfs(pdf1, pdf2)
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+
+    if hasattr(args, "extractor"):  # every command that reads PDFs
+        from src.pdf_utils import ExtractionSettings, set_extraction
+
+        set_extraction(ExtractionSettings(args.extractor, args.page_workers, args.page_timeout))
+    if not args.needs_llm:
+        args.handler(args)
         return
 
-    if args.pdf:
-        pdf_path = Path(args.pdf)
-        print(f"📄 Processing single PDF: {pdf_path.name}")
-        pairs = load_all_pdfs_text(pdf_path.parent)
-        raw_text = next((r for p, r in pairs if p == pdf_path), None)
-        if not raw_text:
-            print(f"❌ Could not extract text from {pdf_path}")
-            return
-        s, a, dur = summarize_and_analyze_pdf(pdf_path, raw_text, args.query)
-        print(f"✅ Summary → {s}")
-        print(f"✅ Analysis → {a}")
-        print(f"⏱ Duration: {dur:.2f}s")
+    from src.llm_client import cache_stats, set_cache_mode
+
+    api_key = ensure_api_key()
+    set_cache_mode(cache_mode(args))
+    capture = start_profiling(args)
+    try:
+        args.handler(args, api_key)
+    finally:
+        if not args.no_cache:
+            st = cache_stats()
+            print(f"🗄 LLM cache: {st['hits']} hits, {st['misses']} misses, {st['evictions']} evictions")
+        if args.profile:
+            write_profile(Path(args.profile), capture)
+
+
+def cache_mode(args) -> str:
+    return "off" if args.no_cache else "refresh" if args.refresh_cache else "use"
+
+
+def start_profiling(args) -> Optional[profiling.Capture]:
+    if not args.profile:
+        return None
+    profiling.enable()
+    if not args.profile_capture:
+        return None
+    # cProfile only sees the calling thread and neither mode sees worker processes:
+    # run() also turns off its prefetch threads
+    args.workers, args.llm_concurrency = 1, 1
+    capture = profiling.Capture(args.profile_capture, Path(args.profile).with_suffix(".prof"))
+    capture.start()
+    return capture
+
+
+def write_profile(path: Path, capture: Optional[profiling.Capture]) -> None:
+    from src.io_utils import atomic_write_text
+
+    report = profiling.report()
+    if capture is not None:
+        report["capture"] = capture.stop()
+    atomic_write_text(path, json.dumps(report, indent=2))
+    print(f"⏱ Profile → {path}")
+    for name, st in report["stages"].items():
+        wall = st["wall_s"]
+        print(f"  {name:<28} n={st['count']:<5} p50={wall['p50']:.4f}s p95={wall['p95']:.4f}s p99={wall['p99']:.4f}s")
+
+
+def index_dir(args) -> Path:
+    from src.config import INDEX_DIR
+
+    return Path(args.index_dir) if args.index_dir else INDEX_DIR
+
+
+def run_index(args):
+    """Corpus index maintenance and retrieval; no API key needed."""
+    from src.corpus_index import CorpusIndex
+    from src.retrievers import get_retriever
+
+    index = CorpusIndex.load(index_dir(args))
+    if args.index:
+        stats = index.update(list(pdf_source(args)), prune=True)
+        print(
+            f"📚 Index updated: {stats['added']} added, {stats['updated']} updated, "
+            f"{stats['unchanged']} unchanged, {stats['removed']} removed ({len(index)} chunks)"
+        )
+    if not len(index):
+        print("No results (is the index empty? run the index command first)")
         return
+    retriever = get_retriever(args.retriever, index)  # dense/hybrid (re)build their ANN index if stale
+    if args.search:
+        hits = retriever.search(args.search, k=args.top_k)
+        for score, (label, text) in hits:
+            preview = " ".join(text.split())[:200]
+            print(f"{score:.3f}  {label}\n       {preview}")
+
+
+def read_questions(spec: str) -> List[str]:
+    lines = sys.stdin if spec == "-" else Path(spec).read_text(encoding="utf-8").splitlines()
+    return [q.strip() for q in lines if q.strip()]
 
-    data_dir = Path(args.data_dir)
-    pairs = load_all_pdfs_text(data_dir)
-    if not pairs:
-        print(f"No PDFs found in {data_dir}")
+
+def run_ask(args, api_key: str):
+    """Self-consistency answers over the corpus index (src/workflows.py)."""
+    from src.context_utils import ANALYSIS_BUDGET_TOKENS, pack_context
+    from src.corpus_index import CorpusIndex
+    from src.retrievers import get_retriever
+    from src.workflows import run_questions, savings_report
+
+    if bool(args.ask) == bool(args.questions):
+        print("❌ Give either a QUERY or --questions FILE")
+        return
+    queries = [args.ask] if args.ask else read_questions(args.questions)
+    index = CorpusIndex.load(index_dir(args))
+    if not queries or not len(index):
+        print("No results (is the index empty? run the index command first)")
+        return
+    retriever = get_retriever(args.retriever, index)
+    hit_lists = retriever.search_batch(queries, k=args.top_k)
+    items = [
+        (q, "\n\n---\n\n".join(pack_context([(s, text) for s, (_label, text) in hits], ANALYSIS_BUDGET_TOKENS)))
+        for q, hits in zip(queries, hit_lists)
+    ]
+    results = run_questions(
+        api_key, items, concurrency=args.llm_concurrency, template=args.template,
+        samples=args.samples, agree=args.agree, verify=args.verify,
+    )
+    report = savings_report(results)
+    if args.questions:
+        for r in results:
+            print(json.dumps({
+                "query": r.query, "final": r.final, "answer": r.answer, "votes": r.stats.votes,
+                "agreed": r.stats.agreed, "verified": r.stats.verified, "samples_run": r.stats.samples_run,
+                "tokens_used": r.stats.tokens_used, "tokens_saved": r.stats.tokens_saved,
+                "latency_s": r.stats.latency_s,
+            }, ensure_ascii=False), flush=True)
+        print(json.dumps(report), file=sys.stderr)
         return
+    r = results[0]
+    print(r.answer.strip())
+    print()
+    print(f"🗳 Votes: {r.stats.votes} ({'agreed' if r.stats.agreed else 'no consensus'})")
+    print(f"🎲 Samples: {r.stats.samples_run} of {r.stats.max_samples} run, {r.stats.samples_skipped} skipped")
+    if r.stats.verified:
+        print("🔎 Samples disagreed; answer from the verification pass")
+    print(
+        f"💰 Saved ~{report['tokens_saved']} tokens and {report['latency_saved_s']:.2f}s "
+        f"vs {r.stats.max_samples} samples{' + verification' if r.stats.verified else ''} "
+        f"({report['tokens_used']} tokens, {report['latency_s']:.2f}s used)"
+    )
 
-    for pdf_path, raw in pairs:
-        try:
-            s, a, dur = summarize_and_analyze_pdf(pdf_path, raw, args.query)
-            print(f"✅ Processed: {pdf_path.name}")
-            append_report_row(pdf_path, args.query, s, a, dur)
-        except Exception as e:
-            print(f"[WARN] {pdf_path.name}: {e}")
+
+def run_serve(args):
+    """Long-lived HTTP/JSON query server; LLM endpoints only when an API key is configured."""
+    from src.config import MISTRAL_API_KEY
+    from src.llm_client import set_cache_mode
+    from src.server import QueryServer, QueryService
+
+    if args.paths_from == "-":
+        paths = list(pdf_source(args))  # stdin can only be read once
+        sources = lambda: paths
+    else:
+        sources = lambda: pdf_source(args)
+    options = PipelineOptions(extractor=args.extractor, page_workers=args.page_workers, page_timeout=args.page_timeout)
+    service = QueryService(index_dir(args), sources, api_key=MISTRAL_API_KEY, options=options)
+    set_cache_mode(cache_mode(args))
+    stats = service.reload()
+    print(
+        f"📚 Index ready: {stats['added']} added, {stats['updated']} updated, {stats['unchanged']} unchanged, "
+        f"{stats['removed']} removed ({len(service.index)} chunks)"
+    )
+    server = QueryServer(service, args.host, args.port, reload_interval=args.reload_interval)
+    llm = "search, summarize, analyze, compare" if MISTRAL_API_KEY else "search only (no MISTRAL_API_KEY)"
+    print(f"🌐 Serving {llm} on {server.url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def run_metadata_scan(args):
+    """Metadata-only pass over the PDF source as JSON lines on stdout; no API key needed."""
+    from src.metadata_utils import scan_metadata
+
+    for pdf_path, meta in scan_metadata(pdf_source(args), workers=args.workers):
+        print(json.dumps({"path": str(pdf_path), **meta}, ensure_ascii=False), flush=True)
+
+
+def run_similar(args):
+    """Rank the source's papers by MinHash similarity to one PDF; no API key needed."""
+    from src.dedup import MinHashIndex, corpus_signatures, signature
+
+    target = Path(args.similar)
+    sig = signature(target)
+    if sig is None:
+        print(f"❌ Could not extract text from {target}")
+        return
+    paths = [p for p in pdf_source(args) if p.resolve() != target.resolve()]
+    index = MinHashIndex.build(corpus_signatures(paths, workers=args.workers))
+    if not len(index):
+        print(f"No PDFs found in {args.paths_from or args.data_dir}")
+        return
+    for sim, path in index.similar(sig, k=args.top_k):
+        print(f"{sim:.3f}  {path}" + ("  (near-duplicate)" if sim >= DEDUP_THRESHOLD else ""))
+
+
+def run_similarity_matrix(args):
+    """Pairwise MinHash similarities of the source as CSV plus near-duplicate pairs; no API key needed."""
+    import csv
+    import io
+
+    import numpy as np
+
+    from src.dedup import MinHashIndex, corpus_signatures
+    from src.io_utils import atomic_write_text
+
+    index = MinHashIndex.build(corpus_signatures(pdf_source(args), workers=args.workers))
+    if not len(index):
+        print(f"No PDFs found in {args.paths_from or args.data_dir}")
+        return
+    matrix = index.similarity_matrix()
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["paper", *(str(p) for p in index.keys)])
+    for path, row in zip(index.keys, matrix):
+        writer.writerow([str(path), *(f"{v:.3f}" for v in row)])
+    out = Path(args.out)
+    atomic_write_text(out, buf.getvalue())
+    print(f"✅ {len(index)} x {len(index)} similarity matrix → {out}")
+    for i, j in zip(*np.nonzero(np.triu(matrix >= args.dedup_threshold, k=1))):
+        print(f"♻️ {matrix[i, j]:.3f}  {index.keys[i]}  ~  {index.keys[j]}")
+
+
+def run_results(args):
+    """Read-only view of the results store: aggregates, --sql or --export; no API key needed."""
+    from src.config import RESULTS_DB_PATH
+    from src.results_store import ResultsStore, export_jsonl, export_markdown
+
+    try:
+        store = ResultsStore(Path(args.db) if args.db else RESULTS_DB_PATH, readonly=True)
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        return
+    try:
+        if args.sql:
+            columns, rows = store.query(args.sql)
+            for row in rows:
+                print(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+        elif args.export == "csv":
+            from src.report_utils import REPORT_PATH, STORE_COLUMNS, write_report
+
+            out = Path(args.out) if args.out else REPORT_PATH
+            print(f"✅ {write_report(store.rows(columns=STORE_COLUMNS), out)} papers → {out}")
+        elif args.export == "jsonl":
+            out = Path(args.out or RESULTS_DIR / "results.jsonl")
+            print(f"✅ {export_jsonl(store.rows(), out)} papers → {out}")
+        elif args.export == "markdown":
+            root = Path(args.out) if args.out else RESULTS_DIR
+            n = export_markdown(store.rows(), root / SUM_DIR.name, root / ANA_DIR.name, root / META_DIR.name)
+            print(f"✅ {n} papers → {root / SUM_DIR.name}, {root / ANA_DIR.name}, {root / META_DIR.name}")
+        else:
+            print(json.dumps(store.stats(), indent=2, ensure_ascii=False))
+    finally:
+        store.close()
+
+
+def run_digest(args, api_key: str):
+    digest_folder(Path(args.data_dir), api_key, chunker=args.chunker, concurrency=max(1, args.llm_concurrency))
+
+
+def run_compare(args, api_key: str):
+    pdf1 = Path(args.compare[0])
+    pdf2 = Path(args.compare[1])
+    compare_pdfs(pdf1, pdf2, api_key, stream=args.stream)
+
+
+def run_pdf(args, api_key: str):
+    from src.pdf_utils import load_pdf_text
+
+    options = pipeline_options(args, echo=args.stream)
+    pdf_path = Path(args.pdf)
+    print(f"📄 Processing single PDF: {pdf_path.name}")
+    try:
+        raw_text = load_pdf_text(pdf_path)
+    except Exception as e:
+        print(f"❌ Failed to parse {pdf_path}: {e}")
+        return
+    if not raw_text:
+        print(f"❌ Could not extract text from {pdf_path}")
+        return
+    s, a, dur, ttft = summarize_and_analyze_pdf(pdf_path, raw_text, args.query, api_key, options=options)
+    print(f"✅ Summary → {s}")
+    print(f"✅ Analysis → {a}")
+    print(f"⏱ Duration: {dur:.2f}s")
+    if ttft is not None:
+        print(f"⏱ First summary token after {ttft:.2f}s")
+
+
+def run(args, api_key: str):
+    """Batch mode: every PDF in the source, journaled in the run manifest."""
+    from src.cache_utils import get_extraction_cache
+    from src.manifest import RunManifest
+    from src.pipeline import config_fingerprint, prefetch, result_record, run_batch, run_sequential
+    from src.report_utils import REPORT_PATH, STORE_COLUMNS, write_report
+    from src.results_store import ResultsStore
+
+    options = pipeline_options(args, dedup_threshold=args.dedup_threshold, markdown=args.markdown)
+
+    # Every batch run is journaled; --resume uses the journal to skip finished papers.
+    manifest = RunManifest()
+    store = ResultsStore()
+    config_hash = config_fingerprint(args.query, options)
+    run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.urandom(4).hex()}"  # tags this run's rows for the report
+    cache = get_extraction_cache()
+    input_hashes = {}  # only papers in flight, so this stays small on huge corpora
+    seen = {"listed": 0, "skipped": 0}
+
+    def pending_pdfs():
+        for p in pdf_source(args):
+            seen["listed"] += 1
+            try:
+                digest = cache.content_hash(p)
+            except OSError as e:
+                print(f"[WARN] {p}: {e}")
+                continue
+            if args.resume and manifest.is_complete(p, digest, config_hash, stored=store.contains):
+                seen["skipped"] += 1
+                store.mark_run(p, run_id)  # its stored row is this run's result too (for the report)
+                continue
+            input_hashes[p] = digest
+            yield p
+
+    def on_result(r):
+        if r.duplicate_of is not None:
+            print(f"♻️ Near-duplicate of {r.duplicate_of.name}, reused its outputs: {r.pdf_path.name}")
+        else:
+            print(f"✅ Processed: {r.pdf_path.name}")
+        store.put(result_record(r, args.query, config_hash, run_id))
+        manifest.mark_done(r.pdf_path, input_hash(r.pdf_path), config_hash, r.summary_path, r.analysis_path, r.duration)
+
+    def on_error(pdf_path, e):
+        manifest.mark_failed(pdf_path, input_hash(pdf_path), config_hash, f"{type(e).__name__}: {e}")
+
+    def input_hash(pdf_path):
+        # a path listed twice has already been popped by its first result
+        return input_hashes.pop(pdf_path, None) or cache.content_hash(pdf_path)
+
+    # Listing and hashing run in a background thread, a bounded distance ahead,
+    # except under --profile-capture: cProfile only sees this thread.
+    capturing = bool(args.profile and args.profile_capture)
+    pdfs = pending_pdfs() if capturing else prefetch(pending_pdfs(), PATH_PREFETCH)
+    dirs = output_dirs()
+    if args.recursive and not args.paths_from:
+        dirs = replace(dirs, source_root=Path(args.data_dir))
+    try:
+        if args.workers <= 1 and args.llm_concurrency <= 1:
+            run_sequential(
+                pdfs, args.query, dirs, api_key,
+                on_result=on_result, options=options, on_error=on_error, collect=False,
+                prefetch_depth=0 if capturing else 1,
+            )
+        else:
+            run_batch(
+                pdfs, args.query, dirs, api_key,
+                parse_workers=max(1, args.workers),
+                llm_concurrency=args.llm_concurrency,
+                on_result=on_result,
+                options=options,
+                on_error=on_error,
+                collect=False,
+            )
+    finally:
+        pdfs.close()
+        if not seen["listed"]:
+            print(f"No PDFs found in {args.paths_from or args.data_dir}")
+        if seen["skipped"]:
+            print(f"⏭ Resumed: skipped {seen['skipped']} paper(s) already done")
+        counts = manifest.counts()
+        print(f"📒 Manifest: {counts.get('done', 0)} done, {counts.get('failed', 0)} failed ({manifest.path})")
+        manifest.close()
+        print(f"🗃 Results store: {store.path}")
+        if args.report:
+            where, params = ("", ()) if args.all_runs else ("WHERE run_id = ?", (run_id,))
+            count = next(store.query(f"SELECT COUNT(*) FROM papers {where}", params)[1])[0]
+            if not count and REPORT_PATH.exists():
+                print(f"📊 Report: no papers in this run; kept {REPORT_PATH}")
+            else:
+                n = write_report(store.rows(where, params, columns=STORE_COLUMNS))
+                print(f"📊 Report: {n} papers{' (all runs)' if args.all_runs else ''} → {REPORT_PATH}")
+        store.close()
+
+
+def pdf_source(args):
+    """Lazy PDF paths for batch and index modes: --paths-from, else --data-dir (optionally --recursive)."""
+    from src.pdf_utils import iter_path_list, iter_pdf_paths
+
+    if args.paths_from:
+        return iter_path_list(args.paths_from)
+    return iter_pdf_paths(Path(args.data_dir), recursive=args.recursive)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,7 +1,14 @@
-from typing import List, Dict
-from mistralai import Mistral
+import re
+from typing import Callable, List, Dict, Optional, Sequence, Tuple
 
-DEFAULT_MODEL = "mistral-tiny"  # change if your account exposes a different model
+from src import profiling
+from src.context_utils import ANALYSIS_BUDGET_TOKENS, HitLike, pack_context
+from src.llm_client import DEFAULT_MODEL, get_client
+from src.summarizer import SUMMARY_INSTRUCTION, summarize_chunks
+
+ANALYST_SYSTEM = "You are a careful research analyst. Be terse and factual."
+SUMMARY_SECTION = "Summary"
+_SECTION_MARKER = re.compile(r"^\s*=+\s*SECTION:\s*(.+?)\s*=+\s*$", re.M | re.I)
 
 SECTIONS: Dict[str, str] = {
     "Methods": (
@@ -20,21 +27,126 @@ SECTIONS: Dict[str, str] = {
     ),
 }
 
-def analyze_chunks(api_key: str, title: str, chunks: List[str], model: str = DEFAULT_MODEL) -> str:
-    client = Mistral(api_key=api_key)
-    md_parts = [f"# Analysis: {title}\n"]
+def analyze_chunks(
+    api_key: str,
+    title: str,
+    chunks: Sequence[HitLike],
+    model: str = DEFAULT_MODEL,
+    combined: bool = False,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    """
+    Build the analysis markdown. combined=True asks for every section in a
+    single request and falls back to one request per section if the reply
+    can't be parsed. on_delta streams the per-section markdown (section
+    headings included) as it is generated; the combined request, which has
+    to be parsed as a whole, is not streamed.
+    """
+    if combined:
+        sections = _request_sections(api_key, title, chunks, list(SECTIONS), model)
+        if sections is not None:
+            return _analysis_markdown(title, sections)
+    return _analyze_per_section(api_key, title, chunks, model, on_delta=on_delta)
 
-    for section, instruction in SECTIONS.items():
-        user_content = f"{instruction}\n\nEXCERPTS:\n" + "\n\n---\n\n".join(chunks[:8])
-        resp = client.chat.complete(
+def summarize_and_analyze(
+    api_key: str,
+    title: str,
+    chunks: Sequence[HitLike],
+    model: str = DEFAULT_MODEL,
+) -> Tuple[str, str]:
+    """
+    One LLM call for the summary and all analysis sections, instead of four.
+    Returns (summary_text, analysis_markdown). Falls back to the separate
+    calls if the combined reply is missing a section.
+    """
+    names = [SUMMARY_SECTION] + list(SECTIONS)
+    sections = _request_sections(api_key, title, chunks, names, model)
+    if sections is not None:
+        summary = sections.pop(SUMMARY_SECTION)
+        return summary, _analysis_markdown(title, sections)
+
+    return summarize_chunks(api_key, title, chunks, model=model), _analyze_per_section(api_key, title, chunks, model)
+
+def _request_sections(
+    api_key: str,
+    title: str,
+    chunks: Sequence[HitLike],
+    names: List[str],
+    model: str,
+) -> Optional[Dict[str, str]]:
+    instructions = {SUMMARY_SECTION: SUMMARY_INSTRUCTION, **SECTIONS}
+    task_lines = "\n".join(f"- {name}: {instructions[name]}" for name in names)
+    layout = "\n".join(f"=== SECTION: {name} ===\n<content>" for name in names)
+    user_content = (
+        f"TITLE: {title}\n\n"
+        f"Using only the excerpts below, write each of these sections:\n{task_lines}\n\n"
+        f"Reply with exactly these section markers, in this order, and nothing else:\n{layout}\n\n"
+        "EXCERPTS:\n" + "\n\n---\n\n".join(pack_context(chunks, ANALYSIS_BUDGET_TOKENS))
+    )
+    with profiling.stage("llm.sections"):
+        content = get_client(api_key).complete(
             model=model,
             messages=[
-                {"role": "system", "content": "You are a careful research analyst. Be terse and factual."},
+                {"role": "system", "content": ANALYST_SYSTEM},
                 {"role": "user", "content": user_content},
             ],
             temperature=0.2,
         )
+    return parse_sections(content, names)
+
+def parse_sections(content: str, names: List[str]) -> Optional[Dict[str, str]]:
+    """
+    Split a delimited reply into {section: text}. Returns None unless every
+    expected section is present and non-empty.
+    """
+    wanted = {n.lower(): n for n in names}
+    found: Dict[str, str] = {}
+    markers = list(_SECTION_MARKER.finditer(content or ""))
+    for i, m in enumerate(markers):
+        name = wanted.get(m.group(1).strip().lower())
+        if name is None:
+            continue
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(content)
+        body = content[m.end():end].strip()
+        if body:
+            found[name] = body
+    if len(found) != len(names):
+        return None
+    return {n: found[n] for n in names}
+
+def _analysis_markdown(title: str, sections: Dict[str, str]) -> str:
+    md_parts = [f"# Analysis: {title}\n"]
+    for section in SECTIONS:
+        md_parts.append(f"\n## {section}\n")
+        md_parts.append(sections[section].strip())
+    return "\n".join(md_parts).strip()
+
+def _analyze_per_section(
+    api_key: str,
+    title: str,
+    chunks: Sequence[HitLike],
+    model: str,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
+    client = get_client(api_key)
+    md_parts = [f"# Analysis: {title}\n"]
+    excerpts = "\n\n---\n\n".join(pack_context(chunks, ANALYSIS_BUDGET_TOKENS))
+
+    for section, instruction in SECTIONS.items():
+        user_content = f"{instruction}\n\nEXCERPTS:\n" + excerpts
+        if on_delta is not None:
+            on_delta(f"\n## {section}\n")
+        with profiling.stage(f"llm.analysis.{section.lower().replace(' ', '_')}"):
+            content = client.complete(
+                model=model,
+                messages=[
+                    {"role": "system", "content": ANALYST_SYSTEM},
+                    {"role": "user", "content": user_content},
+                ],
+                temperature=0.2,
+                on_delta=on_delta,
+            )
         md_parts.append(f"\n## {section}\n")
-        md_parts.append(resp.choices[0].message.content.strip())
+        md_parts.append(content.strip())
 
     return "\n".join(md_parts).strip()
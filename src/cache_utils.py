@@ -0,0 +1,73 @@
+"""
+cache_utils.py — content-addressed on-disk cache
+------------------------------------------------
+Stores extraction results keyed by the SHA-256 of the PDF bytes plus the
+extractor version, so an unchanged PDF is parsed once and never again.
+Records are small JSON files sharded by the first two hex digits of the key.
+"""
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from src.config import CACHE_DIR
+from src.io_utils import atomic_write_text
+
+_HASH_BLOCK = 1 << 20  # 1 MiB reads keep hashing memory flat on large PDFs
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with Path(path).open("rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Sharded JSON cache: <root>/<key[:2]>/<key>.json
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        # (path, size, mtime_ns) -> content hash, avoids re-hashing in one process
+        self._hash_memo: Dict[Tuple[str, int, int], str] = {}
+
+    def content_hash(self, pdf_path: Path) -> str:
+        st = Path(pdf_path).stat()
+        memo_key = (str(Path(pdf_path).resolve()), st.st_size, st.st_mtime_ns)
+        digest = self._hash_memo.get(memo_key)
+        if digest is None:
+            digest = file_sha256(pdf_path)
+            self._hash_memo[memo_key] = digest
+        return digest
+
+    def key_for(self, pdf_path: Path, version: str) -> str:
+        return hashlib.sha256(f"{self.content_hash(pdf_path)}:{version}".encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # Corrupt or unreadable entry: treat as a miss, it will be rewritten.
+            return None
+
+    def put(self, key: str, record: dict) -> None:
+        atomic_write_text(self._path(key), json.dumps(record), durable=False)  # safe with concurrent writers
+
+
+_extraction_cache: Optional[ExtractionCache] = None
+
+
+def get_extraction_cache() -> ExtractionCache:
+    global _extraction_cache
+    if _extraction_cache is None:
+        _extraction_cache = ExtractionCache(CACHE_DIR / "extraction")
+    return _extraction_cache
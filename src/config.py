@@ -1,11 +1,47 @@
 """
 Configuration loader for environment variables (.env).
+
+Values come from the process environment, falling back to .env. The file
+is only read, never copied into os.environ, so importing this module has
+no side effects; main.py imports it once a command actually runs.
 """
 import os
-from dotenv import load_dotenv
+from pathlib import Path
+from dotenv import dotenv_values, find_dotenv
+
+_env = {**dotenv_values(find_dotenv()), **os.environ}  # MISTRAL_API_KEY, OPENAI_API_KEY if present
+
 
-load_dotenv()  # loads MISTRAL_API_KEY, OPENAI_API_KEY if present
+def getenv(name: str, default: str | None = None) -> str | None:
+    value = _env.get(name)
+    return default if value is None else value
 
-MISTRAL_API_KEY: str | None = os.getenv("MISTRAL_API_KEY")
+
+MISTRAL_API_KEY: str | None = getenv("MISTRAL_API_KEY")
 # You can add more later:
-# OPENAI_API_KEY: str | None = os.getenv("OPENAI_API_KEY")
+# OPENAI_API_KEY: str | None = getenv("OPENAI_API_KEY")
+
+# On-disk caches (extracted PDF text, ...). Safe to delete at any time.
+CACHE_DIR: Path = Path(getenv("RGPT_CACHE_DIR", ".cache"))
+
+# Batch run journal used by --resume (src/manifest.py)
+MANIFEST_PATH: Path = Path(getenv("RGPT_MANIFEST_PATH", "results/run_manifest.sqlite"))
+
+# Every batch result (texts, metadata, timings, token counts) in one file (src/results_store.py)
+RESULTS_DB_PATH: Path = Path(getenv("RGPT_RESULTS_DB_PATH", "results/results.sqlite"))
+
+# Persistent corpus-wide retrieval index (src/corpus_index.py)
+INDEX_DIR: Path = Path(getenv("RGPT_INDEX_DIR", str(CACHE_DIR / "corpus_index")))
+
+# Shared LLM client (src/llm_client.py). Leave RPM/TPM unset for no client-side limit.
+MISTRAL_SERVER_URL: str | None = getenv("MISTRAL_SERVER_URL")  # e.g. a local stub server
+LLM_RPM: float | None = float(getenv("RGPT_LLM_RPM", "0")) or None
+LLM_TPM: float | None = float(getenv("RGPT_LLM_TPM", "0")) or None
+LLM_MAX_CONNECTIONS: int = int(getenv("RGPT_LLM_MAX_CONNECTIONS", "16"))
+LLM_MAX_RETRIES: int = int(getenv("RGPT_LLM_MAX_RETRIES", "5"))
+LLM_TIMEOUT_S: float = float(getenv("RGPT_LLM_TIMEOUT_S", "120"))
+
+# Persistent LLM response cache (src/llm_cache.py)
+LLM_CACHE_PATH: Path = Path(getenv("RGPT_LLM_CACHE_PATH", str(CACHE_DIR / "llm_responses.sqlite")))
+LLM_CACHE_MAX_ENTRIES: int = int(getenv("RGPT_LLM_CACHE_MAX_ENTRIES", "100000"))
+LLM_CACHE_TTL_S: float | None = float(getenv("RGPT_LLM_CACHE_TTL_S", "0")) or None
@@ -0,0 +1,94 @@
+"""
+context_utils.py — pack retrieval hits into a token budget
+----------------------------------------------------------
+Turns scored retrieval hits into the excerpt list sent to the LLM:
+  1. walk hits in score order
+  2. trim text that overlaps an already selected excerpt (the 150-char
+     overlap between neighbouring chunks would otherwise be sent twice)
+  3. drop near-duplicates (word-shingle Jaccard similarity)
+  4. stop when the token budget is full; the last excerpt that doesn't fit
+     is cut at a sentence boundary if enough room is left
+"""
+import re
+from typing import List, Sequence, Tuple, Union
+
+from src.text_utils import CHARS_PER_TOKEN, estimate_tokens, word_shingles
+
+# Defaults replacing the old fixed slices (chunks[:5], chunks[:8], raw[:2000])
+SUMMARY_BUDGET_TOKENS = 2000
+ANALYSIS_BUDGET_TOKENS = 3000
+COMPARE_BUDGET_TOKENS = 2500  # per paper
+
+NEAR_DUP_JACCARD = 0.8
+MIN_OVERLAP_CHARS = 40
+MAX_OVERLAP_CHARS = 400
+MIN_TAIL_TOKENS = 60  # don't bother packing a truncated excerpt shorter than this
+
+HitLike = Union[str, Tuple[float, str], Tuple[float, Tuple[str, str]]]
+
+
+def _as_scored(items: Sequence[HitLike]) -> List[Tuple[float, str]]:
+    """Accept plain strings (rank order), (score, text) or indexer hits."""
+    scored = []
+    for rank, item in enumerate(items):
+        if isinstance(item, str):
+            scored.append((-float(rank), item))
+        else:
+            score, payload = item
+            scored.append((float(score), payload[1] if isinstance(payload, tuple) else payload))
+    return scored
+
+
+def _overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of a that is also a prefix of b."""
+    for k in range(min(MAX_OVERLAP_CHARS, len(a), len(b)), MIN_OVERLAP_CHARS - 1, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+
+def _cut_to_tokens(text: str, tokens: int) -> str:
+    cut = text[: tokens * CHARS_PER_TOKEN]
+    m = re.search(r"^.*[.!?](?=\s|$)", cut, flags=re.S)
+    return (m.group(0) if m and len(m.group(0)) > len(cut) // 2 else cut).strip()
+
+
+def pack_context(
+    hits: Sequence[HitLike],
+    budget_tokens: int,
+    near_dup: float = NEAR_DUP_JACCARD,
+) -> List[str]:
+    """Best-scoring, de-duplicated excerpts that fit in budget_tokens."""
+    selected: List[str] = []
+    selected_shingles: List[set] = []
+    used = 0
+
+    for _score, text in sorted(_as_scored(hits), key=lambda h: h[0], reverse=True):
+        text = text.strip()
+        for prev in selected:
+            head = _overlap(prev, text)
+            if head:
+                text = text[head:].lstrip()
+            tail = _overlap(text, prev)
+            if tail:
+                text = text[: len(text) - tail].rstrip()
+        if not text:
+            continue
+
+        sh = word_shingles(text)
+        if sh and any(len(sh & other) / len(sh | other) >= near_dup for other in selected_shingles if other):
+            continue
+
+        remaining = budget_tokens - used
+        t = estimate_tokens(text)
+        if t > remaining:
+            if remaining < MIN_TAIL_TOKENS:
+                break
+            text = _cut_to_tokens(text, remaining)
+            t = estimate_tokens(text)
+        selected.append(text)
+        selected_shingles.append(sh)
+        used += t
+        if used >= budget_tokens:
+            break
+    return selected
@@ -0,0 +1,500 @@
+"""
+corpus_index.py — persistent, incrementally updated TF-IDF index over a corpus
+-----------------------------------------------------------------------------
+Unlike indexer.build_index (one throwaway index per paper), this index
+covers every chunk of every paper and lives on disk:
+
+  <root>/CURRENT              name of the live version directory
+  <root>/g<M>/*.bin           append-only rows: raw term-count CSR arrays,
+                              row -> paper/chunk, UTF-8 chunk texts
+                              (chunks.bin, addressed by offsets.bin) and
+                              the vocabulary (terms.txt, one term per line)
+  <root>/v<N>/index.json      which generation, and how many rows, values,
+                              text and vocabulary bytes of it are visible
+  <root>/v<N>/papers.json     per paper: path, content hash, id, row range
+  <root>/v<N>/df.npy          document frequencies of the live rows
+
+Raw counts are stored rather than TF-IDF weights, so adding a paper only
+appends rows and bumps document frequencies; IDF (and the row norms that
+depend on it) is applied at query time (same smooth-idf formula and
+max_df cut as indexer.build_index). An update appends the rows of new
+and changed papers to the generation files and writes a new, small
+version directory; rows of changed or removed papers stay in place as
+dead rows, masked out of searches, until they make up COMPACT_DEAD_FRACTION
+of the rows and the live ones are copied into a fresh generation. So one
+changed PDF costs I/O proportional to that PDF, not to the corpus.
+
+Readers map only the prefix their version names, so appends never
+disturb them, and CURRENT flips atomically; the previous version (and
+its generation) is kept until the next save for readers still using it.
+Arrays and chunks.bin are memory-mapped on load, so opening a 100k-chunk
+index does no parsing. scipy and scikit-learn are imported on first use,
+so opening an index to list its papers stays cheap.
+"""
+import json
+import mmap
+import os
+import re
+import shutil
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.cache_utils import get_extraction_cache
+from src.indexer import QUERY_BLOCK, top_k_indices
+from src.pdf_utils import load_pdf_text
+from src.text_utils import chunk_text, clean_text
+
+if TYPE_CHECKING:
+    from scipy.sparse import csr_matrix
+
+MAX_DF = 0.9  # same document-frequency cut-off as indexer.build_index
+COMPACT_DEAD_FRACTION = 0.3  # rewrite the live rows once this share of rows is dead
+INDEX_FORMAT = 2
+_VERSION_DIR = re.compile(r"v\d+")
+_GENERATION_DIR = re.compile(r"g\d+")
+# append-only generation files: name -> (dtype, which length counts its entries)
+_COLUMNS = {
+    "data": (np.float32, "nnz"),
+    "indices": (np.int32, "nnz"),
+    "indptr": (np.int64, "rows+1"),
+    "row_paper": (np.int32, "rows"),
+    "row_chunk": (np.int32, "rows"),
+    "offsets": (np.int64, "rows+1"),
+}
+_EMPTY = {"generation": None, "rows": 0, "nnz": 0, "text_bytes": 0, "terms_bytes": 0, "next_paper_id": 0}
+
+
+@lru_cache(maxsize=1)
+def _analyzer() -> Callable[[str], List[str]]:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    return TfidfVectorizer(stop_words="english", lowercase=True).build_analyzer()
+
+
+def paper_key(pdf_path: Path) -> str:
+    return str(Path(pdf_path).resolve())
+
+
+def _entries(name: str, state: dict) -> int:
+    counted = _COLUMNS[name][1]
+    return state["nnz"] if counted == "nnz" else state["rows"] + (counted == "rows+1")
+
+
+def _map(path: Path, dtype, count: int) -> np.ndarray:
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+def _read_prefix(path: Path, size: int) -> bytes:
+    if size == 0:
+        return b""
+    with path.open("rb") as f:
+        return f.read(size)
+
+
+class _Block:
+    """Rows about to be appended to a generation."""
+
+    def __init__(self):
+        self.data: List[np.ndarray] = []
+        self.indices: List[np.ndarray] = []
+        self.row_lengths: List[np.ndarray] = []
+        self.row_paper: List[np.ndarray] = []
+        self.row_chunk: List[np.ndarray] = []
+        self.texts: List[bytes] = []
+        self.text_lengths: List[np.ndarray] = []
+        self.terms: List[str] = []
+
+    @staticmethod
+    def _cat(parts, dtype) -> np.ndarray:
+        return np.concatenate(parts).astype(dtype, copy=False) if parts else np.zeros(0, dtype=dtype)
+
+    def write(self, gdir: Path, base: dict) -> dict:
+        """Append to the generation files after `base` (truncating any unrecorded tail); return the new state."""
+        lengths = self._cat(self.row_lengths, np.int64)
+        text_lengths = self._cat(self.text_lengths, np.int64)
+        texts = b"".join(self.texts)
+        terms = "".join(f"{t}\n" for t in self.terms).encode("utf-8")
+        state = {
+            **base,
+            "rows": base["rows"] + len(lengths),
+            "nnz": base["nnz"] + int(lengths.sum()),
+            "text_bytes": base["text_bytes"] + len(texts),
+            "terms_bytes": base["terms_bytes"] + len(terms),
+        }
+        columns = {
+            "data": self._cat(self.data, np.float32),
+            "indices": self._cat(self.indices, np.int32),
+            "indptr": base["nnz"] + np.cumsum(lengths),
+            "row_paper": self._cat(self.row_paper, np.int32),
+            "row_chunk": self._cat(self.row_chunk, np.int32),
+            "offsets": base["text_bytes"] + np.cumsum(text_lengths),
+        }
+        if base["rows"] == 0:  # fresh generation: the pointer arrays start at 0
+            columns["indptr"] = np.concatenate([[0], columns["indptr"]])
+            columns["offsets"] = np.concatenate([[0], columns["offsets"]])
+        appends = {f"{name}.bin": (values.astype(_COLUMNS[name][0], copy=False).tobytes(),
+                                   (_entries(name, base) if base["rows"] else 0) * np.dtype(_COLUMNS[name][0]).itemsize)
+                   for name, values in columns.items()}
+        appends["chunks.bin"] = (texts, base["text_bytes"])
+        appends["terms.txt"] = (terms, base["terms_bytes"])
+        for name, (payload, offset) in appends.items():
+            path = gdir / name
+            with path.open("r+b" if path.exists() else "wb") as f:
+                f.truncate(offset)  # drop whatever a crashed update left past the recorded length
+                f.seek(offset)
+                f.write(payload)
+        return state
+
+
+class CorpusIndex:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.vocab: Dict[str, int] = {}
+        self.papers: Dict[str, dict] = {}
+        self.state: dict = dict(_EMPTY)
+        self.arrays: Dict[str, np.ndarray] = {
+            name: np.zeros(1 if counted == "rows+1" else 0, dtype=dtype) for name, (dtype, counted) in _COLUMNS.items()
+        }
+        self.arrays["df"] = np.zeros(0, dtype=np.int64)
+        self._text: Optional[mmap.mmap] = None
+        self._matrix: Optional["csr_matrix"] = None
+        self._papers_by_id: Optional[Dict[int, dict]] = None
+        self._idf: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+        self._alive: Optional[np.ndarray] = None
+
+    # ------------------------------------------------------------------
+    # Loading / saving
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def load(cls, root: Path) -> "CorpusIndex":
+        """Open the index at root (memory-mapped), or an empty one if none exists."""
+        index = cls(root)
+        current = index.root / "CURRENT"
+        if not current.exists():
+            return index
+        vdir = index.root / current.read_text(encoding="utf-8").strip()
+        meta_path = vdir / "index.json"
+        state = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {}
+        if state.get("format") != INDEX_FORMAT:
+            print(f"[WARN] Corpus index at {index.root} has an older format; it will be rebuilt on the next update")
+            return index
+        index.state = state
+        index.papers = json.loads((vdir / "papers.json").read_text(encoding="utf-8"))
+        index.arrays["df"] = np.load(vdir / "df.npy", mmap_mode="r")
+        if state["generation"] is None:
+            return index
+        gdir = index.root / state["generation"]
+        terms = _read_prefix(gdir / "terms.txt", state["terms_bytes"]).decode("utf-8").split("\n")[:-1]
+        index.vocab = {t: i for i, t in enumerate(terms)}
+        for name, (dtype, _counted) in _COLUMNS.items():
+            index.arrays[name] = _map(gdir / f"{name}.bin", dtype, _entries(name, state))
+        if state["text_bytes"]:
+            with (gdir / "chunks.bin").open("rb") as f:
+                index._text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return index
+
+    def _save(self, state: dict, df: np.ndarray) -> None:
+        current = self.root / "CURRENT"
+        old = current.read_text(encoding="utf-8").strip() if current.exists() else None
+        version = int(old[1:]) + 1 if old else 1
+        vdir = self.root / f"v{version}"
+        if vdir.exists():
+            shutil.rmtree(vdir)
+        vdir.mkdir()
+        np.save(vdir / "df.npy", df)
+        (vdir / "papers.json").write_text(json.dumps(self.papers, indent=1), encoding="utf-8")
+        (vdir / "index.json").write_text(json.dumps({**state, "format": INDEX_FORMAT}), encoding="utf-8")
+
+        tmp = self.root / "CURRENT.tmp"
+        tmp.write_text(vdir.name, encoding="utf-8")
+        os.replace(tmp, current)
+        # Keep the previous version and its generation: readers that loaded it
+        # before this save (a running server, a concurrent search) still use them.
+        keep = {vdir.name, old, state["generation"], self.state.get("generation")}
+        for stale in self.root.iterdir():
+            if (_VERSION_DIR.fullmatch(stale.name) or _GENERATION_DIR.fullmatch(stale.name)) and stale.name not in keep:
+                shutil.rmtree(stale, ignore_errors=True)
+        loaded = CorpusIndex.load(self.root)
+        self.__dict__.update(loaded.__dict__)
+
+    # ------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------
+
+    def update(self, pdfs: Iterable[Path], prune: bool = False) -> Dict[str, int]:
+        """
+        Add new PDFs, re-index changed ones (by content hash) and leave the
+        rest untouched. prune=True also drops papers not in `pdfs` (or that
+        can no longer be read).
+        Returns counts of added / updated / unchanged / removed papers.
+        """
+        cache = get_extraction_cache()
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0}
+        seen = set()
+        fresh: List[Tuple[str, dict, List[str]]] = []
+        stale = set()
+
+        for pdf_path in pdfs:
+            key = paper_key(pdf_path)
+            try:
+                digest = cache.content_hash(pdf_path)
+            except OSError as e:
+                # deleted (or unreadable) since it was listed: treat it as gone
+                print(f"[WARN] Skipping {Path(pdf_path).name}: {e}")
+                continue
+            seen.add(key)
+            known = self.papers.get(key)
+            if known is not None and known["hash"] == digest:
+                stats["unchanged"] += 1
+                continue
+            try:
+                chunks = chunk_text(clean_text(load_pdf_text(pdf_path)), max_chars=1500, overlap=150)
+            except Exception as e:
+                print(f"[WARN] Failed to index {Path(pdf_path).name}: {e}")
+                continue
+            if known is not None:
+                stale.add(key)
+            stats["updated" if known is not None else "added"] += 1
+            fresh.append((key, {"path": str(pdf_path), "stem": Path(pdf_path).stem, "hash": digest}, chunks))
+
+        if prune:
+            gone = set(self.papers) - seen
+            stale |= gone
+            stats["removed"] = len(gone)
+
+        if fresh or stale:
+            self._apply(stale, fresh)
+        return stats
+
+    def _apply(self, drop: set, fresh: List[Tuple[str, dict, List[str]]]) -> None:
+        """Mark dropped papers' rows dead, append the fresh ones and save a new version."""
+        a = self.arrays
+        df = np.asarray(a["df"], dtype=np.int64).copy()
+        papers = dict(self.papers)
+        for key in drop:
+            start, end = papers.pop(key)["rows"]
+            lo, hi = a["indptr"][start], a["indptr"][end]
+            # each row stores a term at most once, so this undoes its df contribution
+            df -= np.bincount(np.asarray(a["indices"][lo:hi]), minlength=len(df))
+
+        live = sum(info["rows"][1] - info["rows"][0] for info in papers.values())
+        added = sum(len(chunks) for _key, _info, chunks in fresh)
+        dead = self.state["rows"] - live
+        self.root.mkdir(parents=True, exist_ok=True)
+        block = _Block()
+        n_rows = 0  # rows in the block
+        if self.state["generation"] is None or dead > COMPACT_DEAD_FRACTION * (self.state["rows"] + added):
+            # Compact: copy the live rows into a new generation, with the vocabulary.
+            number = max((int(d.name[1:]) for d in self.root.iterdir() if _GENERATION_DIR.fullmatch(d.name)), default=0)
+            generation = f"g{number + 1}"
+            (self.root / generation).mkdir()
+            base = {**self.state, "generation": generation, "rows": 0, "nnz": 0, "text_bytes": 0, "terms_bytes": 0}
+            block.terms = list(self.vocab)
+            for key, info in list(papers.items()):
+                start, end = info["rows"]
+                lo, hi = a["indptr"][start], a["indptr"][end]
+                block.data.append(np.asarray(a["data"][lo:hi]))
+                block.indices.append(np.asarray(a["indices"][lo:hi]))
+                block.row_lengths.append(np.diff(a["indptr"][start:end + 1]))
+                block.row_paper.append(np.asarray(a["row_paper"][start:end]))
+                block.row_chunk.append(np.asarray(a["row_chunk"][start:end]))
+                # chunk texts of a paper are contiguous: copy them as one block
+                block.texts.append(bytes(self._text[int(a["offsets"][start]):int(a["offsets"][end])]))
+                block.text_lengths.append(np.diff(a["offsets"][start:end + 1]))
+                papers[key] = {**info, "rows": [n_rows, n_rows + end - start]}
+                n_rows += end - start
+        else:
+            base = dict(self.state)
+
+        new_cols: List[np.ndarray] = []
+        analyze = _analyzer()
+        vocab = self.vocab
+        next_id = base["next_paper_id"]
+        for key, info, chunks in fresh:
+            first = base["rows"] + n_rows
+            for chunk in chunks:
+                counts = Counter(analyze(chunk))
+                cols = np.empty(len(counts), dtype=np.int32)
+                for j, t in enumerate(counts):
+                    col = vocab.get(t)
+                    if col is None:
+                        col = vocab[t] = len(vocab)
+                        block.terms.append(t)
+                    cols[j] = col
+                vals = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+                order = np.argsort(cols)
+                block.data.append(vals[order])
+                block.indices.append(cols[order])
+                new_cols.append(cols)
+                block.row_lengths.append(np.array([len(cols)]))
+                blob = chunk.encode("utf-8")
+                block.texts.append(blob)
+                block.text_lengths.append(np.array([len(blob)]))
+            block.row_paper.append(np.full(len(chunks), next_id, dtype=np.int32))
+            block.row_chunk.append(np.arange(1, len(chunks) + 1, dtype=np.int32))
+            papers[key] = {**info, "id": next_id, "rows": [first, first + len(chunks)]}
+            n_rows += len(chunks)
+            next_id += 1
+
+        df = np.concatenate([df, np.zeros(len(vocab) - len(df), dtype=np.int64)])
+        if new_cols:
+            df += np.bincount(np.concatenate(new_cols), minlength=len(vocab))
+        state = block.write(self.root / base["generation"], {**base, "next_paper_id": next_id})
+        self.papers = papers
+        self._save(state, df)
+
+    # ------------------------------------------------------------------
+    # Querying
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        """Live rows (chunks of indexed papers)."""
+        return int(sum(info["rows"][1] - info["rows"][0] for info in self.papers.values()))
+
+    @property
+    def n_rows(self) -> int:
+        """Stored rows, including dead ones awaiting compaction; row ids run up to this."""
+        return len(self.arrays["row_paper"])
+
+    @property
+    def alive(self) -> np.ndarray:
+        """Boolean mask over the stored rows: True for rows of indexed papers."""
+        if self._alive is None:
+            alive = np.zeros(self.n_rows, dtype=bool)
+            for info in self.papers.values():
+                alive[info["rows"][0]:info["rows"][1]] = True
+            self._alive = alive
+        return self._alive
+
+    @property
+    def matrix(self) -> "csr_matrix":
+        """Raw counts of every stored row (dead rows included; see alive)."""
+        if self._matrix is None:
+            from scipy.sparse import csr_matrix
+
+            a = self.arrays
+            self._matrix = csr_matrix(
+                (a["data"], a["indices"], a["indptr"]),
+                shape=(self.n_rows, len(self.vocab)),
+                copy=False,
+            )
+        return self._matrix
+
+    def idf(self) -> np.ndarray:
+        """Smooth IDF (sklearn's formula); terms above MAX_DF get weight 0."""
+        if self._idf is not None:
+            return self._idf
+        n = len(self)
+        df = np.asarray(self.arrays["df"], dtype=np.float64)
+        idf = np.log((1.0 + n) / (1.0 + df)) + 1.0
+        if n:
+            idf[df > MAX_DF * n] = 0.0
+        self._idf = idf
+        return idf
+
+    def norms(self) -> np.ndarray:
+        """L2 norms of the idf-weighted rows (0 for dead rows); computed once per loaded version."""
+        if self._norms is None:
+            if not self.n_rows:
+                return np.zeros(0, dtype=np.float64)
+            sq = self.matrix.multiply(self.matrix)
+            norms = np.sqrt(sq @ (self.idf() ** 2))
+            norms[~self.alive] = 0.0
+            self._norms = norms
+        return self._norms
+
+    def chunk_text(self, row: int) -> str:
+        lo, hi = int(self.arrays["offsets"][row]), int(self.arrays["offsets"][row + 1])
+        return self._text[lo:hi].decode("utf-8")
+
+    def row_paper(self, row: int) -> dict:
+        if self._papers_by_id is None:
+            self._papers_by_id = {info["id"]: info for info in self.papers.values()}
+        return self._papers_by_id[int(self.arrays["row_paper"][row])]
+
+    def label(self, row: int) -> str:
+        return f"{self.row_paper(row)['stem']} [chunk {int(self.arrays['row_chunk'][row])}]"
+
+    def query_matrix(self, queries: List[str], idf: Optional[np.ndarray] = None) -> "csr_matrix":
+        """
+        Sparse (vocab x queries) matrix of L2-normalised query TF-IDF weights,
+        multiplied by idf once more so that matrix @ Q gives dot products
+        against the idf-weighted rows.
+        """
+        from scipy.sparse import csr_matrix
+
+        idf = self.idf() if idf is None else idf
+        analyze = _analyzer()
+        rows: List[int] = []
+        cols: List[int] = []
+        vals: List[float] = []
+        for j, query in enumerate(queries):
+            terms = [(self.vocab[t], c) for t, c in Counter(analyze(query)).items() if t in self.vocab]
+            if not terms:
+                continue
+            idx = np.array([t for t, _ in terms])
+            w = np.array([c for _, c in terms], dtype=np.float64) * idf[idx]
+            norm = np.linalg.norm(w)
+            if norm:
+                w = w / norm * idf[idx]
+            rows.extend(idx.tolist())
+            cols.extend([j] * len(idx))
+            vals.extend(w.tolist())
+        return csr_matrix((vals, (rows, cols)), shape=(len(self.vocab), len(queries)))
+
+    def search(self, query: str, k: int = 5, paper: Optional[Path] = None) -> List[Tuple[float, Tuple[str, str]]]:
+        """
+        Cosine-similarity top-k over the whole corpus (or one paper).
+        Returns [(score, (label, chunk_text)), ...] like indexer.search.
+        """
+        return self.search_batch([query], k=k, paper=paper)[0]
+
+    def hit(self, score: float, row: int) -> Tuple[float, Tuple[str, str]]:
+        """A ranked row in the indexer.search hit format."""
+        return float(score), (self.label(row), self.chunk_text(row))
+
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        paper: Optional[Path] = None,
+    ) -> List[List[Tuple[float, Tuple[str, str]]]]:
+        return [[self.hit(score, row) for score, row in ranked] for ranked in self.rank_batch(queries, k=k, paper=paper)]
+
+    def rank_batch(
+        self,
+        queries: List[str],
+        k: int = 5,
+        paper: Optional[Path] = None,
+    ) -> List[List[Tuple[float, int]]]:
+        """Top-k (score, row id) per query, scoring a block of queries with one sparse product against the matrix."""
+        start, end = 0, self.n_rows
+        if paper is not None:
+            info = self.papers.get(paper_key(paper))
+            if info is None:
+                return [[] for _ in queries]
+            start, end = info["rows"]
+        if end <= start:
+            return [[] for _ in queries]
+
+        norms = self.norms()[start:end]
+        dead = ~self.alive[start:end]
+        matrix = self.matrix[start:end]
+        idf = self.idf()
+        results = []
+        for b in range(0, len(queries), QUERY_BLOCK):
+            dots = (matrix @ self.query_matrix(queries[b:b + QUERY_BLOCK], idf)).toarray()  # (rows x queries)
+            sims = np.divide(dots, norms[:, None], out=np.zeros_like(dots), where=norms[:, None] > 0)
+            sims[dead] = -np.inf
+            for col in range(sims.shape[1]):
+                scores = sims[:, col]
+                results.append([(float(scores[i]), start + int(i)) for i in top_k_indices(scores, k) if not dead[i]])
+        return results
@@ -0,0 +1,181 @@
+"""
+dedup.py — near-duplicate papers via MinHash signatures and LSH
+---------------------------------------------------------------
+arXiv v1/v2/v3 copies, preprint vs camera-ready and the same PDF under a
+different name should not each cost a full set of LLM calls. Every paper
+gets a NUM_PERM-value MinHash signature over the 5-word shingles of its
+clean_text; the fraction of equal values estimates the Jaccard similarity
+of two papers' shingle sets.
+
+  signature(pdf)   cached beside the extraction record (content hash +
+                   extractor), so a corpus is shingled once
+  MinHashIndex     LSH buckets (BANDS bands of ROWS values: pairs above
+                   ~0.7 Jaccard almost always share a bucket) for
+                   incremental duplicate checks during a batch run, and
+                   the signature matrix for ranked lookups (main.py
+                   similar) and the N x N matrix (main.py similarity-matrix)
+
+Shingles are hashed with CRC32 rather than the per-process salted hash(),
+so signatures from worker processes and earlier runs are comparable.
+"""
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src import profiling
+from src.cache_utils import get_extraction_cache
+from src.indexer import top_k_indices
+from src.options import DEDUP_THRESHOLD
+from src.pdf_utils import extract_pdf, extraction_settings, extractor_version
+from src.text_utils import clean_text, word_shingles
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_WORDS = 5
+SIGNATURE_FORMAT = 2  # bump when shingling or hashing changes
+MATRIX_BLOCK_CELLS = 1 << 25  # comparisons per step of similarity_matrix
+
+# Multiply-shift hashing h -> ((a*h + b) mod 2**64) >> 32 with odd 64-bit a,
+# computed in wrapping uint64 arithmetic. (a*h + b) mod p with small a and h
+# wraps too rarely to permute: every minimum tracked the smallest shingle
+# hashes and estimates ran far above the true Jaccard. Fixed seed:
+# signatures are stored.
+_rng = np.random.RandomState(1_000_003)
+_A = (_rng.randint(0, 1 << 63, size=NUM_PERM, dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+_B = _rng.randint(0, 1 << 63, size=NUM_PERM, dtype=np.uint64) << np.uint64(1)
+_SHIFT = np.uint64(32)
+_HASH_BLOCK = 4096  # shingles per step, bounds the (perm x shingle) temporary
+
+Signature = np.ndarray  # (NUM_PERM,) uint64
+
+
+def _crc32(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def minhash(hashes: np.ndarray) -> Signature:
+    sig = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    for lo in range(0, len(hashes), _HASH_BLOCK):
+        h = hashes[lo:lo + _HASH_BLOCK]
+        np.minimum(sig, ((_A[:, None] * h[None, :] + _B[:, None]) >> _SHIFT).min(axis=1), out=sig)
+    return sig
+
+
+def text_signature(text: str) -> Optional[Signature]:
+    """MinHash of the paper's shingles; None when there is no text to compare."""
+    with profiling.stage("dedup.signature") as st:
+        shingles = word_shingles(clean_text(text), SHINGLE_WORDS, hash_fn=_crc32)
+        st.add(shingles=len(shingles))
+        if not shingles:
+            return None
+        return minhash(np.fromiter(shingles, dtype=np.uint64, count=len(shingles)))
+
+
+def signature(pdf_path: Path) -> Optional[Signature]:
+    """Signature of one PDF, from the cache when this content was shingled before."""
+    cache = get_extraction_cache()
+    version = f"minhash-{SIGNATURE_FORMAT}-{NUM_PERM}:{extractor_version(extraction_settings().extractor)}"
+    key = cache.key_for(pdf_path, version)
+    cached = cache.get(key)
+    if cached is not None:
+        return np.array(cached["signature"], dtype=np.uint64) if cached["signature"] else None
+    record = extract_pdf(pdf_path)
+    sig = text_signature("\n\n".join(p.strip() for p in record["pages"] if p and p.strip()))
+    if not record.get("timed_out_pages"):  # partial text: recompute next time
+        cache.put(key, {"signature": sig.tolist() if sig is not None else None})
+    return sig
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Estimated Jaccard similarity of the two papers' shingle sets."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def _signature_entry(pdf_path: Path) -> Tuple[Path, Optional[Signature], Optional[str]]:
+    try:
+        return pdf_path, signature(pdf_path), None
+    except Exception as e:
+        return pdf_path, None, str(e)
+
+
+def corpus_signatures(paths: Iterable[Path], workers: int = 1) -> Iterator[Tuple[Path, Signature]]:
+    """(path, signature) for every readable PDF with text, in input order; others are skipped with a warning."""
+    paths = [Path(p) for p in paths]
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            entries = list(pool.map(_signature_entry, paths, chunksize=8))
+    else:
+        entries = (_signature_entry(p) for p in paths)
+    for pdf_path, sig, error in entries:
+        if error is not None or sig is None:
+            print(f"[WARN] {pdf_path.name}: {error or 'no extractable text'}", file=sys.stderr)
+            continue
+        yield pdf_path, sig
+
+
+class MinHashIndex:
+    """Signatures of a set of papers, bucketed by LSH band."""
+
+    def __init__(self):
+        self.keys: List[Path] = []
+        self._sigs: List[Signature] = []
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self._matrix: Optional[np.ndarray] = None
+
+    @classmethod
+    def build(cls, items: Iterable[Tuple[Path, Signature]]) -> "MinHashIndex":
+        index = cls()
+        for key, sig in items:
+            index.add(key, sig)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @staticmethod
+    def _bands(sig: Signature) -> Iterator[Tuple[int, bytes]]:
+        for band in range(BANDS):
+            yield band, sig[band * ROWS:(band + 1) * ROWS].tobytes()
+
+    def add(self, key: Path, sig: Signature) -> None:
+        i = len(self.keys)
+        self.keys.append(key)
+        self._sigs.append(sig)
+        self._matrix = None
+        for bucket in self._bands(sig):
+            self._buckets.setdefault(bucket, []).append(i)
+
+    def near_duplicates(self, sig: Signature, threshold: float = DEDUP_THRESHOLD) -> List[Tuple[float, Path]]:
+        """Indexed papers sharing an LSH bucket with sig and at least `threshold` similar, best first."""
+        candidates: Set[int] = set()
+        for bucket in self._bands(sig):
+            candidates.update(self._buckets.get(bucket, ()))
+        scored = [(similarity(sig, self._sigs[i]), self.keys[i]) for i in candidates]
+        return sorted((s for s in scored if s[0] >= threshold), key=lambda s: s[0], reverse=True)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.vstack(self._sigs) if self._sigs else np.zeros((0, NUM_PERM), dtype=np.uint64)
+        return self._matrix
+
+    def similar(self, sig: Signature, k: int = 10) -> List[Tuple[float, Path]]:
+        """The k most similar indexed papers by estimated Jaccard (a full scan of the signatures)."""
+        sims = np.count_nonzero(self.matrix == sig, axis=1) / NUM_PERM
+        return [(float(sims[i]), self.keys[i]) for i in top_k_indices(sims, k)]
+
+    def similarity_matrix(self) -> np.ndarray:
+        """N x N estimated Jaccard similarities, computed in row blocks to bound memory."""
+        m = self.matrix
+        n = len(m)
+        out = np.empty((n, n), dtype=np.float32)
+        block = max(1, MATRIX_BLOCK_CELLS // max(1, n * NUM_PERM))
+        for lo in range(0, n, block):
+            hi = min(n, lo + block)
+            out[lo:hi] = np.count_nonzero(m[lo:hi, None, :] == m[None, :, :], axis=2) / NUM_PERM
+        return out
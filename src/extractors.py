@@ -0,0 +1,131 @@
+"""
+extractors.py — pluggable PDF text backends
+-------------------------------------------
+  pypdf2   PyPDF2 (default; pure Python, always installed)
+  pypdf    pypdf, PyPDF2's maintained successor (pure Python)   pip install pypdf
+  pymupdf  MuPDF through PyMuPDF (C; usually far faster)        pip install pymupdf
+
+A backend opens a document once and hands out page count, per-page text,
+first-page text spans ([font_size, x, y, text], PDF coordinates with y
+growing upwards, for the layout-aware title) and the embedded title.
+pdf_utils picks the backend per run, splits large documents into page
+ranges for worker processes and enforces per-page timeouts.
+
+Optional backends are imported on first use, so a missing package only
+matters when it is selected.
+"""
+import math
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+EXTRACTORS = ("pypdf2", "pypdf", "pymupdf")
+DEFAULT_EXTRACTOR = "pypdf2"
+
+
+class Document(ABC):
+    """One open PDF; subclasses wrap a backend's reader (and must implement every abstract method)."""
+
+    page_count: int = 0
+
+    @abstractmethod
+    def page_text(self, index: int) -> str:
+        ...
+
+    @abstractmethod
+    def first_page(self) -> Tuple[str, List[list]]:
+        """Text of the first page plus its text spans, in one pass where the backend allows it."""
+
+    def embedded_title(self) -> Optional[str]:
+        return None
+
+    def close(self) -> None:
+        pass
+
+
+class _PyPDFDocument(Document):
+    """PyPDF2 and pypdf share an API (pypdf is the renamed, maintained project)."""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.page_count = len(reader.pages)
+
+    def page_text(self, index: int) -> str:
+        return self.reader.pages[index].extract_text() or ""
+
+    def first_page(self) -> Tuple[str, List[list]]:
+        """
+        The size is the effective one (Tf size scaled by the text and
+        transformation matrices), collected in the same extract_text() pass.
+        """
+        if not self.page_count:
+            return "", []
+        spans: List[list] = []
+
+        def visit(text, cm, tm, _font, font_size):
+            if not text or not text.strip():
+                return
+            size = (font_size or 0) * math.hypot(tm[0], tm[1]) * math.hypot(cm[0], cm[1])
+            x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+            y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+            spans.append([round(size, 1), round(x, 1), round(y, 1), text])
+
+        return self.reader.pages[0].extract_text(visitor_text=visit) or "", spans
+
+    def embedded_title(self) -> Optional[str]:
+        try:
+            info = self.reader.metadata or {}
+            return getattr(info, "title", None) or None
+        except Exception:
+            return None
+
+
+class _MuPDFDocument(Document):
+    def __init__(self, doc):
+        self.doc = doc
+        self.page_count = doc.page_count
+
+    def page_text(self, index: int) -> str:
+        return self.doc[index].get_text() or ""
+
+    def first_page(self) -> Tuple[str, List[list]]:
+        if not self.page_count:
+            return "", []
+        page = self.doc[0]
+        height = page.rect.height
+        spans: List[list] = []
+        for block in page.get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                for span in line["spans"]:
+                    if span["text"].strip():
+                        x, y = span["origin"]
+                        spans.append([round(span["size"], 1), round(x, 1), round(height - y, 1), span["text"]])
+        return page.get_text() or "", spans
+
+    def embedded_title(self) -> Optional[str]:
+        return (self.doc.metadata or {}).get("title") or None
+
+    def close(self) -> None:
+        self.doc.close()
+
+
+def open_document(pdf_path: Path, extractor: str = DEFAULT_EXTRACTOR) -> Document:
+    if extractor == "pypdf2":
+        from PyPDF2 import PdfReader
+        return _PyPDFDocument(PdfReader(str(pdf_path)))
+    if extractor == "pypdf":
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise RuntimeError("The pypdf extractor needs the pypdf package: pip install pypdf") from None
+        return _PyPDFDocument(PdfReader(str(pdf_path)))
+    if extractor == "pymupdf":
+        try:
+            import pymupdf
+        except ImportError:
+            try:
+                import fitz as pymupdf  # PyMuPDF < 1.24
+            except ImportError:
+                raise RuntimeError("The pymupdf extractor needs PyMuPDF: pip install pymupdf") from None
+        return _MuPDFDocument(pymupdf.open(str(pdf_path)))
+    raise ValueError(f"Unknown extractor {extractor!r}; expected one of {EXTRACTORS}")
@@ -1,15 +1,24 @@
 """
 Tiny TF-IDF index to support 'intelligent search' across chunks.
 """
-from typing import List, Tuple
+from typing import TYPE_CHECKING, Callable, List, Optional, Sequence, Tuple
 from dataclasses import dataclass
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 
+from src import profiling
+
+if TYPE_CHECKING:
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+# Queries are scored in blocks so the dense (queries x chunks) score
+# matrix stays small even for large corpora.
+QUERY_BLOCK = 256
+
+Hit = Tuple[float, Tuple[str, str]]
+
 @dataclass
 class TfidfIndex:
-    vectorizer: TfidfVectorizer
+    vectorizer: "TfidfVectorizer"
     matrix: np.ndarray
     docs: List[Tuple[str, str]]  # (doc_label, chunk_text)
 
@@ -17,13 +26,60 @@ def build_index(docs: List[Tuple[str, str]]) -> TfidfIndex:
     """
     docs: list of (label, text_chunk)
     """
-    texts = [t for _, t in docs]
-    vec = TfidfVectorizer(stop_words="english", lowercase=True, max_df=0.9)
-    mat = vec.fit_transform(texts)
+    from sklearn.feature_extraction.text import TfidfVectorizer  # heavy; only paid when a paper is indexed
+
+    with profiling.stage("index.build") as st:
+        texts = [t for _, t in docs]
+        vec = TfidfVectorizer(stop_words="english", lowercase=True, max_df=0.9)
+        mat = vec.fit_transform(texts)
+        st.add(chunks=len(texts))
     return TfidfIndex(vectorizer=vec, matrix=mat, docs=docs)
 
-def search(index: TfidfIndex, query: str, k: int = 5) -> List[Tuple[float, Tuple[str, str]]]:
-    qv = index.vectorizer.transform([query])
-    sims = cosine_similarity(qv, index.matrix)[0]
-    top_idx = sims.argsort()[-k:][::-1]
-    return [(float(sims[i]), index.docs[i]) for i in top_idx]
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k largest scores, best first. argpartition is O(n);
+    only the k winners get sorted.
+    """
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.zeros(0, dtype=np.intp)
+    if k >= n:
+        return np.argsort(scores)[::-1]
+    part = np.argpartition(scores, n - k)[n - k:]
+    return part[np.argsort(scores[part])[::-1]]
+
+def search_batch(
+    index: TfidfIndex,
+    queries: Sequence[str],
+    k: int = 5,
+    label_filter: Optional[Callable[[str], bool]] = None,
+) -> List[List[Hit]]:
+    """
+    Score many queries with one sparse matrix product per block.
+
+    TfidfVectorizer rows are already L2-normalised, so the dot product *is*
+    the cosine similarity. label_filter restricts results to chunks whose
+    label it accepts (e.g. lambda lbl: lbl.startswith("paper_stem ")).
+    """
+    with profiling.stage("index.search") as st:
+        st.add(queries=len(queries))
+        rows = np.arange(len(index.docs))
+        matrix = index.matrix
+        if label_filter is not None:
+            rows = np.array([i for i, (lbl, _t) in enumerate(index.docs) if label_filter(lbl)], dtype=np.intp)
+            matrix = matrix[rows]
+        results: List[List[Hit]] = []
+        if len(rows) == 0:
+            return [[] for _ in queries]
+
+        matrix_t = matrix.T.tocsr()
+        for start in range(0, len(queries), QUERY_BLOCK):
+            qv = index.vectorizer.transform(queries[start:start + QUERY_BLOCK])
+            scores = (qv @ matrix_t).toarray()
+            for row_scores in scores:
+                top = top_k_indices(row_scores, k)
+                results.append([(float(row_scores[i]), index.docs[rows[i]]) for i in top])
+    return results
+
+def search(index: TfidfIndex, query: str, k: int = 5) -> List[Hit]:
+    return search_batch(index, [query], k=k)[0]
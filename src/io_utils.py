@@ -1,9 +1,102 @@
 from pathlib import Path
+import os
 import re
+import tempfile
+import time
+from typing import Optional
+
+def _slug(text: str) -> str:
+    text = text.strip().lower()
+    text = re.sub(r"[^a-z0-9]+", "_", text)
+    return re.sub(r"_+", "_", text).strip("_")
 
 def safe_stem(p: Path) -> str:
     # Convert a PDF path to a safe filename stem
-    stem = p.stem.strip().lower()
-    stem = re.sub(r"[^a-z0-9]+", "_", stem)
-    stem = re.sub(r"_+", "_", stem).strip("_")
-    return stem
+    return _slug(p.stem)
+
+def output_stem(p: Path, root: Optional[Path] = None) -> str:
+    """
+    safe_stem, prefixed with the PDF's subdirectory under root (a__b__paper)
+    so same-named papers found by a recursive walk don't overwrite each other.
+    """
+    stem = safe_stem(p)
+    if root is None:
+        return stem
+    try:
+        rel = Path(p).resolve().parent.relative_to(Path(root).resolve())
+    except ValueError:
+        return stem
+    return "__".join([_slug(part) for part in rel.parts] + [stem])
+
+def atomic_write_text(path: Path, text: str, encoding: str = "utf-8", durable: bool = True) -> Path:
+    """
+    Write via a temp file in the same directory + os.replace, so readers
+    (and a crashed run) only ever see the old file or the complete new one.
+    durable=False skips the fsync (fine for caches that can be rebuilt).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding=encoding) as f:
+            f.write(text)
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return path
+
+class MarkdownStream:
+    """
+    Incremental output for a streamed LLM reply. Text is appended (and
+    flushed) to <path>.partial as it arrives and optionally echoed to the
+    terminal; finish() writes the final document to path atomically and
+    removes the partial file. If the run dies, the partial file remains.
+    """
+
+    def __init__(self, path: Path, header: str = "", echo: bool = False):
+        self.path = Path(path)
+        self.partial_path = self.path.with_name(self.path.name + ".partial")
+        self.echo = echo
+        self.started = time.perf_counter()
+        self.first_output_at: Optional[float] = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = self.partial_path.open("w", encoding="utf-8")
+        self._emit(header)
+
+    def _emit(self, text: str) -> None:
+        if not text:
+            return
+        self._f.write(text)
+        self._f.flush()
+        if self.echo:
+            print(text, end="", flush=True)
+
+    def write(self, text: str) -> None:
+        """Append streamed text; the first call fixes time-to-first-token."""
+        if self.first_output_at is None and text:
+            self.first_output_at = time.perf_counter()
+        self._emit(text)
+
+    @property
+    def ttft(self) -> Optional[float]:
+        return None if self.first_output_at is None else self.first_output_at - self.started
+
+    def finish(self, final_text: str) -> Path:
+        self._f.close()
+        if self.echo:
+            print()
+        atomic_write_text(self.path, final_text)
+        self.partial_path.unlink(missing_ok=True)
+        return self.path
+
+    def __enter__(self) -> "MarkdownStream":
+        return self
+
+    def __exit__(self, exc_type, *exc) -> bool:
+        if not self._f.closed:
+            self._f.close()  # keep the partial file for inspection
+        return False
@@ -0,0 +1,98 @@
+"""
+llm_cache.py — persistent LLM response cache (SQLite)
+-----------------------------------------------------
+Responses are keyed on a hash of (model, messages, sampling parameters), so
+re-running the same query only pays for prompts that actually changed.
+Size is bounded with least-recently-used eviction; entries can optionally
+expire after a TTL. Safe to share between threads and processes.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# How the cache is consulted:
+#   "use"     — read and write (default)
+#   "refresh" — ignore existing entries but store the fresh responses
+#   "off"     — bypass the cache completely
+CACHE_MODES = ("use", "refresh", "off")
+
+
+def response_key(model: str, messages: List[Dict[str, str]], params: dict) -> str:
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: Path, max_entries: int = 100_000, ttl_s: Optional[float] = None):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._puts_since_trim = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, model TEXT, value TEXT NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_s is not None and now - row[1] > self.ttl_s:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses(key, model, value, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, model, value, now, now),
+            )
+            self._db.commit()
+            self._puts_since_trim += 1
+            # Trimming is a COUNT(*) scan; amortise it over a batch of writes.
+            if self._puts_since_trim >= 64:
+                self._trim()
+
+    def _trim(self) -> None:
+        self._puts_since_trim = 0
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                (excess,),
+            )
+            self._db.commit()
+            self.evictions += excess
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,414 @@
+"""
+llm_client.py — one shared, rate-limited Mistral client for the whole process
+-----------------------------------------------------------------------------
+- a single Mistral SDK instance per API key, backed by pooled httpx
+  transports (sync + async) so TCP/TLS connections are reused; async
+  pools belong to one event loop, and run_async() closes them before
+  that loop ends
+- a token-bucket scheduler enforcing requests-per-minute and
+  tokens-per-minute budgets across all threads and coroutines
+- retries with exponential backoff + full jitter on 429 / 5xx,
+  honouring Retry-After when the server sends it
+- a persistent response cache (see llm_cache) consulted before any request
+- track_usage() tallies calls and estimated tokens per paper for the
+  results store
+- the SDK (and httpx) are imported when the first request actually goes
+  out, so cache hits and commands that never call the model skip that cost
+
+Point MISTRAL_SERVER_URL at a local stub server to run without the real API.
+"""
+import asyncio
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from src import profiling
+from src.config import (
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL_S,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_RETRIES,
+    LLM_RPM,
+    LLM_TIMEOUT_S,
+    LLM_TPM,
+    MISTRAL_SERVER_URL,
+)
+from src.llm_cache import CACHE_MODES, ResponseCache, response_key
+from src.text_utils import estimate_tokens
+
+if TYPE_CHECKING:
+    import httpx
+    from mistralai import Mistral
+    from mistralai.models import SDKError
+
+T = TypeVar("T")
+
+DEFAULT_MODEL = "mistral-tiny"
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+EXPECTED_COMPLETION_TOKENS = 512  # reserved up front, corrected from usage afterwards
+
+
+def messages_tokens(messages: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(m.get("content") or "") + 4 for m in messages)
+
+
+class TokenBucket:
+    """
+    Continuous-refill bucket. reserve() deducts immediately (the balance may
+    go negative) and returns how long the caller must wait before using the
+    reservation, so one lock serves both threads and coroutines.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, delta: float) -> None:
+        """Refund (negative delta) or charge extra once real usage is known."""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class RateLimiter:
+    def __init__(self, rpm: Optional[float], tpm: Optional[float]):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+    def reserve(self, n_tokens: int) -> float:
+        delays = [0.0]
+        if self.requests:
+            delays.append(self.requests.reserve(1))
+        if self.tokens:
+            delays.append(self.tokens.reserve(n_tokens))
+        return max(delays)
+
+    def settle(self, reserved: int, actual: Optional[int]) -> None:
+        if self.tokens and actual is not None:
+            self.tokens.adjust(actual - reserved)
+
+
+def _retry_delay(error: "SDKError", attempt: int) -> float:
+    if error.raw_response is not None:
+        retry_after = error.raw_response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after) + random.uniform(0, 0.5)
+            except ValueError:
+                pass
+    return random.uniform(0, min(30.0, 0.5 * (2 ** attempt)))  # full jitter
+
+
+_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("rgpt_llm_usage", default=None)
+
+
+@contextmanager
+def track_usage() -> Iterator[Dict[str, int]]:
+    """
+    Tally LLM calls, estimated tokens and cache hits made inside the block,
+    including asyncio tasks it starts (map-reduce summaries).
+    """
+    usage = {"llm_calls": 0, "tokens_in": 0, "tokens_out": 0, "llm_cache_hits": 0}
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def _tally(**counts: int) -> None:
+    profiling.add(**counts)
+    usage = _usage.get()
+    if usage is not None:
+        for name, n in counts.items():
+            usage[name] += n
+
+
+def _count_tokens(messages: List[Dict[str, str]], content: str) -> None:
+    """Estimated tokens sent/received, for the --profile report and track_usage (cache hits cost none)."""
+    if profiling.is_enabled() or _usage.get() is not None:
+        _tally(llm_calls=1, tokens_in=messages_tokens(messages), tokens_out=estimate_tokens(content or ""))
+
+
+class LLMClient:
+    """Thread-safe and asyncio-friendly wrapper around a single Mistral SDK."""
+
+    def __init__(
+        self,
+        api_key: str,
+        server_url: Optional[str] = MISTRAL_SERVER_URL,
+        rpm: Optional[float] = LLM_RPM,
+        tpm: Optional[float] = LLM_TPM,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        max_retries: int = LLM_MAX_RETRIES,
+        timeout_s: float = LLM_TIMEOUT_S,
+    ):
+        self.api_key = api_key
+        self.server_url = server_url or None
+        self.timeout_s = timeout_s
+        self.max_connections = max_connections
+        self.limiter = RateLimiter(rpm, tpm)
+        self.max_retries = max_retries
+        self._sdk: Optional["Mistral"] = None
+        self._http: Optional["httpx.Client"] = None
+        self._sdk_lock = threading.Lock()
+        # httpx async pools are bound to the event loop that created them;
+        # weak keys so a finished loop's entry can't be handed to a new one
+        self._async_sdks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[Mistral, httpx.AsyncClient]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    @property
+    def limits(self):
+        import httpx
+
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+
+    @property
+    def http(self) -> "httpx.Client":
+        """The blocking connection pool, shared by every SDK instance of this client."""
+        if self._http is None:
+            with self._sdk_lock:
+                if self._http is None:
+                    import httpx
+
+                    self._http = httpx.Client(limits=self.limits, timeout=self.timeout_s)
+        return self._http
+
+    @property
+    def sdk(self) -> "Mistral":
+        """The blocking SDK, created (and mistralai imported) on first use."""
+        if self._sdk is None:
+            http = self.http
+            with self._sdk_lock:
+                if self._sdk is None:
+                    self._sdk = self._make_sdk(client=http)
+        return self._sdk
+
+    def _make_sdk(self, **transport) -> "Mistral":
+        from mistralai import Mistral
+
+        return Mistral(
+            api_key=self.api_key,
+            server_url=self.server_url,
+            retry_config=None,  # retries are handled here, with the rate limiter in the loop
+            **transport,
+        )
+
+    def _async_sdk(self) -> "Mistral":
+        loop = asyncio.get_running_loop()
+        entry = self._async_sdks.get(loop)
+        if entry is None:
+            import httpx
+
+            pool = httpx.AsyncClient(limits=self.limits, timeout=self.timeout_s)
+            # pass the shared blocking pool too, or the SDK opens one of its own
+            entry = self._async_sdks[loop] = (self._make_sdk(client=self.http, async_client=pool), pool)
+        return entry[0]
+
+    async def aclose(self) -> None:
+        """Close the running loop's async connection pool (a later request opens a new one)."""
+        entry = self._async_sdks.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[1].aclose()
+
+    @staticmethod
+    def _unpack(resp, reserved: int, limiter: RateLimiter) -> str:
+        usage = getattr(resp, "usage", None)
+        limiter.settle(reserved, getattr(usage, "total_tokens", None))
+        return resp.choices[0].message.content
+
+    def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = DEFAULT_MODEL,
+        on_delta: Optional[Callable[[str], None]] = None,
+        **params,
+    ) -> str:
+        """
+        Blocking chat completion. With on_delta, the reply is streamed and
+        on_delta gets each piece of text as it arrives (a cached reply is
+        delivered as one piece); the full text is returned either way.
+        """
+        key, cached = _cache_lookup(model, messages, params)
+        if cached is not None:
+            _tally(llm_cache_hits=1)
+            if on_delta is not None:
+                on_delta(cached)
+            return cached
+        if on_delta is not None:
+            content = self._stream(messages, model, on_delta, **params)
+        else:
+            content = self._complete(messages, model, **params)
+        _cache_store(key, model, content)
+        _count_tokens(messages, content)
+        return content
+
+    async def acomplete(self, messages: List[Dict[str, str]], model: str = DEFAULT_MODEL, **params) -> str:
+        key, cached = _cache_lookup(model, messages, params)
+        if cached is not None:
+            _tally(llm_cache_hits=1)
+            return cached
+        content = await self._acomplete(messages, model, **params)
+        _cache_store(key, model, content)
+        _count_tokens(messages, content)
+        return content
+
+    def _complete(self, messages: List[Dict[str, str]], model: str, **params) -> str:
+        from mistralai.models import SDKError
+
+        reserved = messages_tokens(messages) + params.get("max_tokens", EXPECTED_COMPLETION_TOKENS)
+        for attempt in range(self.max_retries + 1):
+            delay = self.limiter.reserve(reserved)
+            if delay:
+                time.sleep(delay)
+            try:
+                resp = self.sdk.chat.complete(model=model, messages=messages, **params)
+                return self._unpack(resp, reserved, self.limiter)
+            except SDKError as e:
+                if e.status_code not in RETRYABLE_STATUS or attempt == self.max_retries:
+                    raise
+                time.sleep(_retry_delay(e, attempt))
+        raise RuntimeError("unreachable")
+
+    def _stream(self, messages: List[Dict[str, str]], model: str, on_delta: Callable[[str], None], **params) -> str:
+        from mistralai.models import SDKError
+
+        reserved = messages_tokens(messages) + params.get("max_tokens", EXPECTED_COMPLETION_TOKENS)
+        for attempt in range(self.max_retries + 1):
+            delay = self.limiter.reserve(reserved)
+            if delay:
+                time.sleep(delay)
+            parts: List[str] = []
+            total_tokens = None
+            started = time.perf_counter()
+            try:
+                with self.sdk.chat.stream(model=model, messages=messages, **params) as events:
+                    for event in events:
+                        chunk = event.data
+                        if chunk.usage is not None:
+                            total_tokens = chunk.usage.total_tokens
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if isinstance(delta, str) and delta:
+                            if not parts:
+                                profiling.add(ttft_s=time.perf_counter() - started)
+                            parts.append(delta)
+                            on_delta(delta)
+                self.limiter.settle(reserved, total_tokens)
+                return "".join(parts)
+            except SDKError as e:
+                # once text has been handed to on_delta a retry would duplicate it
+                if parts or e.status_code not in RETRYABLE_STATUS or attempt == self.max_retries:
+                    raise
+                time.sleep(_retry_delay(e, attempt))
+        raise RuntimeError("unreachable")
+
+    async def _acomplete(self, messages: List[Dict[str, str]], model: str, **params) -> str:
+        from mistralai.models import SDKError
+
+        reserved = messages_tokens(messages) + params.get("max_tokens", EXPECTED_COMPLETION_TOKENS)
+        for attempt in range(self.max_retries + 1):
+            delay = self.limiter.reserve(reserved)
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                resp = await self._async_sdk().chat.complete_async(model=model, messages=messages, **params)
+                return self._unpack(resp, reserved, self.limiter)
+            except SDKError as e:
+                if e.status_code not in RETRYABLE_STATUS or attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(_retry_delay(e, attempt))
+        raise RuntimeError("unreachable")
+
+
+_cache: Optional[ResponseCache] = None
+_cache_mode = "use"
+_cache_lock = threading.Lock()
+
+
+def set_cache_mode(mode: str) -> None:
+    """Select "use", "refresh" (--refresh-cache) or "off" (--no-cache)."""
+    global _cache_mode
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown cache mode {mode!r}; expected one of {CACHE_MODES}")
+    _cache_mode = mode
+
+
+def get_cache_mode() -> str:
+    return _cache_mode
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    global _cache
+    if _cache_mode == "off":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES, ttl_s=LLM_CACHE_TTL_S)
+        return _cache
+
+
+def cache_stats() -> Dict[str, int]:
+    return _cache.stats() if _cache is not None else {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _cache_lookup(model: str, messages: List[Dict[str, str]], params: dict):
+    cache = get_response_cache()
+    if cache is None:
+        return None, None
+    key = response_key(model, messages, params)
+    if _cache_mode == "refresh":
+        return key, None
+    return key, cache.get(key)
+
+
+def _cache_store(key: Optional[str], model: str, content: str) -> None:
+    cache = get_response_cache()
+    if cache is not None and key is not None:
+        cache.put(key, model, content)
+
+
+_clients: Dict[str, LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key: str) -> LLMClient:
+    """Return the process-wide client for this API key, creating it once."""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = LLMClient(api_key)
+        return client
+
+
+def run_async(main: Awaitable[T]) -> T:
+    """
+    asyncio.run(main) for code that calls acomplete(): the async connection
+    pools opened on this loop are closed before it ends, so a batch that
+    starts one loop per paper doesn't leak a pool (and its sockets) per paper.
+    """
+    async def scoped() -> T:
+        try:
+            return await main
+        finally:
+            with _clients_lock:
+                clients = list(_clients.values())
+            for client in clients:
+                await client.aclose()
+
+    return asyncio.run(scoped())
@@ -0,0 +1,97 @@
+"""
+manifest.py — run journal for resumable batch runs
+--------------------------------------------------
+One SQLite row per paper records its state ("done" / "failed"), the
+content hash of the input PDF and a fingerprint of everything that shapes
+the output (model, prompts, query, pipeline options). With --resume a
+paper is skipped only if it is "done", its PDF and the fingerprint are
+unchanged and its outputs still exist (its markdown files, when the run
+wrote them, and its row in the results store); failed or stale papers are
+processed again.
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from src.config import MANIFEST_PATH
+
+
+class RunManifest:
+    def __init__(self, path: Path = MANIFEST_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # shared by the runner's calling thread and the path prefetch thread
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS papers ("
+            " pdf_path TEXT PRIMARY KEY, input_hash TEXT NOT NULL, config_hash TEXT NOT NULL,"
+            " state TEXT NOT NULL, error TEXT, summary_path TEXT, analysis_path TEXT,"
+            " duration_sec REAL, updated REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def _key(pdf_path: Path) -> str:
+        return str(Path(pdf_path).resolve())
+
+    def get(self, pdf_path: Path) -> Optional[Dict[str, object]]:
+        with self._lock:
+            cur = self._db.execute("SELECT * FROM papers WHERE pdf_path = ?", (self._key(pdf_path),))
+            row = cur.fetchone()
+        if row is None:
+            return None
+        return dict(zip([c[0] for c in cur.description], row))
+
+    def is_complete(self, pdf_path: Path, input_hash: str, config_hash: str,
+                    stored: Optional[Callable[[Path], bool]] = None) -> bool:
+        """stored: whether the results store has the paper (e.g. ResultsStore.contains)."""
+        row = self.get(pdf_path)
+        return (
+            row is not None
+            and row["state"] == "done"
+            and row["input_hash"] == input_hash
+            and row["config_hash"] == config_hash
+            and all(Path(p).exists() for p in (row["summary_path"], row["analysis_path"]) if p)
+            and (stored is None or stored(pdf_path))
+        )
+
+    def _upsert(self, pdf_path: Path, input_hash: str, config_hash: str, **fields) -> None:
+        row = {
+            "pdf_path": self._key(pdf_path),
+            "input_hash": input_hash,
+            "config_hash": config_hash,
+            "error": None,
+            "summary_path": None,
+            "analysis_path": None,
+            "duration_sec": None,
+            "updated": time.time(),
+            **fields,
+        }
+        cols = ", ".join(row)
+        marks = ", ".join("?" for _ in row)
+        with self._lock:
+            self._db.execute(f"INSERT OR REPLACE INTO papers ({cols}) VALUES ({marks})", tuple(row.values()))
+            self._db.commit()
+
+    def mark_done(self, pdf_path: Path, input_hash: str, config_hash: str, summary_path: Optional[Path],
+                  analysis_path: Optional[Path], duration: float) -> None:
+        """Paths are None when the run kept its outputs only in the results store."""
+        self._upsert(
+            pdf_path, input_hash, config_hash, state="done", duration_sec=duration,
+            summary_path=None if summary_path is None else str(summary_path),
+            analysis_path=None if analysis_path is None else str(analysis_path),
+        )
+
+    def mark_failed(self, pdf_path: Path, input_hash: str, config_hash: str, error: str) -> None:
+        self._upsert(pdf_path, input_hash, config_hash, state="failed", error=error)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._db.execute("SELECT state, COUNT(*) FROM papers GROUP BY state").fetchall())
+
+    def close(self) -> None:
+        self._db.close()
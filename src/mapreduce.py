@@ -0,0 +1,255 @@
+"""
+mapreduce.py — hierarchical map-reduce summarization
+----------------------------------------------------
+For long papers (and whole folders) that don't fit one prompt:
+
+  map     split the chunks, in document order, into groups of about
+          GROUP_TARGET_TOKENS (never over MAP_BUDGET_TOKENS) and
+          summarize every group concurrently
+  reduce  merge partial summaries in groups the same way, level by
+          level, until they fit one final prompt
+
+Group boundaries are content-defined: a text ends its group when the hash
+of its content falls under a threshold proportional to its size, so
+editing one chunk moves at most the boundaries next to it instead of
+shifting every later group. Every node is keyed by its prompt and the
+keys of its children (chunk hashes at the bottom) and its summary is
+kept in a node cache under RGPT_CACHE_DIR, so a re-run only recomputes
+the nodes above changed chunks. The node cache is separate from the LLM
+response cache: --no-cache still reuses unchanged branches;
+--refresh-cache recomputes every node.
+"""
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+from src import profiling
+from src.cache_utils import ExtractionCache
+from src.config import CACHE_DIR
+from src.llm_client import DEFAULT_MODEL, get_cache_mode, get_client, run_async
+from src.summarizer import SUMMARY_INSTRUCTION
+from src.text_utils import CHARS_PER_TOKEN, estimate_tokens
+
+MAP_BUDGET_TOKENS = 6000
+REDUCE_BUDGET_TOKENS = 6000
+GROUP_TARGET_TOKENS = 3000  # expected group size; the budgets are hard caps
+NODE_FORMAT = 1  # bump when node prompts or keying change
+DEFAULT_CONCURRENCY = 8
+
+MAP_INSTRUCTION = (
+    "Summarize this part of a research paper in concise bullet points. "
+    "Keep concrete claims, methods, datasets and numbers; skip boilerplate."
+)
+MERGE_INSTRUCTION = (
+    "Merge these partial summaries of the same paper into one set of concise bullet points. "
+    "Remove repetition, keep concrete claims and numbers."
+)
+DIGEST_INSTRUCTION = (
+    "These are summaries of several research papers. Write a digest: the main themes across "
+    "the papers, how their methods and findings relate or differ, and one bullet per paper "
+    "naming its key contribution."
+)
+DIGEST_MERGE_INSTRUCTION = (
+    "Merge these partial digests of a paper collection into one digest. Keep the per-paper "
+    "bullets and the cross-paper themes; remove repetition."
+)
+SYSTEM_PROMPT = "You are a concise research assistant. Be faithful to the text."
+
+Part = Tuple[str, str]  # (content key, text)
+
+
+@dataclass
+class MapReduceStats:
+    calls: int = 0   # tree nodes evaluated (cache hits included)
+    reused: int = 0  # nodes answered from the node cache
+    levels: int = 0  # depth of the deepest tree
+
+
+@lru_cache(maxsize=1)
+def get_node_cache() -> ExtractionCache:
+    return ExtractionCache(CACHE_DIR / "mapreduce")
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_parts(chunks: Sequence[str], budget_tokens: int = MAP_BUDGET_TOKENS) -> List[Part]:
+    """(hash, text) leaves; a chunk over the budget is truncated to it."""
+    parts = []
+    for text in chunks:
+        if estimate_tokens(text) > budget_tokens:
+            text = text[: budget_tokens * CHARS_PER_TOKEN]
+        parts.append((_sha256(text), text))
+    return parts
+
+
+def group_by_content(
+    parts: Sequence[Part],
+    budget_tokens: int,
+    target_tokens: int = GROUP_TARGET_TOKENS,
+) -> List[List[Part]]:
+    """
+    Order-preserving groups with content-defined boundaries: a part ends its
+    group when its key, read as a fraction of 2**64, falls below
+    tokens / target_tokens (so groups average about target_tokens). A group
+    is also cut before it would exceed budget_tokens.
+    """
+    groups: List[List[Part]] = []
+    current: List[Part] = []
+    used = 0
+    for key, text in parts:
+        t = min(estimate_tokens(text), budget_tokens)
+        if current and used + t > budget_tokens:
+            groups.append(current)
+            current, used = [], 0
+        current.append((key, text))
+        used += t
+        if int(key[:16], 16) < (t / target_tokens) * 2 ** 64:
+            groups.append(current)
+            current, used = [], 0
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _fits(parts: Sequence[Part], budget_tokens: int) -> bool:
+    return sum(estimate_tokens(text) for _key, text in parts) <= budget_tokens
+
+
+def _within(parts: List[Part], budget_tokens: int) -> List[Part]:
+    """parts, each cut to an equal share of the budget if together they exceed it."""
+    # keys stay the same: the cut is deterministic, so cached nodes still match
+    if _fits(parts, budget_tokens):
+        return parts
+    share = max(1, budget_tokens // len(parts)) * CHARS_PER_TOKEN
+    return [(key, text[:share]) for key, text in parts]
+
+
+async def _node(client, sem, stats, model, title, instruction, parts: List[Part]) -> Part:
+    key = _sha256("\0".join([str(NODE_FORMAT), model, title, instruction, *(k for k, _t in parts)]))
+    stats.calls += 1
+    cache = get_node_cache()
+    if get_cache_mode() != "refresh":
+        cached = cache.get(key)
+        if cached is not None:
+            stats.reused += 1
+            return key, cached["text"]
+    user_content = f"TITLE: {title}\n\n{instruction}\n\nTEXT:\n" + "\n\n---\n\n".join(t for _k, t in parts)
+    async with sem:
+        with profiling.stage("llm.mapreduce"):
+            text = await client.acomplete(
+                model=model,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": user_content},
+                ],
+                temperature=0.2,
+            )
+    cache.put(key, {"text": text})
+    return key, text
+
+
+async def _reduce(client, sem, stats, model, title, parts: List[Part], merge_instruction, final_instruction, depth=1) -> Part:
+    """
+    Merge parts level by level until they fit one final prompt. Every level
+    has fewer parts than the one before, and a last part still over the
+    budget (a merge reply can run longer than asked) is truncated, so this
+    always ends.
+    """
+    while True:
+        depth += 1
+        if len(parts) == 1 or _fits(parts, REDUCE_BUDGET_TOKENS):
+            stats.levels = max(stats.levels, depth)
+            return await _node(client, sem, stats, model, title, final_instruction, _within(parts, REDUCE_BUDGET_TOKENS))
+        groups = group_by_content(parts, REDUCE_BUDGET_TOKENS)
+        if len(groups) >= len(parts):
+            # no group merged anything: pair the parts up so the level shrinks
+            groups = [parts[i:i + 2] for i in range(0, len(parts), 2)]
+        parts = list(await asyncio.gather(*(
+            _node(client, sem, stats, model, title, merge_instruction, _within(g, REDUCE_BUDGET_TOKENS)) for g in groups
+        )))
+
+
+async def _summarize_tree(client, sem, stats, model, title, chunks: Sequence[str]) -> Optional[Part]:
+    leaves = chunk_parts(chunks)
+    if not leaves:
+        return None
+    if _fits(leaves, MAP_BUDGET_TOKENS):
+        stats.levels = max(stats.levels, 1)
+        return await _node(client, sem, stats, model, title, SUMMARY_INSTRUCTION, leaves)
+    partials = await asyncio.gather(*(
+        _node(client, sem, stats, model, title, MAP_INSTRUCTION, g) for g in group_by_content(leaves, MAP_BUDGET_TOKENS)
+    ))
+    return await _reduce(client, sem, stats, model, title, list(partials), MERGE_INSTRUCTION, SUMMARY_INSTRUCTION)
+
+
+async def amap_reduce_summarize(
+    api_key: str,
+    title: str,
+    chunks: Sequence[str],
+    model: str = DEFAULT_MODEL,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    sem: Optional[asyncio.Semaphore] = None,
+    stats: Optional[MapReduceStats] = None,
+) -> str:
+    root = await _summarize_tree(
+        get_client(api_key), sem or asyncio.Semaphore(concurrency),
+        stats if stats is not None else MapReduceStats(), model, title, chunks,
+    )
+    return root[1] if root else ""
+
+
+def map_reduce_summarize(
+    api_key: str,
+    title: str,
+    chunks: Sequence[str],
+    model: str = DEFAULT_MODEL,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> Tuple[str, MapReduceStats]:
+    """Summarize every chunk of a paper (not just the top hits)."""
+    stats = MapReduceStats()
+    summary = run_async(amap_reduce_summarize(api_key, title, chunks, model, concurrency, stats=stats))
+    return summary, stats
+
+
+async def acorpus_digest(
+    api_key: str,
+    papers: Sequence[Tuple[str, Sequence[str]]],
+    model: str = DEFAULT_MODEL,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    stats: Optional[MapReduceStats] = None,
+) -> Tuple[str, List[str]]:
+    """
+    papers: [(title, chunks), ...]. Summarizes all papers concurrently
+    (one shared concurrency limit), then reduces the summaries into a digest.
+    Returns (digest, per_paper_summaries).
+    """
+    client = get_client(api_key)
+    sem = asyncio.Semaphore(concurrency)
+    stats = stats if stats is not None else MapReduceStats()
+    roots = await asyncio.gather(*(
+        _summarize_tree(client, sem, stats, model, title, chunks) for title, chunks in papers
+    ))
+    labeled = [(root[0], f"## {title}\n{root[1]}") for (title, _c), root in zip(papers, roots) if root]
+    if not labeled:
+        raise ValueError("No paper has any text to summarize")
+    paper_depth = stats.levels
+    _key, digest = await _reduce(
+        client, sem, stats, model, "Corpus digest", labeled, DIGEST_MERGE_INSTRUCTION, DIGEST_INSTRUCTION,
+        depth=paper_depth,
+    )
+    return digest, [root[1] if root else "" for root in roots]
+
+
+def corpus_digest(
+    api_key: str,
+    papers: Sequence[Tuple[str, Sequence[str]]],
+    model: str = DEFAULT_MODEL,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> Tuple[str, List[str], MapReduceStats]:
+    stats = MapReduceStats()
+    digest, summaries = run_async(acorpus_digest(api_key, papers, model, concurrency, stats=stats))
+    return digest, summaries, stats
@@ -1,8 +1,14 @@
 from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
 from pathlib import Path
-from typing import Optional, Dict, List
-from PyPDF2 import PdfReader
+from statistics import median
+from typing import Optional, Dict, FrozenSet, Iterable, Iterator, List, Tuple
 import re
+import sys
+
+from src import profiling
+from src.pdf_utils import extract_first_page, extract_pdf
 
 BANNER_PATTERNS = [
     r"provided proper attribution is provided",
@@ -12,103 +18,179 @@ BANNER_PATTERNS = [
     r"conference on",
     r"proceedings of",
 ]
+AFFILIATION_PATTERN = r"@|university|institute|laboratory|department"
+
+# One pass over a lowercased line answers every question the heuristics ask
+# of it: which named groups matched ("abstract" can only match at the start).
+# Every alternative starts with a literal, so a lookahead on those first
+# characters lets the scanner skip all other positions cheaply.
+_LINE_ALTERNATIVES = (
+    r"(?P<abstract>^\s*abstract\b)"
+    rf"|(?P<banner>{'|'.join(BANNER_PATTERNS)})"
+    rf"|(?P<affiliation>{AFFILIATION_PATTERN})"
+    r"|(?P<et_al>\bet al\.?\b)"
+)
+_FIRST_CHARS = {p[0] for p in (*BANNER_PATTERNS, *AFFILIATION_PATTERN.split("|"), "abstract", "et al")}
+_LINE_RE = re.compile(rf"(?=[\s{re.escape(''.join(sorted(_FIRST_CHARS)))}])(?:{_LINE_ALTERNATIVES})")
+_TITLE_WORD_RE = re.compile(r"[A-Z][a-zA-Z0-9\-]*")
+_NAME_RE = re.compile(r"[A-Z][a-z]+(?: [A-Z][a-z]+)*")
+_SPACES_RE = re.compile(r"[ \t]+")
+_BLANK_RUN_RE = re.compile(r"\n{3,}")
+_ABSTRACT_RE = re.compile(r"(?:^|\n)(abstract)[:\s]*\n?(.*?)(?:\n[A-Z][A-Za-z ]{2,}:|\Z)", flags=re.I | re.S)
+
+TITLE_WINDOW = 20   # title candidates come from the first lines before "Abstract"
+AUTHOR_WINDOW = 30  # authors are looked for in the first lines of the page
 
 def _is_banner(text: str) -> bool:
-    t = text.lower()
-    return any(re.search(p, t) for p in BANNER_PATTERNS)
+    return "banner" in classify_line(text)
 
-def extract_first_page_lines(pdf_path: Path) -> List[str]:
-    reader = PdfReader(str(pdf_path))
-    if not reader.pages:
-        return []
-    raw = (reader.pages[0].extract_text() or "")
+def classify_line(line: str) -> FrozenSet[str]:
+    """Kinds of a line: any of "abstract", "banner", "affiliation", "et_al"."""
+    return frozenset(m.lastgroup for m in _LINE_RE.finditer(line.lower()))
+
+def classify_lines(lines: List[str]) -> List[FrozenSet[str]]:
+    """Classify the head of the page once; the title and author guesses only look this far."""
+    return [classify_line(ln) for ln in lines[:max(TITLE_WINDOW, AUTHOR_WINDOW)]]
+
+def first_page_lines(raw: str) -> List[str]:
     # normalize whitespace
-    raw = re.sub(r"[ \t]+", " ", raw)
-    raw = re.sub(r"\n{3,}", "\n\n", raw)
+    raw = _SPACES_RE.sub(" ", raw)
+    raw = _BLANK_RUN_RE.sub("\n\n", raw)
     lines = [ln.strip() for ln in raw.splitlines()]
     # drop empties
     lines = [ln for ln in lines if ln]
     return lines
 
-def guess_title(lines: List[str]) -> Optional[str]:
+def extract_first_page_lines(pdf_path: Path) -> List[str]:
+    return first_page_lines(extract_pdf(pdf_path)["first_page"])
+
+def guess_title(lines: List[str], kinds: Optional[List[FrozenSet[str]]] = None) -> Optional[str]:
     """
     Heuristic:
       - consider lines before 'Abstract'
       - ignore obvious banners
       - prefer the longest line with 3–20 words
       - exclude lines with email/affiliation hints
+    Pass kinds from classify_lines() to reuse an existing classification.
     """
-    pre_abstract: List[str] = []
-    for ln in lines:
-        if re.match(r"^\s*abstract\b", ln, flags=re.I):
+    kinds = kinds if kinds is not None else classify_lines(lines)
+    best, best_score = None, None
+    for ln, k in zip(lines[:TITLE_WINDOW], kinds):
+        if "abstract" in k:
             break
-        pre_abstract.append(ln)
-
-    candidates = []
-    for ln in pre_abstract[:20]:
-        if _is_banner(ln):
+        if "banner" in k or "affiliation" in k:
             continue
-        if re.search(r"@|university|institute|laboratory|department", ln, flags=re.I):
+        words = ln.split()
+        if not 3 <= len(words) <= 20:
             continue
-        wc = len(ln.split())
-        if 3 <= wc <= 20:
-            candidates.append(ln)
-
-    if not candidates:
-        return None
-
-    # Prefer the line with the highest “title case” ratio, break ties by length
-    def title_score(s: str):
-        words = s.split()
-        tc = sum(1 for w in words if re.match(r"^[A-Z][a-zA-Z0-9\-]*$", w))
-        return (tc / max(1, len(words)), len(s))
+        # Prefer the line with the highest “title case” ratio, break ties by length
+        tc = sum(1 for w in words if _TITLE_WORD_RE.fullmatch(w))
+        score = (tc / len(words), len(ln))
+        if best_score is None or score > best_score:
+            best, best_score = ln, score
+    return best
 
-    candidates.sort(key=title_score, reverse=True)
-    return candidates[0]
-
-def guess_authors(lines: List[str]) -> Optional[str]:
+def guess_authors(lines: List[str], kinds: Optional[List[FrozenSet[str]]] = None) -> Optional[str]:
     """
     Heuristic:
       - look near the title for a line with comma-separated capitalized names or 'et al.'
       - avoid affiliations/emails
     """
-    window = lines[:30]
-    for ln in window:
-        if _is_banner(ln):
-            continue
-        if re.search(r"@|university|institute|laboratory|department", ln, flags=re.I):
+    kinds = kinds if kinds is not None else classify_lines(lines)
+    for ln, k in zip(lines[:AUTHOR_WINDOW], kinds):
+        if "banner" in k or "affiliation" in k:
             continue
-        if re.search(r"\bet al\.?\b", ln, flags=re.I):
+        if "et_al" in k:
             return ln
         # comma-separated names like "Ashish Vaswani, Noam Shazeer, Niki Parmar, ... "
         parts = [p.strip() for p in ln.split(",") if p.strip()]
         if 2 <= len(parts) <= 12:
-            caps_like = sum(
-                1 for p in parts if re.search(r"^[A-Z][a-z]+(?: [A-Z][a-z]+)*$", p)
-            )
+            caps_like = sum(1 for p in parts if _NAME_RE.fullmatch(p))
             if caps_like >= max(2, len(parts)//2):
                 return ln
     return None
 
 def guess_abstract(lines: List[str]) -> Optional[str]:
-    text = "\n".join(lines)
-    m = re.search(r"(?:^|\n)(abstract)[:\s]*\n?(.*?)(?:\n[A-Z][A-Za-z ]{2,}:|\Z)", text, flags=re.I | re.S)
+    m = _ABSTRACT_RE.search("\n".join(lines))
     if m:
         return m.group(2).strip()
     return None
 
-def extract_metadata(pdf_path: Path) -> Dict[str, Optional[str]]:
-    lines = extract_first_page_lines(pdf_path)
-    title = guess_title(lines)
-    authors = guess_authors(lines)
-    abstract = guess_abstract(lines)
+def layout_title(spans: List[list]) -> Optional[str]:
+    """
+    Title from first-page font sizes: the run of text set in the largest
+    font, if that font is clearly bigger than the body text. Spans are
+    [font_size, x, y, text] from pdf_utils; banners, affiliations and
+    stray symbols (superscripts, markers) are ignored. None when the page
+    has no distinct title font.
+    """
+    spans = [s for s in spans if len(s[3].strip()) > 2 and not classify_line(s[3]) & {"banner", "affiliation"}]
+    if not spans:
+        return None
+    body = median(s[0] for s in spans)
+    top = max(s[0] for s in spans)
+    if top < body * 1.15:
+        return None
+
+    parts: List[str] = []
+    for size, _x, _y, text in spans:
+        if abs(size - top) <= 0.5:
+            parts.append(text)
+        elif parts:
+            break  # the title is one contiguous run in reading order
+    title = " ".join(" ".join(parts).split())
+    return title if 2 <= len(title.split()) <= 30 else None
+
+def metadata_from_record(record: dict) -> Dict[str, Optional[str]]:
+    """Metadata from an extraction record (extract_pdf or extract_first_page)."""
+    with profiling.stage("metadata") as st:
+        st.add(chars_in=len(record["first_page"]))
+        lines = first_page_lines(record["first_page"])
+        kinds = classify_lines(lines)
+        title = layout_title(record.get("first_page_spans") or []) or guess_title(lines, kinds)
+        authors = guess_authors(lines, kinds)
+        abstract = guess_abstract(lines)
 
     if not title:
         # fallback to embedded PDF metadata
-        try:
-            info = PdfReader(str(pdf_path)).metadata or {}
-            title = getattr(info, "title", None)
-        except Exception:
-            title = None
+        title = record.get("embedded_title")
 
     return {"title": title, "authors": authors, "abstract": abstract}
+
+def extract_metadata(pdf_path: Path) -> Dict[str, Optional[str]]:
+    # One (cached) PDF open serves both the body text and the metadata.
+    return metadata_from_record(extract_pdf(pdf_path))
+
+def _scan_one(pdf_path: Path) -> Tuple[Path, Optional[Dict[str, Optional[str]]], Optional[str]]:
+    try:
+        return pdf_path, metadata_from_record(extract_first_page(pdf_path)), None
+    except Exception as e:
+        return pdf_path, None, str(e)
+
+def scan_metadata(paths: Iterable[Path], workers: int = 1, window: int = 64) -> Iterator[Tuple[Path, Dict[str, Optional[str]]]]:
+    """
+    Metadata-only scan: lazily yield (path, metadata) in input order,
+    parsing only each PDF's first page (or reading the extraction cache).
+    With workers > 1 pages are parsed in a process pool with at most
+    `window` PDFs in flight, so memory stays flat over thousands of files.
+    Unreadable PDFs are skipped with a warning.
+    """
+    def results() -> Iterator[tuple]:
+        if workers <= 1:
+            yield from (_scan_one(Path(p)) for p in paths)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending: deque = deque()
+            for p in paths:
+                pending.append(pool.submit(_scan_one, Path(p)))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    for pdf_path, meta, error in results():
+        if error is not None:
+            # stderr, so the scan's stdout stays machine-readable (main.py scan-metadata)
+            print(f"[WARN] Failed to read metadata from {Path(pdf_path).name}: {error}", file=sys.stderr)
+            continue
+        yield Path(pdf_path), meta
@@ -0,0 +1,47 @@
+"""
+options.py — run options and the choices the CLI offers
+-------------------------------------------------------
+Kept free of numpy, scikit-learn and the Mistral SDK so main.py can build
+its argument parser (and answer --help or a usage error) without loading
+them; src.pipeline and src.retrievers re-export these names.
+"""
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+from src.extractors import DEFAULT_EXTRACTOR
+
+if TYPE_CHECKING:
+    from src.pdf_utils import ExtractionSettings
+
+CHUNKERS = ("chars", "tokens")
+SUMMARY_MODES = ("retrieval", "mapreduce")
+RETRIEVERS = ("tfidf", "dense", "hybrid")
+REASONING_TEMPLATES = ("self_consistency", "chain_of_thought", "react_research", "qa_with_context", "basic_qa")
+DEDUP_THRESHOLD = 0.8  # estimated Jaccard at which a batch paper reuses an earlier one's outputs
+
+
+@dataclass
+class PipelineOptions:
+    """Per-run switches shared by every paper (must stay picklable)."""
+    combined: bool = False      # one LLM call for summary + analysis
+    chunker: str = "chars"      # "chars" (fixed 1500/150) or "tokens" (sentence/section aware)
+    summary_mode: str = "retrieval"  # "retrieval" (top hits) or "mapreduce" (every chunk)
+    profile: bool = False       # record stage timings (see src/profiling.py)
+    stream: bool = False        # stream replies into <output>.partial as they arrive (retrieval mode, not combined)
+    echo: bool = False          # with stream: also print the streamed text (single-paper use)
+    extractor: str = DEFAULT_EXTRACTOR  # PDF text backend (src/extractors.py)
+    page_workers: int = 1       # processes for page ranges of large PDFs
+    page_timeout: Optional[float] = None  # seconds per page before it is skipped
+    dedup_threshold: float = 0.0  # batch runs: near-duplicates reuse outputs (0 = off; CLI default DEDUP_THRESHOLD)
+    markdown: bool = True       # per-paper .md and _meta.json files (False: texts only in the results store)
+
+    def extraction(self) -> "ExtractionSettings":
+        from src.pdf_utils import ExtractionSettings
+
+        return ExtractionSettings(self.extractor, self.page_workers, self.page_timeout)
+
+
+# Switches that change how a run behaves but not what it writes (a reused
+# near-duplicate's outputs are ones its canonical paper's settings produced;
+# markdown only decides whether the texts also go to files).
+RUNTIME_OPTIONS = ("profile", "stream", "echo", "page_workers", "page_timeout", "dedup_threshold", "markdown")
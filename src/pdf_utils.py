@@ -1,25 +1,301 @@
 """
-PDF loading utilities using PyPDF2.
+PDF loading utilities.
+
+Extraction results are cached on disk by content hash (see cache_utils),
+so each PDF is opened once and unchanged files are never parsed again.
+The text backend (extractors.py; PyPDF2 by default) is chosen per run
+with set_extraction(), which can also split large documents into page
+ranges extracted by worker processes and put a time limit on each page.
 """
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List
-from PyPDF2 import PdfReader
-
-def load_pdf_text(pdf_path: Path) -> str:
-    reader = PdfReader(str(pdf_path))
-    parts = []
-    for page in reader.pages:
-        text = (page.extract_text() or "").strip()
-        if text:
-            parts.append(text)
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from src import profiling
+from src.cache_utils import get_extraction_cache
+from src.extractors import DEFAULT_EXTRACTOR, Document, open_document
+
+# Bump whenever the extraction output changes so stale cache entries are ignored.
+EXTRACTION_FORMAT = 2
+PARALLEL_MIN_PAGES = 24  # smaller documents are not worth a round trip to the page workers
+RANGES_PER_WORKER = 2    # a few ranges per worker even out slow pages
+
+@dataclass
+class ExtractionSettings:
+    """How this process extracts text (must stay picklable)."""
+    extractor: str = DEFAULT_EXTRACTOR
+    page_workers: int = 1                 # > 1: large documents are split into page ranges across processes
+    page_timeout: Optional[float] = None  # seconds per page; a page that takes longer is left empty
+
+_settings = ExtractionSettings()
+_page_pool: Optional[ProcessPoolExecutor] = None
+_page_pool_size = 0
+_page_pool_lock = threading.Lock()
+
+def set_extraction(settings: ExtractionSettings) -> None:
+    global _settings
+    _settings = settings
+
+def extraction_settings() -> ExtractionSettings:
+    return _settings
+
+def extractor_version(extractor: str) -> str:
+    """Cache version of a backend's records; each backend gets its own entries."""
+    return f"{extractor}-{EXTRACTION_FORMAT}"
+
+class PageTimeout(Exception):
+    pass
+
+def _can_time_out() -> bool:
+    # SIGALRM is delivered to the main thread only (and not at all on Windows)
+    return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+
+@contextmanager
+def _time_limit(seconds: Optional[float]):
+    """
+    Raise PageTimeout in the block after `seconds`. Interrupts Python code
+    (PyPDF2/pypdf); a C backend's call finishes before the alarm is seen.
+    """
+    if not seconds or not _can_time_out():
+        yield
+        return
+
+    def expire(_signum, _frame):
+        raise PageTimeout()
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def _extract_pages(doc: Document, start: int, end: int, timeout: Optional[float]) -> Tuple[List[str], List[list], List[int]]:
+    """Texts of pages [start, end), first-page spans if the range has page 0, and pages that timed out."""
+    texts: List[str] = []
+    spans: List[list] = []
+    timed_out: List[int] = []
+    for i in range(start, end):
+        try:
+            with _time_limit(timeout):
+                if i == 0:
+                    text, spans = doc.first_page()
+                else:
+                    text = doc.page_text(i)
+        except PageTimeout:
+            text = ""
+            timed_out.append(i)
+        texts.append(text)
+    return texts, spans, timed_out
+
+def _extract_range(pdf_path: str, extractor: str, start: int, end: int, timeout: Optional[float]):
+    """Page-worker entry point: opens its own copy of the document."""
+    doc = open_document(Path(pdf_path), extractor)
+    try:
+        return _extract_pages(doc, start, end, timeout)
+    finally:
+        doc.close()
+
+def _get_page_pool(workers: int) -> ProcessPoolExecutor:
+    global _page_pool, _page_pool_size
+    with _page_pool_lock:
+        if _page_pool is None or _page_pool_size != workers:
+            if _page_pool is not None:
+                _page_pool.shutdown(wait=False)
+            _page_pool = ProcessPoolExecutor(max_workers=workers)
+            _page_pool_size = workers
+        return _page_pool
+
+def _page_ranges(n: int, workers: int) -> List[Tuple[int, int]]:
+    parts = min(n, workers * RANGES_PER_WORKER)
+    bounds = [round(i * n / parts) for i in range(parts + 1)]
+    return [(lo, hi) for lo, hi in zip(bounds, bounds[1:]) if hi > lo]
+
+def _read_pages(pdf_path: Path, doc: Document, end: int, settings: ExtractionSettings) -> Tuple[List[str], List[list], List[int]]:
+    """
+    Pages [0, end) of an open document: in this process, or, from the main
+    process, split into page ranges for the page workers when the document
+    is large enough (or when a timeout is requested but cannot be enforced
+    in this thread).
+    """
+    if multiprocessing.parent_process() is not None:
+        # Already in a batch parse worker: the batch is parallel across papers,
+        # and a nested pool would not be shut down when the worker exits.
+        return _extract_pages(doc, 0, end, settings.page_timeout)
+    parallel = settings.page_workers > 1 and end >= PARALLEL_MIN_PAGES
+    needs_worker = bool(settings.page_timeout) and not _can_time_out()
+    if not parallel and not needs_worker:
+        return _extract_pages(doc, 0, end, settings.page_timeout)
+
+    workers = max(1, settings.page_workers)
+    ranges = _page_ranges(end, workers) if parallel else [(0, end)]
+    pool = _get_page_pool(workers)
+    futures = [
+        pool.submit(_extract_range, str(pdf_path), settings.extractor, lo, hi, settings.page_timeout)
+        for lo, hi in ranges
+    ]
+    texts: List[str] = []
+    spans: List[list] = []
+    timed_out: List[int] = []
+    for future in futures:
+        part_texts, part_spans, part_timed_out = future.result()
+        texts += part_texts
+        spans = spans or part_spans
+        timed_out += part_timed_out
+    return texts, spans, timed_out
+
+def _warn_timeouts(pdf_path: Path, timed_out: List[int], timeout: Optional[float]) -> None:
+    if timed_out:
+        pages = ", ".join(str(i + 1) for i in timed_out[:10]) + (" ..." if len(timed_out) > 10 else "")
+        print(f"[WARN] {Path(pdf_path).name}: page(s) {pages} took over {timeout}s and were skipped")
+
+def _parse_pdf(pdf_path: Path) -> dict:
+    """
+    Open the PDF once and pull out everything downstream stages need:
+    per-page text, raw first-page text and font spans (for metadata
+    heuristics) and the embedded document title.
+    """
+    settings = _settings
+    doc = open_document(pdf_path, settings.extractor)
+    try:
+        pages, spans, timed_out = _read_pages(pdf_path, doc, doc.page_count, settings)
+        embedded_title = doc.embedded_title()
+    finally:
+        doc.close()
+    _warn_timeouts(pdf_path, timed_out, settings.page_timeout)
+
+    return {
+        "version": extractor_version(settings.extractor),
+        "pages": pages,
+        "first_page": pages[0] if pages else "",
+        "first_page_spans": spans,
+        "embedded_title": embedded_title,
+        "timed_out_pages": timed_out,
+    }
+
+def extract_first_page(pdf_path: Path) -> dict:
+    """
+    Just what metadata needs (first_page, first_page_spans, embedded_title)
+    without parsing the rest of the document. Served from the full
+    extraction record when one is cached; otherwise only the first page is
+    parsed and cached under its own key.
+    """
+    settings = _settings
+    version = extractor_version(settings.extractor)
+    cache = get_extraction_cache()
+    full = cache.get(cache.key_for(pdf_path, version))
+    if full is not None:
+        return full
+    key = cache.key_for(pdf_path, f"{version}:first-page")
+    record = cache.get(key)
+    if record is None:
+        doc = open_document(pdf_path, settings.extractor)
+        try:
+            pages, spans, timed_out = _read_pages(pdf_path, doc, min(1, doc.page_count), settings)
+            embedded_title = doc.embedded_title()
+        finally:
+            doc.close()
+        _warn_timeouts(pdf_path, timed_out, settings.page_timeout)
+        record = {
+            "version": f"{version}:first-page",
+            "first_page": pages[0] if pages else "",
+            "first_page_spans": spans,
+            "embedded_title": embedded_title,
+        }
+        if not timed_out:
+            cache.put(key, record)
+    return record
+
+def extract_pdf(pdf_path: Path, use_cache: bool = True) -> dict:
+    """
+    Return the extraction record for a PDF, from cache when possible.
+    Records with timed-out pages are not cached, so a later run with a
+    longer (or no) timeout can fill them in.
+    """
+    with profiling.stage("pdf.extract") as st:
+        if not use_cache:
+            record = _parse_pdf(pdf_path)
+        else:
+            cache = get_extraction_cache()
+            key = cache.key_for(pdf_path, extractor_version(_settings.extractor))
+            record = cache.get(key)
+            st.add(cache_hits=int(record is not None))
+            if record is None:
+                record = _parse_pdf(pdf_path)
+                if not record["timed_out_pages"]:
+                    cache.put(key, record)
+        if profiling.is_enabled():
+            st.add(bytes_in=Path(pdf_path).stat().st_size, pages=len(record["pages"]),
+                   chars_out=sum(len(p) for p in record["pages"]),
+                   timed_out_pages=len(record.get("timed_out_pages", [])))
+    return record
+
+def load_pdf_text(pdf_path: Path, use_cache: bool = True) -> str:
+    pages = extract_pdf(pdf_path, use_cache=use_cache)["pages"]
+    parts = [p.strip() for p in pages if p and p.strip()]
     return "\n\n".join(parts)
 
-def load_all_pdfs_text(folder: Path) -> list[tuple[Path, str]]:
-    pdfs = sorted(folder.glob("*.pdf"))
-    results: List[tuple[Path, str]] = []
-    for p in pdfs:
+def list_pdfs(folder: Path) -> List[Path]:
+    return sorted(Path(folder).glob("*.pdf"))
+
+def iter_pdf_paths(folder: Path, recursive: bool = False) -> Iterator[Path]:
+    """
+    Lazily yield the PDFs under folder, one directory listing at a time
+    (sorted within each directory), so huge trees start producing
+    immediately instead of after a full walk.
+    """
+    folder = Path(folder)
+    try:
+        with os.scandir(folder) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError as e:
+        print(f"[WARN] Cannot list {folder}: {e}")
+        return
+    subdirs = []
+    for entry in entries:
+        if entry.is_file() and entry.name.lower().endswith(".pdf"):
+            yield Path(entry.path)
+        elif recursive and entry.is_dir(follow_symlinks=False):
+            subdirs.append(entry.path)
+    for sub in subdirs:
+        yield from iter_pdf_paths(Path(sub), recursive=True)
+
+def iter_path_list(source: str) -> Iterator[Path]:
+    """
+    PDF paths from a file with one path per line, or from stdin when source
+    is "-". Blank lines and lines starting with # are ignored.
+    """
+    def lines(f: TextIO) -> Iterator[Path]:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield Path(line)
+
+    if source == "-":
+        yield from lines(sys.stdin)
+    else:
+        with open(source, encoding="utf-8") as f:
+            yield from lines(f)
+
+def iter_pdfs_text(paths: Iterable[Path]) -> Iterator[Tuple[Path, str]]:
+    """
+    Lazily yield (path, text) one PDF at a time; nothing is parsed until
+    the caller asks for the next item. Unreadable files are skipped.
+    """
+    for p in paths:
         try:
-            results.append((p, load_pdf_text(p)))
+            yield p, load_pdf_text(p)
         except Exception as e:
             print(f"[WARN] Failed to parse {p.name}: {e}")
-    return results
+
+def load_all_pdfs_text(folder: Path) -> list[tuple[Path, str]]:
+    """Every text in memory at once; prefer iter_pdfs_text for large folders."""
+    return list(iter_pdfs_text(list_pdfs(folder)))
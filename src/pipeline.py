@@ -0,0 +1,648 @@
+"""
+pipeline.py — per-paper pipeline stages and the concurrent batch runner
+-----------------------------------------------------------------------
+A paper goes through two stages:
+  1. prepare_paper  — CPU-bound: PDF extraction, metadata, cleaning,
+                      chunking and TF-IDF retrieval (runs in a process pool)
+  2. write_outputs  — I/O-bound: LLM summary + analysis calls and file
+                      writes (runs in a bounded thread pool)
+
+run_batch pipelines the two so LLM requests for early papers are in
+flight while later papers are still being parsed. Both runners consume
+paths lazily with a bounded look-ahead, so memory stays flat and the
+first results arrive while the rest of the corpus is still being listed.
+
+With options.dedup_threshold > 0 each prepared paper carries a MinHash
+signature (src/dedup.py); a paper that near-duplicates one already seen in
+the run skips the LLM stage and reuses that paper's summary and analysis.
+
+A PaperResult carries the paper's texts, metadata and LLM usage;
+result_record() turns it into a row of the results store
+(src/results_store.py). With options.markdown off no per-paper files are
+written and the store is the only copy.
+"""
+import hashlib
+import json
+import queue
+import threading
+import time
+from dataclasses import asdict, replace
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar
+
+from src import profiling
+from src.analyst import ANALYST_SYSTEM, SECTIONS, analyze_chunks, summarize_and_analyze
+from src.context_utils import COMPARE_BUDGET_TOKENS, pack_context
+from src.corpus_index import CorpusIndex, paper_key
+from src.dedup import MinHashIndex, signature as dedup_signature
+from src.indexer import build_index, search, search_batch
+from src.io_utils import MarkdownStream, atomic_write_text, output_stem
+from src.metadata_utils import extract_metadata
+from src.llm_client import DEFAULT_MODEL, track_usage
+from src.mapreduce import MAP_INSTRUCTION, MERGE_INSTRUCTION, map_reduce_summarize
+from src.options import CHUNKERS, RUNTIME_OPTIONS, SUMMARY_MODES, PipelineOptions  # noqa: F401 (re-exported)
+from src.pdf_utils import extract_pdf, extraction_settings, load_pdf_text, set_extraction
+from src.summarizer import SUMMARY_INSTRUCTION, summarize_chunks
+from src.text_utils import chunk_text, chunk_tokens_for_model, clean_text, iter_chunks
+
+T = TypeVar("T")
+
+RETRIEVAL_K = 16  # candidates handed to context packing; the token budget decides how many are sent
+COMPARE_MODEL = "mistral-large-latest"
+PROMPTS = (SUMMARY_INSTRUCTION, ANALYST_SYSTEM, SECTIONS, MAP_INSTRUCTION, MERGE_INSTRUCTION)
+
+# One retrieval query per comparison axis, so every axis gets excerpts.
+COMPARE_ASPECTS = (
+    "research question problem motivation contribution",
+    "method model architecture approach dataset training",
+    "results findings experiments evaluation baseline",
+    "limitations future work assumptions",
+)
+
+
+@dataclass
+class OutputDirs:
+    summaries: Path
+    analyses: Path
+    metadata: Path
+    source_root: Optional[Path] = None  # recursive runs: prefix output names with the subdirectory
+
+
+@dataclass
+class PreparedPaper:
+    pdf_path: Path
+    title: str
+    authors: str
+    abstract: Optional[str]
+    hits: List[Tuple[float, str]]  # (score, chunk_text), best first
+    prep_seconds: float
+    chunks: List[str] = field(default_factory=list)  # all chunks in order; only kept for mapreduce
+    profile: List[dict] = field(default_factory=list)  # stage records from the (possibly remote) prepare step
+    signature: Optional[Any] = None  # MinHash signature (src/dedup.py) when dedup is on
+
+
+@dataclass
+class PaperResult:
+    pdf_path: Path
+    summary_path: Optional[Path]  # None when options.markdown is off
+    analysis_path: Optional[Path]
+    duration: float
+    ttft: Optional[float] = None  # seconds to the first streamed summary token (stream mode only)
+    duplicate_of: Optional[Path] = None  # outputs reused from this near-duplicate paper (no LLM calls)
+    meta: Dict[str, Any] = field(default_factory=dict)  # what <stem>_meta.json holds, plus the stem
+    summary: Optional[str] = None  # summary/analysis markdown (None for reused duplicates)
+    analysis: Optional[str] = None
+    usage: Dict[str, int] = field(default_factory=dict)  # LLM calls and estimated tokens (llm_client.track_usage)
+    prep_seconds: float = 0.0
+
+
+def prompt_version() -> str:
+    """Short hash of the prompt texts, recorded with every stored result."""
+    return hashlib.sha256(json.dumps(PROMPTS).encode("utf-8")).hexdigest()[:12]
+
+
+def config_fingerprint(query: str, options: Optional[PipelineOptions] = None) -> str:
+    """
+    Hash of everything that shapes a paper's outputs besides the PDF itself:
+    model, prompts, query and pipeline options. A resumed run redoes a paper
+    whenever this changes.
+    """
+    payload = {
+        "model": DEFAULT_MODEL,
+        "prompts": list(PROMPTS),
+        "retrieval_k": RETRIEVAL_K,
+        "query": query,
+        "options": {k: v for k, v in asdict(options or PipelineOptions()).items() if k not in RUNTIME_OPTIONS},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def labeled_chunks_for(pdf_path: Path, chunker: str = "chars", raw_text: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    (label, text) chunks for one paper. The token chunker streams from the
+    per-page text and puts the page number in the label for citations.
+    """
+    if chunker == "tokens":
+        pages = extract_pdf(pdf_path)["pages"]
+        max_tokens = chunk_tokens_for_model(DEFAULT_MODEL)
+        with profiling.stage("text.chunk") as st:
+            labeled = [
+                (f"{pdf_path.stem} [chunk {i+1}, p.{c.page}]", c.text)
+                for i, c in enumerate(iter_chunks(pages, max_tokens=max_tokens, overlap_tokens=max_tokens // 10))
+            ]
+            st.add(chunks=len(labeled))
+        return labeled
+    if raw_text is None:
+        raw_text = load_pdf_text(pdf_path)
+    chunks = chunk_text(clean_text(raw_text), max_chars=1500, overlap=150)
+    return [(f"{pdf_path.stem} [chunk {i+1}]", ch) for i, ch in enumerate(chunks)]
+
+
+def prepare_paper(
+    pdf_path: Path,
+    query: str,
+    raw_text: Optional[str] = None,
+    options: Optional[PipelineOptions] = None,
+) -> PreparedPaper:
+    """
+    Everything up to (but not including) the LLM calls. Explicit options
+    also set this process's extraction settings (it may be a fresh worker
+    process); without them the current settings are left alone.
+    """
+    if options is not None:
+        set_extraction(options.extraction())
+    options = options or PipelineOptions()
+    start_time = time.time()
+    if options.profile:
+        profiling.enable()  # may be a fresh worker process
+
+    with profiling.paper_scope(pdf_path.name) as stage_records:
+        md = extract_metadata(pdf_path)
+        title = md.get("title") or pdf_path.stem
+        authors = md.get("authors") or "Unknown"
+        abstract = md.get("abstract")
+
+        labeled_chunks = labeled_chunks_for(pdf_path, options.chunker, raw_text=raw_text)
+        if not labeled_chunks:
+            raise ValueError(f"No extractable text from {pdf_path.name}")
+
+        index = build_index(labeled_chunks)
+        hits = [(score, text) for score, (_lbl, text) in search(index, query, k=RETRIEVAL_K)]
+        signature = dedup_signature(pdf_path) if options.dedup_threshold > 0 else None
+
+    return PreparedPaper(
+        pdf_path=pdf_path,
+        title=title,
+        authors=authors,
+        abstract=abstract,
+        hits=hits,
+        prep_seconds=time.time() - start_time,
+        chunks=[text for _lbl, text in labeled_chunks] if options.summary_mode == "mapreduce" else [],
+        profile=stage_records,
+        signature=signature,
+    )
+
+
+def comparison_context(
+    pdf_path: Path,
+    budget_tokens: int = COMPARE_BUDGET_TOKENS,
+    chunker: str = "chars",
+    corpus: Optional[CorpusIndex] = None,
+) -> List[str]:
+    """
+    Excerpts covering every comparison axis of one paper, packed into
+    budget_tokens (replaces sending only the first 2000 characters).
+    With a corpus index that already holds the paper, its chunks are
+    searched there instead of re-parsing the PDF.
+    """
+    if corpus is not None and paper_key(pdf_path) in corpus.papers:
+        hit_lists = corpus.search_batch(list(COMPARE_ASPECTS), k=RETRIEVAL_K // 2, paper=pdf_path)
+    else:
+        labeled = labeled_chunks_for(pdf_path, chunker)
+        if not labeled:
+            return []
+        hit_lists = search_batch(build_index(labeled), list(COMPARE_ASPECTS), k=RETRIEVAL_K // 2)
+    best: Dict[str, float] = {}
+    for hits in hit_lists:
+        for score, (_lbl, text) in hits:
+            best[text] = max(score, best.get(text, 0.0))
+    return pack_context([(score, text) for text, score in best.items()], budget_tokens)
+
+
+def comparison_prompt(name1: str, ctx1: List[str], name2: str, ctx2: List[str]) -> str:
+    sep = "\n\n---\n\n"
+    return f"""
+Compare the following two research papers in terms of:
+- Main research questions
+- Methodologies
+- Findings
+- Strengths and limitations
+- Overall impact and novelty
+
+Paper 1 ({name1}):
+{sep.join(ctx1)}
+
+Paper 2 ({name2}):
+{sep.join(ctx2)}
+
+Provide a concise, well-structured comparison summary.
+"""
+
+
+def write_outputs(
+    paper: PreparedPaper,
+    query: str,
+    dirs: OutputDirs,
+    api_key: str,
+    options: Optional[PipelineOptions] = None,
+) -> PaperResult:
+    """
+    Run the LLM calls for a prepared paper and write its result files.
+    options.combined folds the summary and all analysis sections into one request.
+    """
+    options = options or PipelineOptions()
+    start_time = time.time()
+    pdf_path = paper.pdf_path
+    with profiling.paper_scope(pdf_path.name) as stage_records, track_usage() as usage:
+        result = _generate_and_write(paper, query, dirs, api_key, options)
+    profiling.merge(paper.profile + stage_records)
+
+    result.duration = round(paper.prep_seconds + (time.time() - start_time), 2)
+    result.usage = usage
+    return result
+
+
+def _generate_and_write(
+    paper: PreparedPaper,
+    query: str,
+    dirs: OutputDirs,
+    api_key: str,
+    options: PipelineOptions,
+) -> PaperResult:
+    pdf_path = paper.pdf_path
+    stem = output_stem(pdf_path, dirs.source_root)
+    sum_path = dirs.summaries / f"{stem}_summary.md"
+    ana_path = dirs.analyses / f"{stem}_analysis.md"
+    header = f"# {paper.title}\n\n**Authors:** {paper.authors}\n\n"
+    if paper.abstract:
+        header += f"**Abstract:** {paper.abstract}\n\n---\n\n"
+
+    if options.stream and options.summary_mode == "retrieval" and not options.combined and options.markdown:
+        # Same final files as below, but readable (and echoed) while they are generated.
+        with MarkdownStream(sum_path, header, echo=options.echo) as out:
+            summary_text = summarize_chunks(api_key, paper.title, paper.hits, on_delta=out.write)
+            out.finish(header + summary_text)
+        ttft = out.ttft
+        with MarkdownStream(ana_path, f"# Analysis: {paper.title}\n", echo=options.echo) as out:
+            analysis_md = analyze_chunks(api_key, paper.title, paper.hits, on_delta=out.write)
+            out.finish(analysis_md)
+    else:
+        ttft = None
+        analysis_md = None
+        if options.summary_mode == "mapreduce":
+            summary_text, _stats = map_reduce_summarize(api_key, paper.title, paper.chunks)
+        elif options.combined:
+            summary_text, analysis_md = summarize_and_analyze(api_key, paper.title, paper.hits)
+        else:
+            summary_text = summarize_chunks(api_key, paper.title, paper.hits)
+
+        # Summarization
+        if options.markdown:
+            atomic_write_text(sum_path, header + summary_text)
+
+        # Analysis
+        if analysis_md is None:
+            analysis_md = analyze_chunks(api_key, paper.title, paper.hits, combined=options.combined)
+        if options.markdown:
+            atomic_write_text(ana_path, analysis_md)
+
+    if not options.markdown:
+        sum_path = ana_path = None
+    meta = _write_metadata(paper, query, dirs, stem, sum_path, ana_path)
+    return PaperResult(
+        pdf_path=pdf_path, summary_path=sum_path, analysis_path=ana_path, duration=0.0, ttft=ttft,
+        meta=meta, summary=header + summary_text, analysis=analysis_md, prep_seconds=paper.prep_seconds,
+    )
+
+
+def _write_metadata(paper: PreparedPaper, query: str, dirs: OutputDirs, stem: str,
+                    sum_path: Optional[Path], ana_path: Optional[Path], **extra) -> Dict[str, Any]:
+    """The paper's metadata, also written to <stem>_meta.json when its markdown files were."""
+    meta = {
+        "file": paper.pdf_path.name,
+        "pdf_path": str(paper.pdf_path),
+        "title": paper.title,
+        "authors": paper.authors,
+        "abstract": paper.abstract,
+        "query_used": query,
+        "outputs": {
+            "summary_md": str(sum_path),
+            "analysis_md": str(ana_path),
+        },
+        **extra,
+    }
+    if sum_path is not None:
+        meta_path = dirs.metadata / f"{stem}_meta.json"
+        atomic_write_text(meta_path, json.dumps(meta, indent=2))
+    return {**meta, "stem": stem}
+
+
+def reuse_outputs(paper: PreparedPaper, canonical: PaperResult, similarity: float, query: str, dirs: OutputDirs,
+                  markdown: bool = True) -> PaperResult:
+    """
+    Outputs for a near-duplicate paper without any LLM calls: copies of the
+    canonical paper's summary and analysis (markdown=False: no files, the
+    results store points at the canonical row), plus the paper's own
+    metadata recording where they came from.
+    """
+    if Path(paper.pdf_path).resolve() == Path(canonical.pdf_path).resolve():
+        return canonical  # the same file listed twice
+    stem = output_stem(paper.pdf_path, dirs.source_root)
+    sum_path = ana_path = None
+    with profiling.paper_scope(paper.pdf_path.name) as stage_records:
+        with profiling.stage("dedup.reuse") as st:
+            if markdown and canonical.summary_path is not None:
+                sum_path = dirs.summaries / f"{stem}_summary.md"
+                ana_path = dirs.analyses / f"{stem}_analysis.md"
+                for src_path, dst_path in ((canonical.summary_path, sum_path), (canonical.analysis_path, ana_path)):
+                    if Path(src_path).resolve() != dst_path.resolve():
+                        atomic_write_text(dst_path, Path(src_path).read_text(encoding="utf-8"))
+            meta = _write_metadata(paper, query, dirs, stem, sum_path, ana_path,
+                                   duplicate_of=str(canonical.pdf_path), similarity=round(similarity, 3))
+            st.add(duplicates=1)
+    profiling.merge(paper.profile + stage_records)
+    return PaperResult(pdf_path=paper.pdf_path, summary_path=sum_path, analysis_path=ana_path,
+                       duration=round(paper.prep_seconds, 2), duplicate_of=canonical.pdf_path,
+                       meta=meta, prep_seconds=paper.prep_seconds)
+
+
+def result_record(result: PaperResult, query: str, config_hash: Optional[str] = None,
+                  run_id: Optional[str] = None) -> Dict[str, Any]:
+    """One results-store row (src/results_store.py COLUMNS) for a finished paper."""
+    meta = result.meta
+    usage = result.usage
+    return {
+        "pdf_path": result.pdf_path,
+        "file": result.pdf_path.name,
+        "stem": meta.get("stem"),
+        "title": meta.get("title"),
+        "authors": meta.get("authors"),
+        "abstract": meta.get("abstract"),
+        "query": query,
+        "summary": result.summary,
+        "analysis": result.analysis,
+        "summary_path": None if result.summary_path is None else str(result.summary_path),
+        "analysis_path": None if result.analysis_path is None else str(result.analysis_path),
+        "model": DEFAULT_MODEL,
+        "prompt_version": prompt_version(),
+        "config_hash": config_hash,
+        "duration_sec": result.duration,
+        "prep_sec": round(result.prep_seconds, 3),
+        "ttft_sec": result.ttft,
+        "llm_calls": usage.get("llm_calls", 0),
+        "tokens_in": usage.get("tokens_in", 0),
+        "tokens_out": usage.get("tokens_out", 0),
+        "llm_cache_hits": usage.get("llm_cache_hits", 0),
+        "duplicate_of": result.duplicate_of,
+        "similarity": meta.get("similarity"),
+        "run_id": run_id,
+    }
+
+
+class _Deduplicator:
+    """
+    Which papers of a run reuse which. The first paper of a near-duplicate
+    group to finish parsing is canonical and goes to the LLM; later ones
+    wait for its result (or take it at once if it is already written). If
+    the canonical paper fails, the first waiting duplicate takes its place.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.index = MinHashIndex()
+        self.results: Dict[Path, PaperResult] = {}
+        self.waiting: Dict[Path, List[Tuple[PreparedPaper, float]]] = {}
+        self.failed: Set[Path] = set()
+
+    def assign(self, paper: PreparedPaper) -> Optional[Tuple[Path, float]]:
+        """(canonical path, similarity) for a near-duplicate; None makes the paper canonical."""
+        if paper.signature is None:
+            return None
+        for sim, key in self.index.near_duplicates(paper.signature, self.threshold):
+            if key not in self.failed:
+                return key, sim
+        self.index.add(paper.pdf_path, paper.signature)
+        return None
+
+    def wait(self, paper: PreparedPaper, canonical: Path, sim: float) -> bool:
+        """Queue the duplicate unless the canonical result exists already (then the caller reuses it now)."""
+        if canonical in self.results:
+            return False
+        self.waiting.setdefault(canonical, []).append((paper, sim))
+        return True
+
+    def finished(self, result: PaperResult) -> List[Tuple[PreparedPaper, float]]:
+        self.results[result.pdf_path] = replace(result, summary=None, analysis=None)  # texts live in the store
+        return self.waiting.pop(result.pdf_path, [])
+
+    def canonical_failed(self, pdf_path: Path) -> Optional[PreparedPaper]:
+        """Promote the first paper waiting on a failed canonical one; the caller sends it to the LLM."""
+        self.failed.add(pdf_path)
+        waiting = self.waiting.pop(pdf_path, [])
+        if not waiting:
+            return None
+        promoted = waiting[0][0]
+        self.index.add(promoted.pdf_path, promoted.signature)
+        if len(waiting) > 1:
+            self.waiting[promoted.pdf_path] = waiting[1:]
+        return promoted
+
+    def __len__(self) -> int:
+        """Papers held back waiting for a canonical result."""
+        return sum(len(w) for w in self.waiting.values())
+
+
+@dataclass
+class _Raised:
+    error: BaseException
+
+
+def prefetch(items: Iterable[T], depth: int = 2) -> Iterator[T]:
+    """
+    Iterate items produced by a background thread that stays at most
+    `depth` items ahead of the consumer. Exceptions raised while producing
+    are re-raised in the consumer; abandoning the iterator stops the thread.
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as e:  # surfaced to the consumer below
+            put(_Raised(e))
+        put(done)
+
+    threading.Thread(target=produce, name="prefetch", daemon=True).start()
+    try:
+        while True:
+            item = q.get()
+            if item is done:
+                return
+            if isinstance(item, _Raised):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+
+def run_batch(
+    pdfs: Iterable[Path],
+    query: str,
+    dirs: OutputDirs,
+    api_key: str,
+    parse_workers: Optional[int] = None,
+    llm_concurrency: int = 4,
+    on_result: Optional[Callable[[PaperResult], None]] = None,
+    options: Optional[PipelineOptions] = None,
+    on_error: Optional[Callable[[Path, Exception], None]] = None,
+    collect: bool = True,
+) -> List[PaperResult]:
+    """
+    Process many PDFs with a process pool for parsing and a thread pool
+    (llm_concurrency threads, i.e. at most that many papers talking to the
+    LLM at once) for generation.
+
+    pdfs may be any (lazy) iterable; paths are pulled only as capacity frees
+    up, and at most 2 * parse_workers + llm_concurrency papers are parsed
+    but not yet written at any time, so memory stays flat however large the
+    corpus is. collect=False skips building the returned list.
+
+    on_result is always called from the calling thread, so callers can
+    append to a shared CSV report without extra locking. Failures are
+    logged and skipped, exactly like the sequential loop, and reported to
+    on_error (also from the calling thread).
+    """
+    options = options or PipelineOptions()
+    pdf_iter = iter(pdfs)
+    llm_concurrency = max(1, llm_concurrency)
+    max_in_flight = max(1, (parse_workers or 4) * 2) + llm_concurrency
+    results: List[PaperResult] = []
+    dedup = _Deduplicator(options.dedup_threshold) if options.dedup_threshold > 0 else None
+
+    def deliver(result: PaperResult) -> None:
+        if collect:
+            results.append(result)
+        if on_result is not None:
+            on_result(result)
+
+    def fail(pdf_path: Path, e: Exception) -> None:
+        print(f"[WARN] {pdf_path.name}: {e}")
+        if on_error is not None:
+            on_error(pdf_path, e)
+
+    def reuse(paper: PreparedPaper, canonical: PaperResult, sim: float) -> None:
+        try:
+            deliver(reuse_outputs(paper, canonical, sim, query, dirs, markdown=options.markdown))
+        except Exception as e:
+            fail(paper.pdf_path, e)
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as parse_pool, \
+            ThreadPoolExecutor(max_workers=llm_concurrency) as llm_pool:
+        tags: Dict[Future, Tuple[str, Path]] = {}
+
+        def refill() -> None:
+            # Bounded look-ahead: parsed-but-unwritten papers count too, so a
+            # slow LLM backs up parsing instead of piling up PreparedPapers.
+            while len(tags) + (len(dedup) if dedup is not None else 0) < max_in_flight:
+                pdf_path = next(pdf_iter, None)
+                if pdf_path is None:
+                    return
+                tags[parse_pool.submit(prepare_paper, pdf_path, query, None, options)] = ("parse", pdf_path)
+
+        refill()
+        while tags:
+            done, _ = wait(list(tags), return_when=FIRST_COMPLETED)
+            for fut in done:
+                stage, pdf_path = tags.pop(fut)
+                try:
+                    value = fut.result()
+                except Exception as e:
+                    fail(pdf_path, e)
+                    promoted = dedup.canonical_failed(pdf_path) if dedup is not None and stage == "llm" else None
+                    if promoted is not None:
+                        tags[llm_pool.submit(write_outputs, promoted, query, dirs, api_key, options)] = ("llm", promoted.pdf_path)
+                    continue
+
+                if stage == "parse":
+                    match = dedup.assign(value) if dedup is not None else None
+                    if match is None:
+                        tags[llm_pool.submit(write_outputs, value, query, dirs, api_key, options)] = ("llm", pdf_path)
+                    elif not dedup.wait(value, *match):
+                        reuse(value, dedup.results[match[0]], match[1])
+                else:
+                    deliver(value)
+                    for paper, sim in (dedup.finished(value) if dedup is not None else []):
+                        reuse(paper, value, sim)
+            refill()
+
+    return results
+
+
+def run_sequential(
+    pdfs: Iterable[Path],
+    query: str,
+    dirs: OutputDirs,
+    api_key: str,
+    on_result: Optional[Callable[[PaperResult], None]] = None,
+    options: Optional[PipelineOptions] = None,
+    on_error: Optional[Callable[[Path, Exception], None]] = None,
+    collect: bool = True,
+    prefetch_depth: int = 1,
+) -> List[PaperResult]:
+    """
+    Single-process fallback with the same contract as run_batch. The next
+    prefetch_depth papers are prepared in a background thread while the
+    current one waits on the LLM (0 = strictly one at a time). With a page
+    timeout set, papers are prepared on the calling thread instead: the
+    timeout needs the main thread's SIGALRM, and off it every PDF would be
+    re-opened in a page worker.
+    """
+    def prepared() -> Iterator[Tuple[Path, Optional[PreparedPaper], Optional[Exception]]]:
+        for pdf_path in pdfs:
+            try:
+                yield pdf_path, prepare_paper(pdf_path, query, options=options), None
+            except Exception as e:
+                yield pdf_path, None, e
+
+    options = options or PipelineOptions()
+    results: List[PaperResult] = []
+    dedup = _Deduplicator(options.dedup_threshold) if options.dedup_threshold > 0 else None
+    if extraction_settings().page_timeout:
+        prefetch_depth = 0
+    papers = prefetch(prepared(), prefetch_depth) if prefetch_depth > 0 else prepared()
+    for pdf_path, paper, error in papers:
+        if error is None:
+            # one paper at a time: a matching canonical paper is already written (or failed)
+            match = dedup.assign(paper) if dedup is not None else None
+            try:
+                if match is not None:
+                    result = reuse_outputs(paper, dedup.results[match[0]], match[1], query, dirs, markdown=options.markdown)
+                else:
+                    result = write_outputs(paper, query, dirs, api_key, options)
+                    if dedup is not None:
+                        dedup.finished(result)
+            except Exception as e:
+                error = e
+                if dedup is not None and match is None:
+                    dedup.canonical_failed(pdf_path)
+        if error is not None:
+            print(f"[WARN] {pdf_path.name}: {error}")
+            if on_error is not None:
+                on_error(pdf_path, error)
+            continue
+        if collect:
+            results.append(result)
+        if on_result is not None:
+            on_result(result)
+    return results
@@ -0,0 +1,253 @@
+"""
+profiling.py — lightweight stage instrumentation
+------------------------------------------------
+Hot-path stages wrap themselves in `with stage("name") as st:` and add
+counters (bytes, tokens, chunks, ...) with st.add(...). While profiling is
+off, stage() returns a shared no-op object, so the cost is one function
+call per stage.
+
+When enabled, every stage records wall time, CPU time of the running
+thread and its counters, tagged with the paper it ran for (paper_scope).
+Records made in a worker process travel back on PreparedPaper and are
+merged with merge(); report() turns them into per-paper totals and
+per-stage p50/p95/p99 as a JSON-ready dict.
+
+Optional capture modes for deeper digging:
+  cprofile     cProfile of the calling thread -> .prof stats file + top functions
+  tracemalloc  peak traced memory + top allocation sites
+"""
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+CAPTURE_MODES = ("cprofile", "tracemalloc")
+PERCENTILES = (50, 95, 99)
+
+_enabled = False
+_records: List[dict] = []
+_lock = threading.Lock()
+_paper: ContextVar[Optional[str]] = ContextVar("rgpt_profile_paper", default=None)
+_sink: ContextVar[Optional[List[dict]]] = ContextVar("rgpt_profile_sink", default=None)
+_current: ContextVar[Optional["_Stage"]] = ContextVar("rgpt_profile_stage", default=None)
+
+
+def enable(on: bool = True) -> None:
+    global _enabled
+    _enabled = on
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, **counters) -> None:
+        pass
+
+
+_NULL = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("name", "counters", "_parent", "_token", "_wall", "_cpu")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counters: Dict[str, float] = {}
+
+    def __enter__(self):
+        parent = _current.get()
+        self._parent = parent.name if parent is not None else None
+        self._token = _current.set(self)
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        record = {
+            "paper": _paper.get(),
+            "stage": self.name,
+            "parent": self._parent,
+            "wall_s": time.perf_counter() - self._wall,
+            "cpu_s": time.thread_time() - self._cpu,
+            **self.counters,
+        }
+        _current.reset(self._token)
+        sink = _sink.get()
+        if sink is not None:
+            sink.append(record)
+        else:
+            with _lock:
+                _records.append(record)
+        return False
+
+    def add(self, **counters) -> None:
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+def stage(name: str):
+    """Context manager timing one stage; a no-op while profiling is off."""
+    return _Stage(name) if _enabled else _NULL
+
+
+def add(**counters) -> None:
+    """Add counters to the innermost running stage (e.g. tokens from the LLM client)."""
+    if _enabled:
+        current = _current.get()
+        if current is not None:
+            current.add(**counters)
+
+
+@contextmanager
+def paper_scope(paper: str) -> Iterator[List[dict]]:
+    """
+    Tag stages run inside the block with `paper` and collect their records
+    in the yielded list instead of the global one; pass them to merge().
+    """
+    records: List[dict] = []
+    paper_token = _paper.set(paper)
+    sink_token = _sink.set(records)
+    try:
+        yield records
+    finally:
+        _sink.reset(sink_token)
+        _paper.reset(paper_token)
+
+
+def merge(records: Sequence[dict]) -> None:
+    with _lock:
+        _records.extend(records)
+
+
+def records() -> List[dict]:
+    with _lock:
+        return list(_records)
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Linear-interpolated percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def _distribution(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    out = {"total": round(sum(values), 6)}
+    for q in PERCENTILES:
+        out[f"p{q}"] = round(percentile(values, q), 6)
+    out["max"] = round(values[-1], 6) if values else 0.0
+    return out
+
+
+def report(recs: Optional[Sequence[dict]] = None) -> dict:
+    """
+    {"stages": {stage: {count, wall_s: {total,p50,p95,p99,max}, cpu_s: {...}, <counter>: sum}},
+     "papers": {paper: {wall_s, cpu_s, stages: {stage: {count, wall_s, cpu_s, <counter>: sum}}}}}
+
+    Paper totals only add up top-level stages, so nested stages (an
+    extraction inside another stage) are not counted twice.
+    """
+    recs = records() if recs is None else list(recs)
+    fixed = ("paper", "stage", "parent", "wall_s", "cpu_s")
+
+    by_stage: Dict[str, List[dict]] = {}
+    for r in recs:
+        by_stage.setdefault(r["stage"], []).append(r)
+    stages = {}
+    for name, rows in sorted(by_stage.items()):
+        entry = {
+            "count": len(rows),
+            "wall_s": _distribution([r["wall_s"] for r in rows]),
+            "cpu_s": _distribution([r["cpu_s"] for r in rows]),
+        }
+        for r in rows:
+            for key, value in r.items():
+                if key not in fixed:
+                    entry[key] = entry.get(key, 0) + value
+        stages[name] = entry
+
+    papers: Dict[str, dict] = {}
+    for r in recs:
+        if r["paper"] is None:
+            continue
+        paper = papers.setdefault(r["paper"], {"wall_s": 0.0, "cpu_s": 0.0, "stages": {}})
+        if r["parent"] is None:
+            paper["wall_s"] += r["wall_s"]
+            paper["cpu_s"] += r["cpu_s"]
+        entry = paper["stages"].setdefault(r["stage"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0})
+        entry["count"] += 1
+        for key, value in r.items():
+            if key not in ("paper", "stage", "parent"):
+                entry[key] = entry.get(key, 0) + value
+    for paper in papers.values():
+        paper["wall_s"] = round(paper["wall_s"], 6)
+        paper["cpu_s"] = round(paper["cpu_s"], 6)
+        for entry in paper["stages"].values():
+            entry["wall_s"] = round(entry["wall_s"], 6)
+            entry["cpu_s"] = round(entry["cpu_s"], 6)
+
+    paper_walls = sorted(p["wall_s"] for p in papers.values())
+    return {
+        "stages": stages,
+        "papers": papers,
+        "paper_wall_s": _distribution(paper_walls),
+    }
+
+
+class Capture:
+    """cProfile or tracemalloc around a block of work; stop() returns a JSON-ready summary."""
+
+    def __init__(self, mode: str, stats_path: Path, top: int = 25):
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode {mode!r}; expected one of {CAPTURE_MODES}")
+        self.mode = mode
+        self.stats_path = Path(stats_path)  # cProfile dump, loadable with pstats / snakeviz
+        self.top = top
+        self._profiler: Optional[cProfile.Profile] = None
+
+    def start(self) -> None:
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            tracemalloc.start(10)
+
+    def stop(self) -> dict:
+        if self.mode == "cprofile":
+            self._profiler.disable()
+            self.stats_path.parent.mkdir(parents=True, exist_ok=True)
+            self._profiler.dump_stats(str(self.stats_path))
+            stats = pstats.Stats(self._profiler, stream=io.StringIO())
+            top = []
+            for (filename, line, func), (_cc, ncalls, tottime, cumtime, _callers) in stats.stats.items():
+                top.append({"function": f"{filename}:{line}({func})", "calls": ncalls,
+                            "tottime_s": round(tottime, 6), "cumtime_s": round(cumtime, 6)})
+            top.sort(key=lambda row: row["cumtime_s"], reverse=True)
+            return {"mode": "cprofile", "stats_file": str(self.stats_path), "top": top[: self.top]}
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            _current_bytes, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            top = [
+                {"site": str(stat.traceback[0]), "bytes": stat.size, "blocks": stat.count}
+                for stat in snapshot.statistics("lineno")[: self.top]
+            ]
+            return {"mode": "tracemalloc", "peak_bytes": peak, "top": top}
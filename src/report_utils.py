@@ -1,39 +1,68 @@
 """
 report_utils.py — handles batch run reporting (CSV logs)
 --------------------------------------------------------
-Creates and appends to a CSV report summarizing each processed PDF.
+Writes the CSV report summarizing each processed PDF, exported in one pass
+from the results store (src/results_store.py) rather than appended to
+row by row.
 """
 
 import csv
-from pathlib import Path
 from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable
 
 REPORT_PATH = Path("results/batch_report.csv")
+HEADER = [
+    "timestamp",
+    "file",
+    "query_used",
+    "summary_path",
+    "analysis_path",
+    "duration_sec",
+    "ttft_sec",
+    "llm_calls",
+    "tokens_in",
+    "tokens_out",
+    "duplicate_of",
+]
+
+# results-store columns a report row is built from
+STORE_COLUMNS = (
+    "updated", "file", "query", "summary_path", "analysis_path", "duration_sec", "ttft_sec",
+    "llm_calls", "tokens_in", "tokens_out", "duplicate_of",
+)
 
-def append_report_row(pdf_path, query, summary_path, analysis_path, duration):
+def _blank(value):
+    return "" if value is None else value
+
+def write_report(rows: Iterable[Dict[str, object]], path: Path = REPORT_PATH) -> int:
     """
-    Append one processed file's results to a CSV report.
-    Creates the file with a header if it doesn't exist.
+    Write one report row per stored paper and return the count. The file is
+    replaced atomically. ttft_sec is the time to the first streamed summary
+    token (blank when not streaming); paths are blank for papers whose
+    markdown files were not written.
     """
-    REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    file_exists = REPORT_PATH.exists()
-
-    with REPORT_PATH.open("a", newline="", encoding="utf-8") as f:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    n = 0
+    with tmp.open("w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
-        if not file_exists:
+        writer.writerow(HEADER)
+        for row in rows:
             writer.writerow([
-                "timestamp",
-                "file",
-                "query_used",
-                "summary_path",
-                "analysis_path",
-                "duration_sec"
+                datetime.fromtimestamp(row["updated"]).isoformat(timespec="seconds"),
+                row["file"],
+                row["query"],
+                _blank(row["summary_path"]),
+                _blank(row["analysis_path"]),
+                _blank(row["duration_sec"]),
+                "" if row["ttft_sec"] is None else round(row["ttft_sec"], 3),
+                _blank(row["llm_calls"]),
+                _blank(row["tokens_in"]),
+                _blank(row["tokens_out"]),
+                _blank(row["duplicate_of"]),
             ])
-        writer.writerow([
-            datetime.now().isoformat(timespec="seconds"),
-            pdf_path.name,
-            query,
-            str(summary_path),
-            str(analysis_path),
-            round(duration, 2)
-        ])
+            n += 1
+    tmp.replace(path)
+    return n
@@ -0,0 +1,233 @@
+"""
+results_store.py — every batch result in one SQLite file
+--------------------------------------------------------
+One row per paper: metadata, the summary and analysis markdown, timings,
+model and prompt version, and LLM calls/token estimates. Rows are
+buffered and written BATCH_SIZE at a time (or every FLUSH_INTERVAL_S
+seconds) in a single transaction, so a 50k-paper run costs a few
+thousand commits instead of 150k small files and a CSV reopen per paper.
+
+Near-duplicates reused within a run (src/dedup.py) store no text of their
+own, only duplicate_of; the `results` view fills it in from the canonical
+paper's row. Aggregates run as SQL over the table, and the per-paper
+markdown/JSON files, the CSV report or JSON lines are exports from it.
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from src.config import RESULTS_DB_PATH
+from src.io_utils import atomic_write_text
+
+BATCH_SIZE = 64
+FLUSH_INTERVAL_S = 5.0
+
+# column -> SQLite type; records passed to put() use these keys
+COLUMNS: Dict[str, str] = {
+    "pdf_path": "TEXT PRIMARY KEY",  # resolved path
+    "file": "TEXT",
+    "stem": "TEXT",  # output file stem the batch run used (markdown exports reuse it)
+    "title": "TEXT",
+    "authors": "TEXT",
+    "abstract": "TEXT",
+    "query": "TEXT",
+    "summary": "TEXT",  # the summary markdown file's contents (NULL for reused duplicates)
+    "analysis": "TEXT",
+    "summary_path": "TEXT",  # NULL when markdown files were not written
+    "analysis_path": "TEXT",
+    "model": "TEXT",
+    "prompt_version": "TEXT",
+    "config_hash": "TEXT",
+    "duration_sec": "REAL",
+    "prep_sec": "REAL",
+    "ttft_sec": "REAL",
+    "llm_calls": "INTEGER",
+    "tokens_in": "INTEGER",  # estimated, requests actually sent (cache hits cost none)
+    "tokens_out": "INTEGER",
+    "llm_cache_hits": "INTEGER",
+    "duplicate_of": "TEXT",  # pdf_path of the paper whose outputs were reused
+    "similarity": "REAL",
+    "run_id": "TEXT",  # the batch run that last wrote the row (the CSV report covers one run)
+    "updated": "REAL NOT NULL",
+}
+_TEXT_COLUMNS = ("summary", "analysis")
+
+
+def _key(pdf_path) -> str:
+    return str(Path(pdf_path).resolve())
+
+
+class ResultsStore:
+    def __init__(self, path: Path = RESULTS_DB_PATH, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL_S, readonly: bool = False):
+        self.path = Path(path)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending: Dict[str, tuple] = {}
+        self._runs: Dict[str, str] = {}  # pdf_path -> run_id for rows a run reuses as they are
+        self._last_flush = time.monotonic()
+        if readonly:
+            if not self.path.exists():
+                raise FileNotFoundError(f"No results store at {self.path}; run `main.py batch` first")
+            self._db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS papers ({', '.join(f'{c} {t}' for c, t in COLUMNS.items())})")
+        have = {row[1] for row in self._db.execute("PRAGMA table_info(papers)")}
+        for column, sql_type in COLUMNS.items():
+            if column not in have:
+                self._db.execute(f"ALTER TABLE papers ADD COLUMN {column} {sql_type.replace(' NOT NULL', '')}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS papers_run_id ON papers (run_id)")
+        resolved = ", ".join(
+            f"COALESCE(p.{c}, c.{c}) AS {c}" if c in _TEXT_COLUMNS else f"p.{c} AS {c}" for c in COLUMNS
+        )
+        self._db.execute("DROP VIEW IF EXISTS results")
+        self._db.execute(
+            f"CREATE VIEW results AS SELECT {resolved} FROM papers p LEFT JOIN papers c ON c.pdf_path = p.duplicate_of"
+        )
+        self._db.commit()
+
+    # -- writing -----------------------------------------------------------
+
+    def put(self, record: Dict[str, object]) -> None:
+        """Queue one paper's row (keys from COLUMNS); written with the next batch."""
+        row = {c: None for c in COLUMNS}
+        row.update({k: v for k, v in record.items() if k in COLUMNS})
+        row["pdf_path"] = _key(row["pdf_path"])
+        if row["duplicate_of"] is not None:
+            row["duplicate_of"] = _key(row["duplicate_of"])
+        row["updated"] = row["updated"] or time.time()
+        with self._lock:
+            self._pending[row["pdf_path"]] = tuple(row.values())
+            if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def mark_run(self, pdf_path: Path, run_id: str) -> None:
+        """Count an already stored paper as part of run_id (e.g. skipped by --resume); batched like put()."""
+        with self._lock:
+            self._runs[_key(pdf_path)] = run_id
+            if len(self._runs) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._pending and not self._runs:
+            return
+        marks = ", ".join("?" for _ in COLUMNS)
+        with self._db:  # one transaction per batch
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO papers ({', '.join(COLUMNS)}) VALUES ({marks})", list(self._pending.values())
+            )
+            self._db.executemany(
+                "UPDATE papers SET run_id = ? WHERE pdf_path = ?", [(run, key) for key, run in self._runs.items()]
+            )
+        self._pending.clear()
+        self._runs.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            self._db.close()
+
+    # -- reading -----------------------------------------------------------
+
+    def contains(self, pdf_path: Path) -> bool:
+        key = _key(pdf_path)
+        with self._lock:
+            if key in self._pending:
+                return True
+            return self._db.execute("SELECT 1 FROM papers WHERE pdf_path = ?", (key,)).fetchone() is not None
+
+    def query(self, sql: str, params: Iterable = ()) -> Tuple[List[str], Iterator[tuple]]:
+        """(column names, row iterator) for any SQL over the `papers` table and `results` view."""
+        self.flush()
+        cur = self._db.execute(sql, tuple(params))
+        return [c[0] for c in cur.description or ()], iter(cur)
+
+    def rows(self, where: str = "", params: Iterable = (), columns: Iterable[str] = ()) -> Iterator[Dict[str, object]]:
+        """Papers as dicts (all COLUMNS unless given), texts of reused duplicates filled in, in path order."""
+        select = ", ".join(columns) or "*"
+        columns, cursor = self.query(f"SELECT {select} FROM results {where} ORDER BY pdf_path", params)
+        for row in cursor:
+            yield dict(zip(columns, row))
+
+    def stats(self) -> Dict[str, object]:
+        """Run-wide aggregates, computed in SQLite without reading any text column."""
+        self.flush()
+        cur = self._db.execute(
+            "SELECT COUNT(*), COUNT(duplicate_of), SUM(summary_path IS NOT NULL),"
+            " SUM(llm_calls), SUM(llm_cache_hits), SUM(tokens_in), SUM(tokens_out),"
+            " SUM(duration_sec), AVG(duration_sec), MAX(duration_sec), AVG(ttft_sec),"
+            " MIN(updated), MAX(updated) FROM papers"
+        )
+        names = ("papers", "duplicates_reused", "with_markdown_files", "llm_calls", "llm_cache_hits",
+                 "tokens_in", "tokens_out", "duration_sec_total", "duration_sec_mean", "duration_sec_max",
+                 "ttft_sec_mean", "first_updated", "last_updated")
+        out: Dict[str, object] = dict(zip(names, cur.fetchone()))
+        n = self._db.execute("SELECT COUNT(duration_sec) FROM papers").fetchone()[0]
+        for q in (50, 95, 99):
+            row = self._db.execute(
+                "SELECT duration_sec FROM papers WHERE duration_sec IS NOT NULL ORDER BY duration_sec LIMIT 1 OFFSET ?",
+                (max(0, -(-n * q // 100) - 1),),
+            ).fetchone()
+            out[f"duration_sec_p{q}"] = row[0] if row else None
+        for column in ("model", "prompt_version", "query"):
+            out[f"by_{column}"] = dict(self._db.execute(
+                f"SELECT {column}, COUNT(*) FROM papers GROUP BY {column} ORDER BY COUNT(*) DESC"
+            ).fetchall())
+        for name in ("first_updated", "last_updated"):
+            if out[name] is not None:
+                out[name] = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(out[name]))
+        return out
+
+
+# -- exports ---------------------------------------------------------------
+
+def export_jsonl(rows: Iterable[Dict[str, object]], out: Path) -> int:
+    """Every column of every row as JSON lines; returns the row count."""
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    n = 0
+    tmp = out.with_name(f".{out.name}.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            n += 1
+    tmp.replace(out)
+    return n
+
+
+def export_markdown(rows: Iterable[Dict[str, object]], summaries: Path, analyses: Path, metadata: Path) -> int:
+    """The per-paper summary/analysis markdown and _meta.json files a batch run writes; returns the paper count."""
+    n = 0
+    for row in rows:
+        stem = row["stem"] or Path(row["pdf_path"]).stem
+        sum_path = Path(summaries) / f"{stem}_summary.md"
+        ana_path = Path(analyses) / f"{stem}_analysis.md"
+        atomic_write_text(sum_path, row["summary"] or "", durable=False)
+        atomic_write_text(ana_path, row["analysis"] or "", durable=False)
+        meta = {
+            "file": row["file"],
+            "pdf_path": row["pdf_path"],
+            "title": row["title"],
+            "authors": row["authors"],
+            "abstract": row["abstract"],
+            "query_used": row["query"],
+            "outputs": {"summary_md": str(sum_path), "analysis_md": str(ana_path)},
+        }
+        if row["duplicate_of"]:
+            meta.update(duplicate_of=row["duplicate_of"], similarity=row["similarity"])
+        atomic_write_text(Path(metadata) / f"{stem}_meta.json", json.dumps(meta, indent=2), durable=False)
+        n += 1
+    return n
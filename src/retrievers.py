@@ -0,0 +1,299 @@
+"""
+retrievers.py — pluggable retrieval backends over the corpus index
+------------------------------------------------------------------
+  tfidf   exact sparse TF-IDF cosine (CorpusIndex)
+  dense   CPU-only LSA embeddings (TF-IDF -> TruncatedSVD), stored as a
+          memory-mapped float16 matrix with an IVF (k-means inverted file)
+          index for sub-linear approximate nearest-neighbour search
+  hybrid  reciprocal-rank fusion of the tfidf and dense rankings
+
+All backends rank corpus row ids (rank_batch) and return hits in the
+indexer.search format: [(score, (label, chunk_text)), ...]. The dense index lives next to the
+corpus index (<index_dir>/dense/) and follows the corpus index version.
+Fitting it (SVD + k-means) costs far more than the append-only corpus
+update that made it stale, so new rows are projected with the fitted SVD
+and filed under the nearest existing centroid; the full fit is redone
+only after a compaction or once the live row count has moved by more
+than DENSE_REFIT_FRACTION since the last fit.
+"""
+import json
+from abc import ABC, abstractmethod
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.corpus_index import CorpusIndex, paper_key
+from src.indexer import top_k_indices
+from src.options import RETRIEVERS
+
+Hit = Tuple[float, Tuple[str, str]]
+
+DENSE_DIM = 256
+DENSE_REFIT_FRACTION = 0.2  # refit SVD + k-means once live rows drift this far from the fitted count
+RRF_K = 60  # standard reciprocal-rank-fusion damping constant
+
+
+class Retriever(ABC):
+    name = "base"
+    corpus: CorpusIndex
+
+    @abstractmethod
+    def rank_batch(self, queries: List[str], k: int = 5, paper: Optional[Path] = None) -> List[List[Tuple[float, int]]]:
+        """Top-k (score, corpus row id) per query, best first."""
+
+    def search_batch(self, queries: List[str], k: int = 5, paper: Optional[Path] = None) -> List[List[Hit]]:
+        return [[self.corpus.hit(score, row) for score, row in ranked] for ranked in self.rank_batch(queries, k, paper)]
+
+    def search(self, query: str, k: int = 5, paper: Optional[Path] = None) -> List[Hit]:
+        return self.search_batch([query], k=k, paper=paper)[0]
+
+
+class TfidfRetriever(Retriever):
+    name = "tfidf"
+
+    def __init__(self, corpus: CorpusIndex):
+        self.corpus = corpus
+
+    def rank_batch(self, queries, k=5, paper=None):
+        return self.corpus.rank_batch(queries, k=k, paper=paper)
+
+
+class DenseIndex:
+    """
+    <dir>/embeddings.npy   (stored rows x dim) float16, unit-normalised
+    <dir>/components.npy   (dim x vocab) float32 SVD projection for queries
+    <dir>/centroids.npy    (nlist x dim) float32 IVF centroids
+    <dir>/ivf_rows.npy     row ids grouped by centroid
+    <dir>/ivf_offsets.npy  CSR-style offsets into ivf_rows per centroid
+    <dir>/meta.json        source corpus version and generation, dim, nlist,
+                           stored rows, live rows at the last fit
+    """
+
+    FILES = ("embeddings", "components", "centroids", "ivf_rows", "ivf_offsets")
+
+    def __init__(self, root: Path, arrays: Dict[str, np.ndarray], meta: dict):
+        self.root = root
+        self.arrays = arrays
+        self.meta = meta
+
+    @staticmethod
+    def corpus_version(corpus: CorpusIndex) -> Optional[str]:
+        current = corpus.root / "CURRENT"
+        return current.read_text(encoding="utf-8").strip() if current.exists() else None
+
+    @classmethod
+    def load(cls, root: Path) -> Optional["DenseIndex"]:
+        meta_path = root / "meta.json"
+        if not meta_path.exists():
+            return None
+        arrays = {name: np.load(root / f"{name}.npy", mmap_mode="r") for name in cls.FILES}
+        return cls(root, arrays, json.loads(meta_path.read_text(encoding="utf-8")))
+
+    @staticmethod
+    def _weighted(corpus: CorpusIndex, rows: Optional[np.ndarray] = None):
+        """Unit-norm TF-IDF rows, the same ones TF-IDF search sees."""
+        from scipy.sparse import diags
+
+        matrix = corpus.matrix if rows is None else corpus.matrix[rows]
+        norms = corpus.norms() if rows is None else corpus.norms()[rows]
+        inv = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        return diags(inv) @ matrix.astype(np.float64) @ diags(corpus.idf())
+
+    @staticmethod
+    def _ivf(assign: np.ndarray, rows: np.ndarray, nlist: int) -> Tuple[np.ndarray, np.ndarray]:
+        order = rows[np.argsort(assign, kind="stable")].astype(np.int32)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=nlist), out=offsets[1:])
+        return order, offsets
+
+    @classmethod
+    def _save(cls, root: Path, arrays: Dict[str, np.ndarray], meta: dict) -> "DenseIndex":
+        tmp = root.with_name(root.name + ".tmp")
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir(parents=True)
+        for name in cls.FILES:
+            np.save(tmp / f"{name}.npy", arrays[name])
+        (tmp / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+        if root.exists():
+            shutil.rmtree(root)
+        os.replace(tmp, root)
+        return cls.load(root)
+
+    @classmethod
+    def build(cls, corpus: CorpusIndex, root: Path, dim: int = DENSE_DIM, seed: int = 0) -> "DenseIndex":
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.decomposition import TruncatedSVD
+
+        n = len(corpus)
+        if n == 0:
+            raise ValueError("Corpus index is empty; run `main.py index` first.")
+        weighted = cls._weighted(corpus)
+
+        dim = max(1, min(dim, n - 1, weighted.shape[1] - 1))
+        svd = TruncatedSVD(n_components=dim, algorithm="randomized", random_state=seed)
+        emb = svd.fit_transform(weighted).astype(np.float32)
+        emb /= np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+
+        # dead rows (papers changed or removed since the last compaction) embed to zero
+        # and stay out of the inverted lists
+        live = np.flatnonzero(corpus.alive)
+        nlist = max(1, int(np.sqrt(n)))
+        km = MiniBatchKMeans(n_clusters=nlist, random_state=seed, batch_size=4096, n_init=3)
+        assign = km.fit_predict(emb[live])
+        centroids = km.cluster_centers_.astype(np.float32)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        order, offsets = cls._ivf(assign, live, nlist)
+
+        arrays = {
+            "embeddings": emb.astype(np.float16),
+            "components": svd.components_.astype(np.float32),
+            "centroids": centroids,
+            "ivf_rows": order,
+            "ivf_offsets": offsets,
+        }
+        meta = {
+            "corpus_version": cls.corpus_version(corpus),
+            "dim": dim,
+            "nlist": nlist,
+            "rows": corpus.n_rows,
+            "generation": corpus.state["generation"],
+            "fit_rows": n,
+        }
+        return cls._save(root, arrays, meta)
+
+    def extend(self, corpus: CorpusIndex) -> Optional["DenseIndex"]:
+        """
+        Catch up with an append-only corpus update without refitting: embed the
+        new rows with the fitted SVD, file them under their nearest centroid and
+        drop dead rows from the inverted lists. None when a full build is due:
+        the corpus was compacted (row ids changed), or its live rows differ from
+        the fitted ones by more than DENSE_REFIT_FRACTION.
+        """
+        meta = self.meta
+        fit_rows = meta.get("fit_rows")
+        if fit_rows is None or meta.get("generation") != corpus.state["generation"] or corpus.n_rows < meta["rows"]:
+            return None
+        if abs(len(corpus) - fit_rows) > DENSE_REFIT_FRACTION * fit_rows:
+            return None
+
+        comps = np.asarray(self.arrays["components"])
+        centroids = np.asarray(self.arrays["centroids"])
+        alive = corpus.alive
+        new = np.arange(meta["rows"], corpus.n_rows)
+        emb_new = np.asarray(self._weighted(corpus, new)[:, : comps.shape[1]] @ comps.T, dtype=np.float32)
+        emb_new /= np.maximum(np.linalg.norm(emb_new, axis=1, keepdims=True), 1e-12)
+        emb_new[~alive[new]] = 0.0
+
+        offsets = np.asarray(self.arrays["ivf_offsets"])
+        rows = np.concatenate([np.asarray(self.arrays["ivf_rows"], dtype=np.int64), new])
+        assign = np.concatenate([
+            np.repeat(np.arange(len(centroids)), np.diff(offsets)),
+            np.argmax(emb_new @ centroids.T, axis=1) if len(new) else np.zeros(0, dtype=np.int64),
+        ])
+        keep = alive[rows]
+        order, offsets = self._ivf(assign[keep], rows[keep], len(centroids))
+
+        arrays = {
+            "embeddings": np.concatenate([np.asarray(self.arrays["embeddings"]), emb_new.astype(np.float16)]),
+            "components": comps,
+            "centroids": centroids,
+            "ivf_rows": order,
+            "ivf_offsets": offsets,
+        }
+        meta = {**meta, "corpus_version": self.corpus_version(corpus), "rows": corpus.n_rows}
+        return self._save(self.root, arrays, meta)
+
+    def embed_queries(self, corpus: CorpusIndex, queries: List[str]) -> np.ndarray:
+        q = corpus.query_matrix(queries).T  # (queries x vocab), TF-IDF weighted like the rows
+        comps = self.arrays["components"]
+        # vocabulary may have grown since the SVD fit; new terms have no projection
+        q = q[:, : comps.shape[1]]
+        emb = np.asarray(q @ np.asarray(comps).T, dtype=np.float32)
+        emb /= np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+        return emb
+
+    def candidates(self, q: np.ndarray, nprobe: int) -> np.ndarray:
+        """Rows in the nprobe clusters whose centroids are closest to q."""
+        cent_scores = np.asarray(self.arrays["centroids"]) @ q
+        probes = top_k_indices(cent_scores, nprobe)
+        offs = self.arrays["ivf_offsets"]
+        rows = self.arrays["ivf_rows"]
+        return np.concatenate([np.asarray(rows[offs[c]:offs[c + 1]]) for c in probes])
+
+
+class DenseRetriever(Retriever):
+    name = "dense"
+
+    def __init__(self, corpus: CorpusIndex, dense: DenseIndex, nprobe: int = 8):
+        self.corpus = corpus
+        self.dense = dense
+        self.nprobe = nprobe
+
+    @classmethod
+    def open(cls, corpus: CorpusIndex, nprobe: int = 8, rebuild: bool = True) -> "DenseRetriever":
+        root = corpus.root / "dense"
+        dense = DenseIndex.load(root)
+        stale = dense is None or dense.meta.get("corpus_version") != DenseIndex.corpus_version(corpus)
+        if stale:
+            if not rebuild:
+                raise RuntimeError("Dense index is missing or stale; rebuild it with `main.py index --retriever dense`.")
+            dense = (dense and dense.extend(corpus)) or DenseIndex.build(corpus, root)
+        return cls(corpus, dense, nprobe=nprobe)
+
+    def rank_batch(self, queries, k=5, paper=None):
+        if not len(self.corpus):
+            return [[] for _ in queries]
+        emb = self.dense.arrays["embeddings"]
+        q_emb = self.dense.embed_queries(self.corpus, queries)
+        paper_rows = None
+        if paper is not None:
+            info = self.corpus.papers.get(paper_key(paper))
+            if info is None:
+                return [[] for _ in queries]
+            paper_rows = np.arange(*info["rows"])
+
+        results = []
+        for q in q_emb:
+            # one paper is small: exact scan; whole corpus: probe the IVF lists
+            rows = paper_rows if paper_rows is not None else self.dense.candidates(q, self.nprobe)
+            scores = np.asarray(emb[rows], dtype=np.float32) @ q
+            top = top_k_indices(scores, k)
+            results.append([(float(scores[i]), int(rows[i])) for i in top])
+        return results
+
+
+class HybridRetriever(Retriever):
+    """Reciprocal-rank fusion: score = sum over backends of 1 / (RRF_K + rank)."""
+
+    name = "hybrid"
+
+    def __init__(self, retrievers: List[Retriever], depth: int = 4):
+        self.retrievers = retrievers
+        self.corpus = retrievers[0].corpus
+        self.depth = depth  # each backend contributes its top k*depth
+
+    def rank_batch(self, queries, k=5, paper=None):
+        per_backend = [r.rank_batch(queries, k=k * self.depth, paper=paper) for r in self.retrievers]
+        results = []
+        for qi in range(len(queries)):
+            # fuse on row ids: labels are for display and repeat across same-named papers
+            fused: Dict[int, float] = {}
+            for ranked in per_backend:
+                for rank, (_score, row) in enumerate(ranked[qi]):
+                    fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank + 1)
+            results.append([(score, row) for row, score in sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:k]])
+        return results
+
+
+def get_retriever(name: str, corpus: CorpusIndex, nprobe: int = 8) -> Retriever:
+    if name == "tfidf":
+        return TfidfRetriever(corpus)
+    if name == "dense":
+        return DenseRetriever.open(corpus, nprobe=nprobe)
+    if name == "hybrid":
+        return HybridRetriever([TfidfRetriever(corpus), DenseRetriever.open(corpus, nprobe=nprobe)])
+    raise ValueError(f"Unknown retriever {name!r}; expected one of {RETRIEVERS}")
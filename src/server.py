@@ -0,0 +1,315 @@
+"""
+server.py — long-lived query server over a warm corpus index
+------------------------------------------------------------
+`main.py serve` loads the corpus index (memory-mapped) and the retrieval
+backends once and answers JSON requests on a local port, so callers skip
+the interpreter start, library imports, PDF parsing and TF-IDF fitting
+that every CLI invocation pays.
+
+  GET  /health      index version, papers, chunks, last reload
+  GET  /papers      indexed papers
+  POST /search      {"query", "k": 5, "retriever": "tfidf", "paper": null}
+  POST /summarize   {"pdf", "query"}
+  POST /analyze     {"pdf", "query", "combined": false}
+  POST /compare     {"pdf1", "pdf2"}
+  POST /reload      re-index changed papers now
+
+Requests are served concurrently (one thread each). A background thread
+re-runs CorpusIndex.update every reload_interval seconds: only new or
+changed PDFs (by content hash) are re-indexed; their rows are appended
+to the index files and a fresh index object over the new version
+replaces the served one when done, so searches never wait on a reload. Papers that are in the index are summarized, analyzed and
+compared from their indexed chunks without touching the PDF again.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.analyst import analyze_chunks
+from src.cache_utils import get_extraction_cache
+from src.corpus_index import CorpusIndex, paper_key
+from src.llm_client import get_client
+from src.metadata_utils import extract_metadata
+from src.options import PipelineOptions
+from src.pipeline import (
+    COMPARE_MODEL, RETRIEVAL_K, comparison_context, comparison_prompt, prepare_paper,
+)
+from src.retrievers import RETRIEVERS, Retriever, get_retriever
+from src.summarizer import summarize_chunks
+
+MAX_BODY = 1 << 20  # request bodies are small JSON documents
+DEFAULT_QUERY = "What problem does this paper solve?"
+
+
+class BadRequest(ValueError):
+    """Client error; answered with 400 and the message."""
+
+
+class Unavailable(RuntimeError):
+    """Endpoint disabled in this server (no API key); answered with 503."""
+
+
+class QueryService:
+    """The resident state behind the HTTP handlers; safe to call from many threads."""
+
+    def __init__(
+        self,
+        index_dir: Path,
+        sources: Callable[[], Iterable[Path]],
+        api_key: Optional[str] = None,
+        options: Optional[PipelineOptions] = None,
+    ):
+        self.index_dir = Path(index_dir)
+        self.sources = sources
+        self.api_key = api_key
+        self.options = options  # the serve command's extraction settings, for papers parsed on demand
+        self.index = CorpusIndex.load(self.index_dir)
+        self.last_reload: dict = {}
+        self._retrievers: Dict[str, Retriever] = {}
+        self._meta: Dict[Tuple[str, str], dict] = {}  # (paper, content hash) -> metadata
+        self._lock = threading.Lock()          # guards the index/retriever swap
+        self._reload_lock = threading.Lock()   # one reload at a time
+        self._retriever_lock = threading.Lock()  # dense/hybrid may build their ANN index
+
+    # ------------------------------------------------------------------
+    # Index lifecycle
+    # ------------------------------------------------------------------
+
+    def reload(self) -> dict:
+        """Re-index new/changed/removed papers and swap the served index if anything changed."""
+        with self._reload_lock:
+            t0 = time.perf_counter()
+            fresh = CorpusIndex.load(self.index_dir)
+            stats = fresh.update(list(self.sources()), prune=True)
+            changed = any(stats[k] for k in ("added", "updated", "removed")) or self._version(fresh) != self.version
+            if changed:
+                self._warm(fresh)
+                with self._lock:
+                    self.index = fresh
+                    self._retrievers = {}
+            self.last_reload = {
+                **stats, "swapped": changed, "seconds": round(time.perf_counter() - t0, 3), "at": time.time(),
+            }
+            return self.last_reload
+
+    def _version(self, index: CorpusIndex) -> Optional[str]:
+        current = index.root / "CURRENT"
+        return current.read_text(encoding="utf-8").strip() if current.exists() else None
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._version(self.index)
+
+    @staticmethod
+    def _warm(index: CorpusIndex) -> None:
+        """Build the lazily computed matrix/IDF/row norms now rather than in the first request."""
+        if len(index):
+            index.norms()
+
+    def retriever(self, name: str) -> Retriever:
+        if name not in RETRIEVERS:
+            raise BadRequest(f"Unknown retriever {name!r}; expected one of {RETRIEVERS}")
+        with self._lock:
+            index, cached = self.index, self._retrievers.get(name)
+        if cached is not None:
+            return cached
+        with self._retriever_lock:
+            with self._lock:
+                cached = self._retrievers.get(name) if self.index is index else None
+            if cached is None:
+                cached = get_retriever(name, index)  # dense/hybrid (re)build their ANN index if stale
+                with self._lock:
+                    if self.index is index:
+                        self._retrievers[name] = cached
+            return cached
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def health(self) -> dict:
+        index = self.index
+        return {"version": self._version(index), "papers": len(index.papers), "chunks": len(index),
+                "last_reload": self.last_reload}
+
+    def papers(self) -> dict:
+        index = self.index
+        return {"papers": [
+            {"path": info["path"], "stem": info["stem"], "chunks": info["rows"][1] - info["rows"][0]}
+            for info in index.papers.values()
+        ]}
+
+    def search(self, body: dict) -> dict:
+        query = _required(body, "query")
+        k = body.get("k", 5)
+        if isinstance(k, bool) or not isinstance(k, int) or k < 1:
+            raise BadRequest("Field 'k' must be a positive integer")
+        paper = Path(_required(body, "paper")) if body.get("paper") else None
+        hits = self.retriever(body.get("retriever", "tfidf")).search(query, k=k, paper=paper)
+        return {"hits": [{"score": score, "label": label, "text": text} for score, (label, text) in hits]}
+
+    def summarize(self, body: dict) -> dict:
+        api_key, pdf, query = self._key(), self._paper(body), body.get("query") or DEFAULT_QUERY
+        meta, hits = self._metadata(pdf), self._hits(pdf, query)
+        summary = summarize_chunks(api_key, meta["title"], hits)
+        return {**meta, "summary": summary, "excerpts": len(hits)}
+
+    def analyze(self, body: dict) -> dict:
+        api_key, pdf, query = self._key(), self._paper(body), body.get("query") or DEFAULT_QUERY
+        meta, hits = self._metadata(pdf), self._hits(pdf, query)
+        analysis = analyze_chunks(api_key, meta["title"], hits, combined=bool(body.get("combined")))
+        return {**meta, "analysis": analysis, "excerpts": len(hits)}
+
+    def compare(self, body: dict) -> dict:
+        api_key, pdf1, pdf2 = self._key(), self._paper(body, "pdf1"), self._paper(body, "pdf2")
+        index = self.index
+        ctx1 = comparison_context(pdf1, corpus=index)
+        ctx2 = comparison_context(pdf2, corpus=index)
+        if not ctx1 or not ctx2:
+            raise BadRequest("Could not extract text from one or both PDFs.")
+        comparison = get_client(api_key).complete(
+            model=COMPARE_MODEL,
+            messages=[{"role": "user", "content": comparison_prompt(pdf1.name, ctx1, pdf2.name, ctx2)}],
+        )
+        return {"pdf1": str(pdf1), "pdf2": str(pdf2), "comparison": comparison}
+
+    def _key(self) -> str:
+        if not self.api_key:
+            raise Unavailable("MISTRAL_API_KEY is not set; only /search and /papers are available.")
+        return self.api_key
+
+    def _paper(self, body: dict, field: str = "pdf") -> Path:
+        pdf = Path(_required(body, field))
+        if not pdf.is_file():
+            raise BadRequest(f"No such PDF: {pdf}")
+        return pdf
+
+    def _metadata(self, pdf: Path) -> dict:
+        memo_key = (paper_key(pdf), get_extraction_cache().content_hash(pdf))
+        meta = self._meta.get(memo_key)
+        if meta is None:
+            md = extract_metadata(pdf)
+            meta = {"pdf": str(pdf), "title": md.get("title") or pdf.stem, "authors": md.get("authors") or "Unknown"}
+            self._meta[memo_key] = meta
+        return meta
+
+    def _hits(self, pdf: Path, query: str) -> List[Tuple[float, str]]:
+        """Retrieval hits for one paper: from the corpus index if it holds the paper, else a fresh parse."""
+        index = self.index
+        info = index.papers.get(paper_key(pdf))
+        if info is not None and info["hash"] == get_extraction_cache().content_hash(pdf):
+            return [(score, text) for score, (_lbl, text) in index.search(query, k=RETRIEVAL_K, paper=pdf)]
+        return prepare_paper(pdf, query, options=self.options).hits
+
+
+def _required(body: dict, field: str) -> str:
+    value = body.get(field)
+    if not value or not isinstance(value, str):
+        raise BadRequest(f"Missing string field {field!r}")
+    return value
+
+
+class QueryServer:
+    """ThreadingHTTPServer around a QueryService plus the hot-reload thread."""
+
+    def __init__(self, service: QueryService, host: str = "127.0.0.1", port: int = 8765, reload_interval: float = 5.0):
+        self.service = service
+        self.reload_interval = reload_interval
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._stop = threading.Event()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.reload_interval):
+            try:
+                stats = self.service.reload()
+                if stats["swapped"]:
+                    print(f"🔄 Reloaded: {stats['added']} added, {stats['updated']} updated, "
+                          f"{stats['removed']} removed in {stats['seconds']}s", flush=True)
+            except Exception as e:
+                print(f"[WARN] Reload failed: {e}", flush=True)
+
+    def serve_forever(self) -> None:
+        if self.reload_interval > 0:
+            threading.Thread(target=self._watch, name="reload", daemon=True).start()
+        try:
+            self.server.serve_forever()
+        finally:
+            self._stop.set()
+            self.server.server_close()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self.server.shutdown()
+
+    def _handler(self):
+        service = self.service
+        routes = {
+            ("GET", "/health"): lambda body: service.health(),
+            ("GET", "/papers"): lambda body: service.papers(),
+            ("POST", "/search"): service.search,
+            ("POST", "/summarize"): service.summarize,
+            ("POST", "/analyze"): service.analyze,
+            ("POST", "/compare"): service.compare,
+            ("POST", "/reload"): lambda body: service.reload(),
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive for clients issuing many queries
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload: dict) -> None:
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _dispatch(self, method: str) -> None:
+                t0 = time.perf_counter()
+                route = routes.get((method, self.path.split("?", 1)[0].rstrip("/") or "/"))
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                    if length > MAX_BODY:
+                        raise BadRequest("Request body too large")
+                    raw = self.rfile.read(length) if length else b""
+                    if route is None:
+                        self._send(404, {"error": f"Unknown endpoint {method} {self.path}"})
+                        return
+                    try:
+                        body = json.loads(raw) if raw else {}
+                    except ValueError as e:
+                        raise BadRequest(f"Invalid JSON: {e}")
+                    if not isinstance(body, dict):
+                        raise BadRequest("Request body must be a JSON object")
+                    result = route(body)
+                except BadRequest as e:
+                    self._send(400, {"error": str(e)})
+                    return
+                except Unavailable as e:
+                    self._send(503, {"error": str(e)})
+                    return
+                except Exception as e:
+                    print(f"[WARN] {method} {self.path} failed: {e}", flush=True)
+                    self._send(500, {"error": f"{type(e).__name__}: {e}"})
+                    return
+                self._send(200, {**result, "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2)})
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+        return Handler
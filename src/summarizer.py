@@ -1,31 +1,44 @@
 """
 Mistral wrapper for quick summaries.
 """
-from typing import List
-from mistralai import Mistral
+from typing import Callable, Optional, Sequence
 
-DEFAULT_MODEL = "mistral-tiny"
+from src import profiling
+from src.context_utils import SUMMARY_BUDGET_TOKENS, HitLike, pack_context
+from src.llm_client import DEFAULT_MODEL, get_client
 
-def summarize_chunks(api_key: str, title: str, chunks: List[str], model: str = DEFAULT_MODEL) -> str:
+SUMMARY_INSTRUCTION = (
+    "Summarize the user's provided excerpts into 5-7 bullet points using plain language. "
+    "Avoid speculation; focus on what is explicitly supported."
+)
+
+def summarize_chunks(
+    api_key: str,
+    title: str,
+    chunks: Sequence[HitLike],
+    model: str = DEFAULT_MODEL,
+    budget_tokens: int = SUMMARY_BUDGET_TOKENS,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> str:
     """
     Very small prompt to generate a concise summary from top chunks.
+    chunks may be plain texts (best first) or scored retrieval hits; they are
+    packed into budget_tokens of de-duplicated excerpts. on_delta streams
+    the reply as it is generated.
     """
-    client = Mistral(api_key=api_key)
+    client = get_client(api_key)
 
     # Keep the prompt lightweight for first test
-    system = (
-        "You are a concise research assistant. "
-        "Summarize the user's provided excerpts into 5-7 bullet points using plain language. "
-        "Avoid speculation; focus on what is explicitly supported."
-    )
-    user_content = f"TITLE: {title}\n\nEXCERPTS:\n" + "\n\n---\n\n".join(chunks[:5])
+    system = "You are a concise research assistant. " + SUMMARY_INSTRUCTION
+    user_content = f"TITLE: {title}\n\nEXCERPTS:\n" + "\n\n---\n\n".join(pack_context(chunks, budget_tokens))
 
-    resp = client.chat.complete(
-        model=model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user_content},
-        ],
-        temperature=0.2,
-    )
-    return resp.choices[0].message.content
+    with profiling.stage("llm.summary"):
+        return client.complete(
+            model=model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": user_content},
+            ],
+            temperature=0.2,
+            on_delta=on_delta,
+        )
@@ -2,27 +2,202 @@
 Text cleaning & chunking helpers for classical NLP (TF-IDF) & LLM prompts.
 """
 import re
-from typing import List
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from src import profiling
 
 def clean_text(s: str) -> str:
-    s = s.replace("\x00", " ")  # strip nulls if any
-    s = re.sub(r"[ \t]+", " ", s)
-    s = re.sub(r"\n{3,}", "\n\n", s)
-    return s.strip()
+    with profiling.stage("text.clean") as st:
+        st.add(chars_in=len(s))
+        s = s.replace("\x00", " ")  # strip nulls if any
+        s = re.sub(r"[ \t]+", " ", s)
+        s = re.sub(r"\n{3,}", "\n\n", s)
+        s = s.strip()
+        st.add(chars_out=len(s))
+    return s
 
 def chunk_text(s: str, max_chars: int = 1500, overlap: int = 150) -> List[str]:
     """
     Simple character-based chunker (good enough for TF-IDF + short prompts).
     """
-    s = s.strip()
-    chunks = []
-    start = 0
-    n = len(s)
-    while start < n:
-        end = min(start + max_chars, n)
-        chunk = s[start:end]
-        chunks.append(chunk)
-        if end == n:
-            break
-        start = max(0, end - overlap)
+    with profiling.stage("text.chunk") as st:
+        s = s.strip()
+        chunks = []
+        start = 0
+        n = len(s)
+        while start < n:
+            end = min(start + max_chars, n)
+            chunk = s[start:end]
+            chunks.append(chunk)
+            if end == n:
+                break
+            start = max(0, end - overlap)
+        st.add(chars_in=n, chunks=len(chunks))
     return chunks
+
+# ---------------------------------------------------------------
+# Token-aware, structure-aware chunking
+# ---------------------------------------------------------------
+
+CHARS_PER_TOKEN = 4  # rough average for English prose with Mistral/GPT tokenizers
+
+# Approximate context windows; used to size chunks so k of them fit a prompt.
+MODEL_CONTEXT_TOKENS = {
+    "mistral-tiny": 32_000,
+    "mistral-small": 32_000,
+    "mistral-small-latest": 32_000,
+    "mistral-medium": 32_000,
+    "mistral-large-latest": 128_000,
+}
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+_NUMBERED_HEADING = re.compile(r"^\d+(?:\.\d+)*\.?\s+[A-Z][^.!?]{0,80}$")
+_NAMED_HEADING = re.compile(
+    r"^(?:abstract|introduction|related work|background|preliminaries|methods?|methodology|"
+    r"approach|experiments?|evaluation|results|discussion|limitations|conclusions?|"
+    r"references|acknowledge?ments|appendix)\b[^.!?]{0,40}$",
+    re.I,
+)
+
+def estimate_tokens(text: str) -> int:
+    """Cheap ~4 chars/token estimate; good enough for budgeting."""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+def chunk_tokens_for_model(model: str, n_chunks: int = 8, reserve: int = 1500, cap: int = 512) -> int:
+    """
+    Chunk size (tokens) such that n_chunks excerpts plus `reserve` tokens of
+    instructions/answer fit the model's context. Capped, because smaller
+    chunks retrieve more precisely.
+    """
+    context = MODEL_CONTEXT_TOKENS.get(model, 8_000)
+    return max(64, min(cap, (context - reserve) // max(1, n_chunks)))
+
+@dataclass
+class Chunk:
+    """
+    One chunk plus where it came from. Offsets index into the clean_text()
+    of the page they refer to; pages are 1-based.
+    """
+    text: str
+    page: int
+    start: int
+    end_page: int
+    end: int
+    section: Optional[str] = None
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+def is_heading(line: str) -> bool:
+    line = line.strip()
+    if not line or len(line.split()) > 12:
+        return False
+    return bool(_NUMBERED_HEADING.match(line) or _NAMED_HEADING.match(line))
+
+def _page_units(page_text: str) -> Iterator[Tuple[str, str, int, int]]:
+    """
+    Yield ("heading" | "sentence", text, start, end) for one cleaned page.
+    Sentences may span the page's hard line wraps; headings are whole lines.
+    """
+    segment_start = 0
+    for m in re.finditer(r"[^\n]+", page_text):
+        if is_heading(m.group()):
+            yield from _sentences(page_text, segment_start, m.start())
+            yield ("heading", m.group().strip(), m.start(), m.end())
+            segment_start = m.end()
+    yield from _sentences(page_text, segment_start, len(page_text))
+
+def _sentences(text: str, lo: int, hi: int) -> Iterator[Tuple[str, str, int, int]]:
+    pos = lo
+    segment = text[lo:hi]
+    for m in _SENTENCE_BREAK.finditer(segment):
+        yield from _span(text, pos, lo + m.start())
+        pos = lo + m.end()
+    yield from _span(text, pos, hi)
+
+def _span(text: str, a: int, b: int) -> Iterator[Tuple[str, str, int, int]]:
+    raw = text[a:b]
+    stripped = raw.strip()
+    if stripped:
+        a += len(raw) - len(raw.lstrip())
+        yield ("sentence", " ".join(stripped.split()), a, a + len(stripped))
+
+def _split_span(text: str, a: int, b: int, width: int) -> Iterator[Tuple[str, int, int]]:
+    """Cut text[a:b] into windows of at most width source characters, keeping source offsets."""
+    for lo in range(a, b, width):
+        for _kind, piece, start, end in _span(text, lo, min(b, lo + width)):
+            yield piece, start, end
+
+def iter_chunks(
+    pages: Iterable[str],
+    max_tokens: int = 350,
+    overlap_tokens: int = 40,
+) -> Iterator[Chunk]:
+    """
+    Stream chunks from page texts without ever joining the document.
+
+    Chunks are built from whole sentences up to ~max_tokens, never cross a
+    section heading, and start with up to overlap_tokens of trailing
+    sentences from the previous chunk of the same section. A single
+    sentence longer than max_tokens is split on character boundaries.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    section: Optional[str] = None
+    units: List[Tuple[str, int, int, int]] = []  # (text, page, start, end)
+    used = 0
+
+    def flush(keep_overlap: bool) -> Iterator[Chunk]:
+        nonlocal units, used
+        if not units:
+            return
+        yield Chunk(
+            text=" ".join(u[0] for u in units),
+            page=units[0][1],
+            start=units[0][2],
+            end_page=units[-1][1],
+            end=units[-1][3],
+            section=section,
+        )
+        tail: List[Tuple[str, int, int, int]] = []
+        if keep_overlap and overlap_tokens > 0:
+            budget = overlap_tokens
+            for u in reversed(units[1:]):  # never carry the whole chunk over
+                t = estimate_tokens(u[0])
+                if t > budget:
+                    break
+                tail.insert(0, u)
+                budget -= t
+        units = tail
+        used = sum(estimate_tokens(u[0]) for u in units)
+
+    for page_no, page in enumerate(pages, start=1):
+        page_text = clean_text(page or "")
+        for kind, text, start, end in _page_units(page_text):
+            if kind == "heading":
+                yield from flush(keep_overlap=False)
+                units, used = [], 0
+                section = text
+                continue
+            pieces = [(text, start, end)]
+            if len(text) > max_chars:
+                pieces = list(_split_span(page_text, start, end, max_chars))
+            for piece, p_start, p_end in pieces:
+                t = estimate_tokens(piece)
+                if units and used + t > max_tokens:
+                    yield from flush(keep_overlap=True)
+                units.append((piece, page_no, p_start, p_end))
+                used += t
+    yield from flush(keep_overlap=False)
+
+def word_shingles(text: str, n: int = 5, hash_fn: Callable[[str], int] = hash) -> set:
+    """
+    Set of hashed n-word shingles, for cheap near-duplicate checks. The
+    built-in hash is salted per process; pass a stable hash_fn for
+    shingles that are stored or compared across processes (src/dedup.py).
+    """
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < n:
+        return {hash_fn(" ".join(words))} if words else set()
+    return {hash_fn(" ".join(words[i:i + n])) for i in range(len(words) - n + 1)}
@@ -0,0 +1,319 @@
+"""
+workflows.py — prompt templates and adaptive self-consistency
+-------------------------------------------------------------
+The prompts/ library as code:
+
+  load_template(name)  a prompts/<name>.txt file split once into literal
+                       text and {query}/{context}/{answer} placeholders,
+                       so rendering is a join instead of a re-parse
+  self_consistency     samples one reasoning template several times and
+                       takes the answer most samples agree on
+
+Sampling is adaptive, in at most two concurrent waves. Only `agree`
+samples start at first (the fewest that can reach consensus, so agreeing
+questions never pay for the rest); as soon as the answers in hand and in
+flight can no longer agree on their own, every remaining sample starts
+at once. Sampling stops as soon as `agree` samples share an answer,
+cancelling any still in flight, or when consensus has become impossible.
+Only then, on disagreement, does the verify_answer template check the
+leading answer.
+
+Votes compare final answers, not whole replies: each FINAL ANSWER line is
+normalized (case, punctuation, articles and filler words, number
+formatting) and identical normalized answers agree. Longer answers may
+also agree on word overlap, but never when their numbers or negations
+differ, so "42" and "43" or "is" and "is not" stay apart. Each result reports the
+estimated tokens and latency saved against always running every sample;
+a verification pass that ran costs the same either way, so it is in the
+baseline only when it ran, and one that was skipped is not counted as
+saved.
+
+Samples differ by random_seed, so each one has its own entry in the LLM
+response cache and a re-run of the same question costs nothing.
+"""
+import asyncio
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from string import Formatter
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from src import profiling
+from src.llm_client import DEFAULT_MODEL, get_client, run_async, track_usage
+from src.options import REASONING_TEMPLATES  # noqa: F401 (re-exported)
+
+PROMPTS_DIR = Path(__file__).resolve().parent.parent / "prompts"
+VERIFY_TEMPLATE = "verify_answer"
+
+DEFAULT_SAMPLES = 5
+DEFAULT_AGREE = 3
+DEFAULT_CONCURRENCY = 8  # LLM requests in flight across all questions
+SAMPLE_TEMPERATURE = 0.7
+AGREE_JACCARD = 0.6  # word-set similarity at which two longer final answers count as the same
+FUZZY_MIN_WORDS = 6  # shorter answers must match exactly once normalized
+
+FINAL_ANSWER_INSTRUCTION = "\n\nEnd your reply with one line of the form:\nFINAL ANSWER: <the answer in one sentence>"
+_FINAL_ANSWER = re.compile(r"FINAL ANSWER:\s*(.+)", re.I)
+_ANSWER_TOKEN = re.compile(r"\d+(?:\.\d+)?|[^\W\d_]+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_FILLER = frozenset(
+    "a an the is are was were be been it its this that these those of to in on for by with as and so thus "
+    "therefore answer final".split()
+)
+_NEGATIONS = frozenset("no not never none nothing neither nor cannot without".split())
+
+
+class PromptTemplate:
+    """A prompt file parsed once; render() fills the placeholders by name."""
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self._parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field_name) for literal, field_name, _spec, _conv in Formatter().parse(text)
+        ]
+        self.fields: FrozenSet[str] = frozenset(f for _lit, f in self._parts if f)
+
+    def render(self, **values) -> str:
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Template {self.name!r} needs {', '.join(sorted(missing))}")
+        return "".join(lit + (str(values[f]) if f else "") for lit, f in self._parts)
+
+
+@lru_cache(maxsize=None)
+def load_template(name: str) -> PromptTemplate:
+    path = PROMPTS_DIR / f"{name}.txt"
+    if not path.exists():
+        raise ValueError(f"No prompt template {name!r} in {PROMPTS_DIR}")
+    return PromptTemplate(name, path.read_text(encoding="utf-8"))
+
+
+def final_answer(reply: str) -> str:
+    """The FINAL ANSWER line of a sample, else its last non-empty line."""
+    found = _FINAL_ANSWER.findall(reply)
+    if found:
+        return found[-1].strip()
+    lines = [ln.strip() for ln in reply.strip().splitlines() if ln.strip()]
+    return lines[-1] if lines else ""
+
+
+def normalize_answer(answer: str) -> Tuple[str, ...]:
+    """Tokens of a final answer that decide its vote: lower case, no filler words, numbers as floats."""
+    tokens = _ANSWER_TOKEN.findall(answer.lower().replace("n't", " not"))
+    return tuple(str(float(t)) if _NUMBER.fullmatch(t) else t for t in tokens if t not in _FILLER)
+
+
+def answers_agree(a: Tuple[str, ...], b: Tuple[str, ...]) -> bool:
+    """Same normalized answer, or two longer ones with the same numbers and negations and high word overlap."""
+    if a == b:
+        return True
+    if min(len(a), len(b)) < FUZZY_MIN_WORDS:
+        return False
+    wa, wb = frozenset(a), frozenset(b)
+    numbers_a = {t for t in wa if _NUMBER.fullmatch(t)}
+    numbers_b = {t for t in wb if _NUMBER.fullmatch(t)}
+    if numbers_a != numbers_b or wa & _NEGATIONS != wb & _NEGATIONS:
+        return False
+    return len(wa & wb) / len(wa | wb) >= AGREE_JACCARD
+
+
+@dataclass
+class _Cluster:
+    answer: Tuple[str, ...]  # normalize_answer of the first reply
+    replies: List[str] = field(default_factory=list)
+
+
+def _vote(clusters: List[_Cluster], reply: str, extract: Callable[[str], str]) -> None:
+    answer = normalize_answer(extract(reply))
+    for cluster in clusters:
+        if answers_agree(answer, cluster.answer):
+            cluster.replies.append(reply)
+            return
+    clusters.append(_Cluster(answer, [reply]))
+
+
+@dataclass
+class ConsistencyStats:
+    max_samples: int
+    samples_run: int = 0        # completed samples
+    samples_cancelled: int = 0  # in flight when consensus was reached (partly paid for, not counted as saved)
+    votes: List[int] = field(default_factory=list)  # answer cluster sizes, largest first
+    agreed: bool = False
+    verified: bool = False      # the verification pass ran
+    llm_calls: int = 0
+    llm_cache_hits: int = 0
+    tokens_used: int = 0        # estimated, requests actually sent
+    tokens_saved: int = 0       # estimated, vs every sample (+ verification, if it ran)
+    latency_s: float = 0.0
+    latency_saved_s: float = 0.0  # estimated, vs every sample in one concurrent wave (+ verification, if it ran)
+
+    @property
+    def samples_skipped(self) -> int:
+        return self.max_samples - self.samples_run - self.samples_cancelled
+
+
+@dataclass
+class ConsistencyResult:
+    query: str
+    answer: str             # the winning sample, or the verifier's reply on disagreement
+    final: str              # its FINAL ANSWER line
+    samples: List[str]
+    verification: Optional[str]
+    stats: ConsistencyStats
+
+
+def _tokens(usage: Dict[str, int]) -> int:
+    return usage["tokens_in"] + usage["tokens_out"]
+
+
+async def aself_consistency(
+    api_key: str,
+    query: str,
+    context: str,
+    template: str = "self_consistency",
+    samples: int = DEFAULT_SAMPLES,
+    agree: int = DEFAULT_AGREE,
+    verify: bool = True,
+    model: str = DEFAULT_MODEL,
+    sem: Optional[asyncio.Semaphore] = None,
+    extract: Callable[[str], str] = final_answer,
+) -> ConsistencyResult:
+    """Adaptive self-consistency for one question (see the module docstring)."""
+    client = get_client(api_key)
+    samples = max(1, samples)
+    agree = max(1, min(agree, samples))
+    sem = sem or asyncio.Semaphore(DEFAULT_CONCURRENCY)
+    prompt = load_template(template).render(query=query, context=context) + FINAL_ANSWER_INSTRUCTION
+    stats = ConsistencyStats(max_samples=samples)
+    sample_cost: List[Tuple[int, float]] = []  # (estimated tokens, seconds) per completed sample
+
+    async def sample(seed: int) -> str:
+        async with sem:
+            t0 = time.perf_counter()
+            with track_usage() as usage, profiling.stage("llm.consistency"):
+                reply = await client.acomplete(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=SAMPLE_TEMPERATURE,
+                    random_seed=seed,
+                )
+            sample_cost.append((_tokens(usage), time.perf_counter() - t0))
+            stats.llm_calls += usage["llm_calls"]
+            stats.llm_cache_hits += usage["llm_cache_hits"]
+            stats.tokens_used += _tokens(usage)
+            return reply
+
+    start = time.perf_counter()
+    clusters: List[_Cluster] = []
+    pending = set()
+    started = 0
+    while started < agree:
+        pending.add(asyncio.create_task(sample(started)))
+        started += 1
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    _vote(clusters, task.result(), extract)
+                    stats.samples_run += 1
+                except Exception as e:
+                    print(f"[WARN] self-consistency sample failed: {e}", file=sys.stderr)
+            best = max((len(c.replies) for c in clusters), default=0)
+            if best >= agree or best + len(pending) + samples - started < agree:
+                break  # consensus reached, or out of reach
+            if best + len(pending) < agree:  # the samples in flight can no longer agree alone: start the rest at once
+                while started < samples:
+                    pending.add(asyncio.create_task(sample(started)))
+                    started += 1
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    stats.samples_cancelled = len(pending)
+    if not clusters:
+        raise RuntimeError(f"Every self-consistency sample failed for {query!r}")
+
+    clusters.sort(key=lambda c: len(c.replies), reverse=True)
+    stats.votes = [len(c.replies) for c in clusters]
+    stats.agreed = stats.votes[0] >= agree
+    answer = clusters[0].replies[0]
+    verification = None
+    verify_cost = None
+    if verify and not stats.agreed:
+        t0 = time.perf_counter()
+        verify_prompt = load_template(VERIFY_TEMPLATE).render(query=query, answer=answer, context=context)
+        async with sem:
+            with track_usage() as usage, profiling.stage("llm.verify"):
+                verification = await client.acomplete(
+                    model=model,
+                    messages=[{"role": "user", "content": verify_prompt + FINAL_ANSWER_INSTRUCTION}],
+                    temperature=0.0,
+                )
+        verify_cost = (_tokens(usage), time.perf_counter() - t0)
+        stats.verified = True
+        stats.llm_calls += usage["llm_calls"]
+        stats.llm_cache_hits += usage["llm_cache_hits"]
+        stats.tokens_used += _tokens(usage)
+        answer = verification
+    stats.latency_s = round(time.perf_counter() - start, 3)
+
+    # Baseline: every sample in one concurrent wave, then the verification pass if it ran.
+    mean_tokens = sum(t for t, _s in sample_cost) / max(1, len(sample_cost))
+    mean_seconds = sum(s for _t, s in sample_cost) / max(1, len(sample_cost))
+    verify_tokens, verify_seconds = verify_cost if stats.verified else (0, 0.0)
+    baseline_tokens = samples * mean_tokens + verify_tokens
+    baseline_seconds = mean_seconds + verify_seconds
+    cancelled_tokens = stats.samples_cancelled * mean_tokens  # assume they were paid for
+    stats.tokens_saved = max(0, round(baseline_tokens - stats.tokens_used - cancelled_tokens))
+    stats.latency_saved_s = max(0.0, round(baseline_seconds - stats.latency_s, 3))
+    return ConsistencyResult(
+        query=query, answer=answer, final=extract(answer),
+        samples=[r for c in clusters for r in c.replies], verification=verification, stats=stats,
+    )
+
+
+def self_consistency(api_key: str, query: str, context: str, **kwargs) -> ConsistencyResult:
+    """Blocking wrapper around aself_consistency."""
+    return run_async(aself_consistency(api_key, query, context, **kwargs))
+
+
+async def arun_questions(
+    api_key: str,
+    items: Iterable[Tuple[str, str]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    **kwargs,
+) -> List[ConsistencyResult]:
+    """Many (query, context) pairs at once; one semaphore bounds the LLM requests of all of them."""
+    sem = asyncio.Semaphore(max(1, concurrency))
+    return list(await asyncio.gather(*(
+        aself_consistency(api_key, query, context, sem=sem, **kwargs) for query, context in items
+    )))
+
+
+def run_questions(api_key: str, items: Iterable[Tuple[str, str]], **kwargs) -> List[ConsistencyResult]:
+    return run_async(arun_questions(api_key, items, **kwargs))
+
+
+def savings_report(results: Sequence[ConsistencyResult]) -> Dict[str, object]:
+    """Totals over a batch of questions, for the summary line and JSON output."""
+    stats = [r.stats for r in results]
+    max_samples = sum(s.max_samples for s in stats)
+    return {
+        "questions": len(results),
+        "agreed": sum(s.agreed for s in stats),
+        "verified": sum(s.verified for s in stats),
+        "samples_run": sum(s.samples_run for s in stats),
+        "samples_cancelled": sum(s.samples_cancelled for s in stats),
+        "samples_max": max_samples,
+        "llm_calls": sum(s.llm_calls for s in stats),
+        "tokens_used": sum(s.tokens_used for s in stats),
+        "tokens_saved": sum(s.tokens_saved for s in stats),
+        "latency_s": round(sum(s.latency_s for s in stats), 3),
+        "latency_saved_s": round(sum(s.latency_saved_s for s in stats), 3),
+        "samples_saved_pct": round(100 * (1 - sum(s.samples_run + s.samples_cancelled for s in stats) / max_samples), 1)
+        if max_samples else 0.0,
+    }
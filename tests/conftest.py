@@ -0,0 +1,46 @@
+"""
+Shared fixtures. Caches, stores and the index go to a throwaway directory
+(set before any src module reads src.config), and LLM calls go to the
+in-process stub server from benchmarks/stub_llm.py.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+_STATE = Path(tempfile.mkdtemp(prefix="rgpt-tests-"))
+os.environ.update({
+    "RGPT_CACHE_DIR": str(_STATE / "cache"),
+    "RGPT_MANIFEST_PATH": str(_STATE / "run_manifest.sqlite"),
+    "RGPT_RESULTS_DB_PATH": str(_STATE / "results.sqlite"),
+    "RGPT_INDEX_DIR": str(_STATE / "corpus_index"),
+    "MISTRAL_API_KEY": "test-key",
+})
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+API_KEY = "test-key"
+
+
+@pytest.fixture(scope="session")
+def stub_llm():
+    """A running stub chat server; get_client(API_KEY) talks to it."""
+    from stub_llm import StubLLM
+
+    from src import llm_client
+
+    stub = StubLLM(latency_ms=0).start()
+    llm_client._clients[API_KEY] = llm_client.LLMClient(API_KEY, server_url=stub.url)
+    yield stub
+    llm_client._clients.pop(API_KEY, None)
+    stub.stop()
+
+
+@pytest.fixture(scope="session")
+def synthetic_pdfs(tmp_path_factory):
+    """Three small generated papers."""
+    from synthetic_pdf import generate_corpus
+
+    return generate_corpus(tmp_path_factory.mktemp("papers"), papers=3, pages=2, seed=7)
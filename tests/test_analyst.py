@@ -0,0 +1,66 @@
+import pytest
+
+from src import llm_client
+from src.analyst import SECTIONS, SUMMARY_SECTION, analyze_chunks, parse_sections, summarize_and_analyze
+
+NAMES = [SUMMARY_SECTION, *SECTIONS]
+HITS = [(1.0, ("p1", "We train a transformer on WMT14 and reach 28.4 BLEU."))]
+
+
+def _reply(names, skip=None):
+    return "\n".join(f"=== SECTION: {name} ===\n{name} text" for name in names if name != skip)
+
+
+class _CannedClient:
+    """Replies with the combined layout when asked for sections, else a plain answer."""
+
+    def __init__(self, combined_reply):
+        self.combined_reply = combined_reply
+        self.calls = 0
+
+    def complete(self, model, messages, temperature=None, on_delta=None, **kwargs):
+        self.calls += 1
+        if "=== SECTION:" in messages[-1]["content"]:
+            return self.combined_reply
+        return "separate reply"
+
+
+@pytest.fixture
+def canned(monkeypatch):
+    def install(reply):
+        client = _CannedClient(reply)
+        monkeypatch.setitem(llm_client._clients, "canned-key", client)
+        return client
+    return install
+
+
+def test_sections_are_parsed_in_the_requested_order():
+    reply = "preamble\n" + _reply(reversed(NAMES)).replace("SECTION: Methods", "section:  methods ")
+    sections = parse_sections(reply, NAMES)
+    assert list(sections) == NAMES
+    assert sections["Methods"] == "Methods text"
+
+
+def test_a_missing_or_empty_section_fails_the_parse():
+    assert parse_sections(_reply(NAMES, skip="Limitations"), NAMES) is None
+    assert parse_sections(_reply(NAMES).replace("Key Results text", ""), NAMES) is None
+    assert parse_sections("", NAMES) is None
+
+
+def test_summary_and_analysis_come_from_one_request(canned):
+    client = canned(_reply(NAMES))
+    summary, analysis = summarize_and_analyze("canned-key", "Paper", HITS)
+    assert client.calls == 1
+    assert summary == "Summary text"
+    assert "## Key Results\n\nKey Results text" in analysis and "Summary text" not in analysis
+
+
+def test_an_unparseable_reply_falls_back_to_separate_requests(canned):
+    client = canned(_reply(NAMES, skip="Methods"))
+    summary, analysis = summarize_and_analyze("canned-key", "Paper", HITS)
+    assert client.calls == 1 + 1 + len(SECTIONS)  # combined, then summary and each section
+    assert summary == "separate reply"
+    assert analysis.count("separate reply") == len(SECTIONS)
+    client = canned(_reply(list(SECTIONS)))
+    assert "## Limitations\n\nLimitations text" in analyze_chunks("canned-key", "Paper", HITS, combined=True)
+    assert client.calls == 1
@@ -0,0 +1,37 @@
+import httpx
+from bench_pipeline import compare
+from stub_llm import StubLLM
+from synthetic_pdf import generate_corpus
+
+from src.pdf_utils import extract_pdf
+
+
+def test_synthetic_corpus_is_reproducible(tmp_path):
+    first = generate_corpus(tmp_path / "a", papers=2, pages=3, seed=1)
+    again = generate_corpus(tmp_path / "b", papers=2, pages=3, seed=1)
+    other = generate_corpus(tmp_path / "c", papers=2, pages=3, seed=2)
+    assert [p.read_bytes() for p in first] == [p.read_bytes() for p in again]
+    assert first[0].read_bytes() != other[0].read_bytes()
+    pages = extract_pdf(first[0], use_cache=False)["pages"]
+    assert len(pages) == 3 and all(len(p.split()) > 50 for p in pages)
+
+
+def test_stub_answers_the_section_layout_and_rate_limits():
+    prompt = "Reply with:\n=== SECTION: Summary ===\n<content>\n=== SECTION: Methods ===\n<content>"
+    body = {"model": "stub", "messages": [{"role": "user", "content": prompt}]}
+    with StubLLM(latency_ms=0, rpm=1) as stub:
+        ok = httpx.post(f"{stub.url}/v1/chat/completions", json=body)
+        limited = httpx.post(f"{stub.url}/v1/chat/completions", json=body)
+    reply = ok.json()["choices"][0]["message"]["content"]
+    assert reply.startswith("=== SECTION: Summary ===") and "=== SECTION: Methods ===" in reply
+    assert limited.status_code == 429 and float(limited.headers["Retry-After"]) > 0
+    assert stub.stats["requests"] == 1 and stub.stats["rate_limited"] == 1
+
+
+def test_baseline_comparison_flags_only_regressions_past_the_limit(capsys):
+    def result(seconds):
+        return {"meta": {"commit": "abc", "args": {"papers": 2}}, "stages": {"parse": {"seconds": seconds}}}
+
+    assert compare(result(1.0), result(1.1), max_regression=0.2) == 0
+    assert compare(result(1.0), result(1.5), max_regression=0.2) == 1
+    assert compare(result(1.0), result(0.5), max_regression=0.2) == 0
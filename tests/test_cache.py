@@ -0,0 +1,28 @@
+import os
+
+from src.cache_utils import ExtractionCache, file_sha256
+
+
+def test_keys_follow_content_and_version(tmp_path):
+    cache = ExtractionCache(tmp_path / "cache")
+    a, b = tmp_path / "a.pdf", tmp_path / "b.pdf"
+    a.write_bytes(b"%PDF same bytes")
+    b.write_bytes(b"%PDF same bytes")
+    assert cache.content_hash(a) == cache.content_hash(b) == file_sha256(a)
+    assert cache.key_for(a, "v1") == cache.key_for(b, "v1") != cache.key_for(a, "v2")
+
+    before = cache.content_hash(a)
+    a.write_bytes(b"%PDF other bytes")
+    os.utime(a, ns=(1, 1))  # a new mtime invalidates the in-process hash memo
+    assert cache.content_hash(a) != before
+
+
+def test_records_round_trip_and_corrupt_entries_miss(tmp_path):
+    cache = ExtractionCache(tmp_path / "cache")
+    key = "ab" + "0" * 62
+    assert cache.get(key) is None
+    cache.put(key, {"text": "hello", "pages": 2})
+    assert cache.get(key) == {"text": "hello", "pages": 2}
+    assert (tmp_path / "cache" / "ab" / f"{key}.json").exists()
+    (tmp_path / "cache" / "ab" / f"{key}.json").write_text("{not json")
+    assert cache.get(key) is None
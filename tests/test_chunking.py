@@ -0,0 +1,69 @@
+from src.text_utils import clean_text, chunk_text, iter_chunks
+
+
+def test_chunk_text_windows_overlap_and_cover_the_text():
+    text = "".join(chr(ord("a") + i % 26) for i in range(1000))
+    chunks = chunk_text(text, max_chars=300, overlap=50)
+    assert [len(c) for c in chunks] == [300, 300, 300, 250]
+    for prev, cur in zip(chunks, chunks[1:]):
+        assert prev[-50:] == cur[:50]
+    assert "".join([chunks[0]] + [c[50:] for c in chunks[1:]]) == text
+    assert chunk_text("  short  ") == ["short"]
+    assert chunk_text("") == []
+
+
+def _sentence(i):
+    return f"Sentence number {i} says something about the method and its results."
+
+
+def test_iter_chunks_offsets_point_into_the_cleaned_page():
+    pages = [" ".join(_sentence(i) for i in range(p * 20, p * 20 + 20)) for p in range(2)]
+    chunks = list(iter_chunks(pages, max_tokens=60, overlap_tokens=20))
+    assert len(chunks) > 2
+    cleaned = [clean_text(p) for p in pages]
+    for c in chunks:
+        assert c.tokens <= 60
+        if c.page == c.end_page:
+            assert " ".join(cleaned[c.page - 1][c.start:c.end].split()) == c.text
+        else:
+            assert cleaned[c.page - 1][c.start:].startswith(c.text.split(". ")[0])
+    assert any(c.page != c.end_page for c in chunks)  # sentences pack across the page break
+
+
+def test_iter_chunks_overlap_repeats_trailing_sentences():
+    page = " ".join(_sentence(i) for i in range(30))
+    chunks = list(iter_chunks([page], max_tokens=60, overlap_tokens=20))
+    for prev, cur in zip(chunks, chunks[1:]):
+        first = cur.text.split(". ")[0] + "."
+        assert first in prev.text  # one ~17-token sentence carried over
+        assert cur.start < prev.end
+
+
+def test_iter_chunks_flush_at_headings_without_overlap():
+    page = "\n".join([
+        "1 Introduction", _sentence(1), _sentence(2),
+        "2 Methods", _sentence(3),
+    ])
+    chunks = list(iter_chunks([page], max_tokens=500, overlap_tokens=40))
+    assert [(c.section, c.text) for c in chunks] == [
+        ("1 Introduction", f"{_sentence(1)} {_sentence(2)}"),
+        ("2 Methods", _sentence(3)),
+    ]
+
+
+def test_iter_chunks_split_an_overlong_sentence():
+    page = "word " * 400  # one 1999-char sentence once stripped
+    chunks = list(iter_chunks([page], max_tokens=100, overlap_tokens=0))
+    assert [len(c.text) for c in chunks] == [399] * 5  # 400-char windows, trailing space trimmed
+    assert [c.start for c in chunks] == [0, 400, 800, 1200, 1600]
+    page_text = clean_text(page)
+    assert all(page_text[c.start:c.end] == c.text for c in chunks)
+
+
+def test_iter_chunks_split_pieces_keep_source_offsets():
+    page = "word \n" * 400  # hard-wrapped: the joined sentence is shorter than its source
+    chunks = list(iter_chunks([page], max_tokens=100, overlap_tokens=0))
+    page_text = clean_text(page)
+    assert len(chunks) == 6  # split on 400-char windows of the 2398-char source
+    assert all(" ".join(page_text[c.start:c.end].split()) == c.text for c in chunks)
+    assert chunks[-1].end == len(page_text)
@@ -0,0 +1,52 @@
+import subprocess
+import sys
+
+import pytest
+
+import main
+from tests.conftest import ROOT
+
+HEAVY = ("numpy", "scipy", "sklearn", "mistralai", "httpx", "PyPDF2")
+
+
+def _fresh(code, cwd):
+    """Run code in a new interpreter from cwd; return its stdout."""
+    prelude = f"import sys; sys.path.insert(0, {str(ROOT)!r}); "
+    out = subprocess.run([sys.executable, "-c", prelude + code], cwd=cwd, capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    return out.stdout
+
+
+def test_importing_and_parsing_stays_light(tmp_path):
+    code = (
+        "import main; main.parse_args(['search', 'attention'])\n"
+        f"print(sorted(m for m in {HEAVY!r} if m in sys.modules))"
+    )
+    assert _fresh(code, tmp_path).strip() == "[]"
+    assert list(tmp_path.iterdir()) == []  # no results/ or cache dirs until a command runs
+
+
+def test_help_writes_nothing(tmp_path):
+    out = subprocess.run([sys.executable, str(ROOT / "main.py"), "--help"], cwd=tmp_path, capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0 and "similarity-matrix" in out.stdout
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("argv, command", [
+    ([], "batch"),
+    (["--data-dir", "papers"], "batch"),
+    (["--pdf", "a.pdf"], "pdf"),
+    (["--compare", "a.pdf", "b.pdf"], "compare"),
+    (["--search", "attention", "--index"], "search"),
+    (["--index"], "index"),
+    (["--serve", "--port", "9000"], "serve"),
+])
+def test_legacy_flags_map_to_commands(argv, command):
+    assert main.parse_args(argv).command == command
+
+
+def test_legacy_flags_that_do_not_apply_are_ignored_with_a_warning(capsys):
+    args = main.parse_args(["--pdf", "a.pdf", "--workers", "4"])
+    assert (args.command, args.pdf) == ("pdf", "a.pdf")
+    assert "Ignoring options not used by 'pdf': --workers 4" in capsys.readouterr().err
+    assert main.parse_args(["--search", "q", "--index"]).index  # --search with --index: update first
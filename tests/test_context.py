@@ -0,0 +1,42 @@
+from src.context_utils import MIN_TAIL_TOKENS, pack_context
+from src.text_utils import estimate_tokens
+
+
+def _para(topic, n=10):
+    return " ".join(f"The {topic} study reports finding {i} about {topic} number {i}." for i in range(n))
+
+
+def test_hits_are_taken_best_score_first_within_the_budget():
+    hits = [(0.1, _para("gamma")), (0.9, _para("alpha")), (0.5, _para("beta"))]
+    packed = pack_context(hits, budget_tokens=10_000)
+    assert [p.split()[1] for p in packed] == ["alpha", "beta", "gamma"]
+    budget = estimate_tokens(_para("alpha")) + MIN_TAIL_TOKENS + 20
+    packed = pack_context(hits, budget_tokens=budget)
+    assert sum(estimate_tokens(p) for p in packed) <= budget
+    assert packed[1].endswith(".") and len(packed[1]) < len(_para("beta"))  # cut at a sentence end
+
+
+def test_no_truncated_tail_below_the_minimum():
+    hits = [(1.0, _para("alpha")), (0.5, _para("beta"))]
+    budget = estimate_tokens(_para("alpha")) + MIN_TAIL_TOKENS - 1
+    assert pack_context(hits, budget_tokens=budget) == [_para("alpha")]
+
+
+def test_overlap_with_a_selected_excerpt_is_sent_once():
+    text = _para("alpha", 20)
+    first, second = text[:700], text[550:]  # neighbouring chunks sharing 150 chars
+    packed = pack_context([first, second], budget_tokens=10_000)
+    assert packed[0] == first.strip()
+    assert packed[1] == text[700:].strip()
+
+
+def test_near_duplicates_are_dropped():
+    original = _para("alpha")
+    packed = pack_context([original, original.replace("finding 9", "result 9"), _para("beta")], budget_tokens=10_000)
+    assert packed == [original, _para("beta")]
+
+
+def test_indexer_hits_and_plain_strings_are_accepted():
+    hits = [(0.2, ("paper.pdf#0", _para("beta"))), (0.8, ("paper.pdf#1", _para("alpha")))]
+    assert [p.split()[1] for p in pack_context(hits, budget_tokens=10_000)] == ["alpha", "beta"]
+    assert pack_context([], budget_tokens=100) == []
@@ -0,0 +1,53 @@
+import shutil
+
+import pytest
+
+from src.corpus_index import CorpusIndex
+
+
+def _ranked(index, queries):
+    """Every live row's score per query; ties in any order."""
+    return [sorted((round(score, 6), doc) for score, doc in hits) for hits in index.search_batch(queries, k=len(index))]
+
+
+def _generations(root):
+    return sorted(d.name for d in root.iterdir() if d.name.startswith("g"))
+
+
+@pytest.fixture
+def corpus(synthetic_pdfs, tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    for pdf in synthetic_pdfs:
+        shutil.copy(pdf, data / pdf.name)
+    return sorted(data.glob("*.pdf"))
+
+
+def test_incremental_updates_match_a_full_build(corpus, tmp_path):
+    a, b, c = corpus
+    index = CorpusIndex.load(tmp_path / "incremental")
+    assert index.update([a, b]) == {"added": 2, "updated": 0, "unchanged": 0, "removed": 0}
+    shutil.copy(c, a)  # a changes content
+    assert index.update([a, b, c]) == {"added": 1, "updated": 1, "unchanged": 1, "removed": 0}
+    assert index.n_rows > len(index)  # the old rows of a are dead, not rewritten
+    assert _generations(tmp_path / "incremental") == ["g1"]
+
+    full = CorpusIndex.load(tmp_path / "full")
+    full.update([a, b, c])
+    assert len(index) == len(full)
+    words = full.chunk_text(0).split()
+    queries = [" ".join(words[i:i + 4]) for i in range(0, 40, 8)]
+    assert _ranked(CorpusIndex.load(tmp_path / "incremental"), queries) == _ranked(full, queries)
+    assert any(hits[-1][0] > 0 for hits in _ranked(full, queries))
+
+
+def test_dead_rows_are_compacted_past_the_threshold(corpus, tmp_path):
+    root = tmp_path / "index"
+    index = CorpusIndex.load(root)
+    index.update(corpus)
+    assert index.update(corpus[:1], prune=True)["removed"] == 2
+    assert len(index) == index.n_rows  # two thirds dead: rewritten into a new generation
+    assert _generations(root)[-1] == "g2"
+    hits = index.search(" ".join(index.chunk_text(0).split()[:4]), k=50)
+    assert hits and {doc[0].split(" ")[0] for _s, doc in hits} == {corpus[0].stem}
+    assert CorpusIndex.load(root).update(corpus[:1]) == {"added": 0, "updated": 0, "unchanged": 1, "removed": 0}
@@ -0,0 +1,73 @@
+import random
+from pathlib import Path
+
+import pytest
+
+from src.dedup import SHINGLE_WORDS, MinHashIndex, _crc32, similarity, text_signature
+from src.pipeline import PaperResult, PreparedPaper, _Deduplicator
+from src.text_utils import word_shingles
+
+_rng = random.Random(3)
+VOCAB = [f"w{i}" for i in range(2000)]
+
+
+def _text(n=600):
+    return " ".join(_rng.choice(VOCAB) for _ in range(n))
+
+
+def _edit(text, every):
+    words = text.split()
+    return " ".join("changed" if i % every == 0 else w for i, w in enumerate(words))
+
+
+def _jaccard(a, b):
+    sa, sb = (word_shingles(t, SHINGLE_WORDS, hash_fn=_crc32) for t in (a, b))
+    return len(sa & sb) / len(sa | sb)
+
+
+BASE = _text()
+NEAR = _edit(BASE, 60)  # ~0.85 Jaccard
+FAR = _edit(BASE, 8)  # ~0.25
+OTHER = _text()
+
+
+def test_signatures_estimate_shingle_jaccard():
+    base = text_signature(BASE)
+    assert similarity(base, text_signature(BASE)) == 1.0
+    for text in (NEAR, FAR, OTHER):
+        assert similarity(base, text_signature(text)) == pytest.approx(_jaccard(BASE, text), abs=0.12)
+    assert text_signature("   ") is None
+
+
+def test_near_duplicates_respect_the_threshold():
+    index = MinHashIndex.build([(Path("near"), text_signature(NEAR)), (Path("far"), text_signature(FAR)),
+                                (Path("other"), text_signature(OTHER))])
+    found = index.near_duplicates(text_signature(BASE), threshold=0.7)
+    assert [key for _sim, key in found] == [Path("near")]
+    assert index.near_duplicates(text_signature(BASE), threshold=0.99) == []
+    assert [key for _sim, key in index.similar(text_signature(BASE), k=2)] == [Path("near"), Path("far")]
+
+
+def _paper(name, text):
+    return PreparedPaper(Path(name), name, "", None, [], 0.0, signature=text_signature(text))
+
+
+def test_deduplicator_reuses_the_first_paper_and_promotes_on_failure():
+    dedup = _Deduplicator(threshold=0.7)
+    first, second, third = _paper("v1.pdf", BASE), _paper("v2.pdf", NEAR), _paper("v3.pdf", BASE)
+    assert dedup.assign(first) is None  # canonical
+    assert dedup.assign(_paper("other.pdf", OTHER)) is None
+    canonical, sim = dedup.assign(second)
+    assert canonical == Path("v1.pdf") and sim >= 0.7
+    assert dedup.wait(second, canonical, sim) and dedup.wait(third, *dedup.assign(third))
+    assert len(dedup) == 2
+
+    promoted = dedup.canonical_failed(Path("v1.pdf"))
+    assert promoted is second and len(dedup) == 1
+    assert dedup.assign(_paper("v4.pdf", BASE))[0] == Path("v2.pdf")  # the failed paper is never reused
+
+    waiting = dedup.finished(PaperResult(Path("v2.pdf"), None, None, 1.0, summary="s"))
+    assert [p.pdf_path for p, _sim in waiting] == [Path("v3.pdf")]
+    assert dedup.results[Path("v2.pdf")].summary is None  # texts live in the results store
+    assert not dedup.wait(third, Path("v2.pdf"), 1.0)  # finished: reuse at once
+    assert dedup.assign(_paper("empty.pdf", "")) is None
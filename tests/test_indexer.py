@@ -0,0 +1,38 @@
+import numpy as np
+
+from src.indexer import QUERY_BLOCK, build_index, search, search_batch, top_k_indices
+
+DOCS = [
+    ("a #0", "transformers replace recurrence with self attention layers"),
+    ("a #1", "the optimizer schedule warms up the learning rate"),
+    ("b #0", "convolutional networks classify images with pooling"),
+    ("b #1", "attention maps highlight image regions for the classifier"),
+]
+
+
+def test_top_k_indices_are_the_best_first():
+    scores = np.array([0.1, 0.9, 0.3, 0.7, 0.5])
+    assert top_k_indices(scores, 3).tolist() == [1, 3, 4]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 4, 2, 0]
+    assert top_k_indices(scores, 0).tolist() == []
+    assert top_k_indices(np.array([]), 3).tolist() == []
+
+
+def test_batched_search_matches_one_query_at_a_time():
+    index = build_index(DOCS)
+    queries = ["self attention", "learning rate warmup", "image classifier"] * (QUERY_BLOCK // 2)
+    batched = search_batch(index, queries, k=2)
+    assert len(batched) == len(queries)
+    for query, hits in zip(queries[:3], batched[:3]):
+        assert hits == search(index, query, k=2)
+    assert batched[0][0][1] == DOCS[0]
+    assert batched[1][0][1] == DOCS[1]
+    assert batched[-1] == batched[2]  # across the query block boundary
+
+
+def test_label_filter_restricts_the_hits():
+    index = build_index(DOCS)
+    hits = search_batch(index, ["attention"], k=5, label_filter=lambda lbl: lbl.startswith("b "))[0]
+    assert [doc for _score, doc in hits][0] == DOCS[3]
+    assert {doc[0] for _score, doc in hits} <= {"b #0", "b #1"}
+    assert search_batch(index, ["attention"], label_filter=lambda lbl: False) == [[]]
@@ -0,0 +1,44 @@
+import pytest
+
+from src import llm_cache
+from src.llm_cache import ResponseCache, response_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_keys_depend_on_model_messages_and_params():
+    messages = [{"role": "user", "content": "hi"}]
+    key = response_key("m", messages, {"temperature": 0.2, "random_seed": 1})
+    assert key == response_key("m", list(messages), {"random_seed": 1, "temperature": 0.2})
+    assert key != response_key("m2", messages, {"temperature": 0.2, "random_seed": 1})
+    assert key != response_key("m", messages, {"temperature": 0.2, "random_seed": 2})
+    assert key != response_key("m", [{"role": "user", "content": "hi!"}], {"temperature": 0.2, "random_seed": 1})
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "cache.sqlite", max_entries=60)
+    for i in range(63):
+        clock[0] += 1
+        cache.put(f"k{i}", "m", f"v{i}")
+    clock[0] += 1
+    assert cache.get("k0") == "v0"  # touched: now the most recently used
+    cache.put("k63", "m", "v63")  # 64th write trims to max_entries
+    assert cache.stats()["evictions"] == 4
+    assert cache.get("k0") == "v0"
+    assert [cache.get(f"k{i}") for i in range(1, 5)] == [None] * 4
+    assert cache.get("k5") == "v5"
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "cache.sqlite", ttl_s=60)
+    cache.put("k", "m", "v")
+    clock[0] += 59
+    assert cache.get("k") == "v"  # reading does not extend the TTL
+    clock[0] += 2
+    assert cache.get("k") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0}
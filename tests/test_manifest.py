@@ -0,0 +1,47 @@
+import shutil
+
+import main
+from src.io_utils import atomic_write_text
+from src.manifest import RunManifest
+
+
+def test_only_unchanged_finished_papers_are_complete(tmp_path):
+    manifest = RunManifest(tmp_path / "manifest.sqlite")
+    pdf, summary = tmp_path / "a.pdf", tmp_path / "a_summary.md"
+    summary.write_text("s")
+    assert not manifest.is_complete(pdf, "h1", "c1")
+    manifest.mark_failed(pdf, "h1", "c1", "ValueError: boom")
+    assert not manifest.is_complete(pdf, "h1", "c1")
+    manifest.mark_done(pdf, "h1", "c1", summary, None, 1.5)
+    assert manifest.is_complete(pdf, "h1", "c1")
+    assert not manifest.is_complete(pdf, "h2", "c1")  # PDF changed
+    assert not manifest.is_complete(pdf, "h1", "c2")  # settings changed
+    assert not manifest.is_complete(pdf, "h1", "c1", stored=lambda _p: False)  # row missing from the store
+    summary.unlink()
+    assert not manifest.is_complete(pdf, "h1", "c1")  # output deleted
+    assert manifest.counts() == {"done": 1}
+    manifest.close()
+
+
+def test_atomic_write_leaves_no_temporary_file(tmp_path):
+    out = tmp_path / "sub" / "out.md"
+    atomic_write_text(out, "first")
+    atomic_write_text(out, "second")
+    assert out.read_text() == "second"
+    assert [p.name for p in out.parent.iterdir()] == ["out.md"]
+
+
+def test_resume_skips_papers_already_done(stub_llm, synthetic_pdfs, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)  # results/ goes here
+    data = tmp_path / "data"
+    data.mkdir()
+    shutil.copy(synthetic_pdfs[2], data / "resume_me.pdf")
+    common = ["batch", "--data-dir", str(data), "--no-dedup", "--workers", "1", "--llm-concurrency", "1"]
+    main.main(common)
+    assert "✅ Processed: resume_me.pdf" in capsys.readouterr().out
+    main.main([*common, "--resume"])
+    out = capsys.readouterr().out
+    assert "Processed" not in out and "skipped 1 paper(s)" in out
+    next((tmp_path / "results").rglob("resume_me*_summary.md")).unlink()
+    main.main([*common, "--resume"])
+    assert "✅ Processed: resume_me.pdf" in capsys.readouterr().out
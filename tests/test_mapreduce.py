@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from src import mapreduce
+from src.cache_utils import ExtractionCache
+from src.mapreduce import REDUCE_BUDGET_TOKENS, chunk_parts, group_by_content, map_reduce_summarize
+from src.text_utils import estimate_tokens
+from tests.conftest import API_KEY
+
+
+def _chunks(n, tag="x", size=1200):
+    return [f"{tag} chunk {i} " + "lorem ipsum dolor sit amet " * (size // 27) for i in range(n)]
+
+
+def test_chunk_parts_truncate_to_the_budget():
+    (key, text), = chunk_parts(["y" * 100_000], budget_tokens=100)
+    assert estimate_tokens(text) == 100
+    assert chunk_parts(["a"]) == chunk_parts(["a"]) and chunk_parts(["a"]) != chunk_parts(["b"])
+
+
+def test_groups_keep_order_and_respect_the_budget():
+    parts = chunk_parts(_chunks(200))
+    groups = group_by_content(parts, budget_tokens=2000, target_tokens=900)
+    assert [p for g in groups for p in g] == parts
+    assert all(sum(estimate_tokens(t) for _k, t in g) <= 2000 for g in groups)
+    assert 1 < len(groups) < len(parts)
+
+
+def test_group_boundaries_survive_an_insert_elsewhere():
+    parts = chunk_parts(_chunks(200))
+    edited = parts[:100] + chunk_parts(["an inserted chunk " * 60]) + parts[100:]
+    before = {tuple(k for k, _t in g) for g in group_by_content(parts, 6000, 900)}
+    after = {tuple(k for k, _t in g) for g in group_by_content(edited, 6000, 900)}
+    assert len(before - after) <= 2  # only the groups around the insert change
+
+
+def test_unchanged_nodes_are_reused_after_an_edit(stub_llm):
+    chunks = _chunks(60, tag="reuse", size=2000)  # the node cache is fresh per test session
+    _summary, first = map_reduce_summarize(API_KEY, "paper", chunks)
+    assert first.reused == 0 and first.calls > 3 and first.levels >= 2
+    _summary, again = map_reduce_summarize(API_KEY, "paper", chunks)
+    assert again.reused == again.calls == first.calls
+    chunks[30] += " edited"
+    _summary, edited = map_reduce_summarize(API_KEY, "paper", chunks)
+    # the edited path is recomputed; a moved boundary can split or merge one more group per level
+    assert 0 < edited.calls - edited.reused <= 2 * edited.levels
+
+
+class _VerboseClient:
+    """Replies far longer than the reduce budget, and records prompt sizes."""
+
+    def __init__(self):
+        self.prompt_tokens = []
+
+    async def acomplete(self, model, messages, temperature):
+        self.prompt_tokens.append(estimate_tokens(messages[-1]["content"]))
+        return "long reply " * (REDUCE_BUDGET_TOKENS * 2)
+
+
+def test_reduce_ends_with_oversized_parts(tmp_path, monkeypatch):
+    monkeypatch.setattr(mapreduce, "get_node_cache", lambda: ExtractionCache(tmp_path / "nodes"))
+    client, stats = _VerboseClient(), mapreduce.MapReduceStats()
+    for n in (1, 5):
+        parts = chunk_parts([f"part {n}-{i} " + "word " * (REDUCE_BUDGET_TOKENS * 3) for i in range(n)], 10**9)
+        reduce = mapreduce._reduce(client, asyncio.Semaphore(4), stats, "m", "t", parts, "merge", "final")
+        key, text = asyncio.run(asyncio.wait_for(reduce, timeout=30))
+        assert text.startswith("long reply")
+    assert max(client.prompt_tokens) <= REDUCE_BUDGET_TOKENS + 100  # parts cut to fit, plus the instructions
+
+
+def test_digest_of_no_papers_is_an_error(stub_llm):
+    with pytest.raises(ValueError):
+        mapreduce.corpus_digest(API_KEY, [("empty", [])])
@@ -0,0 +1,43 @@
+from src.metadata_utils import classify_line, layout_title, metadata_from_record
+
+FIRST_PAGE = """arXiv:1706.03762v5 [cs.CL] 6 Dec 2017
+Attention Is All You Need
+Ashish Vaswani, Noam Shazeer, Niki Parmar
+Google Brain
+avaswani@google.com
+Abstract
+The dominant sequence transduction models are based on complex recurrent networks.
+
+1 Introduction
+"""
+
+
+def test_lines_are_classified_in_one_pass():
+    assert classify_line("arXiv:1706.03762v5 [cs.CL] 6 Dec 2017") == {"banner"}
+    assert "affiliation" in classify_line("avaswani@google.com")
+    assert "abstract" in classify_line("Abstract")
+    assert classify_line("Attention Is All You Need") == frozenset()
+
+
+def test_text_heuristics_skip_banners_and_affiliations():
+    meta = metadata_from_record({"first_page": FIRST_PAGE})
+    assert meta["title"] == "Attention Is All You Need"
+    assert meta["authors"] == "Ashish Vaswani, Noam Shazeer, Niki Parmar"
+    assert meta["abstract"].startswith("The dominant sequence transduction models")
+
+
+def test_largest_font_run_wins_over_text_heuristics():
+    spans = [
+        [9.0, 10, 10, "arXiv:1706.03762v5 [cs.CL] 6 Dec 2017"],
+        [17.0, 100, 80, "Attention Is All"],
+        [17.0, 100, 100, "You Need"],
+        [10.0, 100, 130, "Ashish Vaswani, Noam Shazeer"],
+        *([10.0, 100, 160 + 12 * i, "The dominant sequence transduction models are based on networks."]
+          for i in range(6)),
+        [17.0, 100, 700, "Figure heading"],  # not contiguous with the title run
+    ]
+    assert layout_title(spans) == "Attention Is All You Need"
+    assert layout_title([[10.0, 0, 0, "Same size"], [10.2, 0, 10, "all the way down"]]) is None
+    record = {"first_page": "Abstract\nx", "first_page_spans": spans, "embedded_title": "Embedded"}
+    assert metadata_from_record(record)["title"] == "Attention Is All You Need"
+    assert metadata_from_record({**record, "first_page_spans": []})["title"] == "Embedded"
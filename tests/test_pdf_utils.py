@@ -0,0 +1,52 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+import main
+from src import pdf_utils
+from src.pdf_utils import iter_pdfs_text, list_pdfs
+
+
+@pytest.fixture
+def folder(synthetic_pdfs, tmp_path):
+    """Two readable papers around one that is not a PDF at all."""
+    data = tmp_path / "data"
+    data.mkdir()
+    shutil.copy(synthetic_pdfs[0], data / "a.pdf")
+    (data / "b.pdf").write_bytes(b"not a pdf")
+    shutil.copy(synthetic_pdfs[1], data / "c.pdf")
+    return data
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    """Paths the PDF backends actually open (cache misses)."""
+    paths = []
+    real = pdf_utils.open_document
+
+    def spy(pdf_path, extractor):
+        paths.append(Path(pdf_path).name)
+        return real(pdf_path, extractor)
+
+    monkeypatch.setattr(pdf_utils, "open_document", spy)
+    return paths
+
+
+def test_folder_text_is_read_lazily_and_skips_unreadable_files(folder, monkeypatch, capsys):
+    calls = []
+    real = pdf_utils.load_pdf_text
+    monkeypatch.setattr(pdf_utils, "load_pdf_text", lambda p: calls.append(p.name) or real(p))
+    pairs = iter_pdfs_text(list_pdfs(folder))
+    first, _text = next(pairs)
+    assert first.name == "a.pdf" and calls == ["a.pdf"]  # nothing past the first paper yet
+    assert [p.name for p, _text in pairs] == ["c.pdf"]
+    assert "[WARN] Failed to parse b.pdf" in capsys.readouterr().out
+
+
+def test_single_pdf_commands_parse_only_their_files(stub_llm, folder, opened, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    main.main(["pdf", str(folder / "a.pdf")])
+    main.main(["compare", str(folder / "a.pdf"), str(folder / "c.pdf")])
+    assert set(opened) <= {"a.pdf", "c.pdf"}  # the broken neighbour is never touched
+    assert (tmp_path / "results" / "comparisons" / "compare_a_vs_c.md").exists()
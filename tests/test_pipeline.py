@@ -0,0 +1,92 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from src import pipeline
+from src.extractors import Document
+from src.pdf_utils import ExtractionSettings, extraction_settings, set_extraction
+from tests.conftest import API_KEY
+
+
+@pytest.fixture
+def prepare_threads(monkeypatch):
+    """Replace prepare_paper with one that records its thread and fails, so no LLM call follows."""
+    threads = []
+
+    def fake_prepare(pdf_path, query, options=None):
+        threads.append(threading.current_thread())
+        raise RuntimeError("not parsed")
+
+    monkeypatch.setattr(pipeline, "prepare_paper", fake_prepare)
+    return threads
+
+
+@pytest.fixture
+def page_timeout():
+    previous = extraction_settings()
+    set_extraction(ExtractionSettings(page_timeout=5.0))
+    yield
+    set_extraction(previous)
+
+
+def test_default_options_leave_extraction_settings_alone(page_timeout, synthetic_pdfs):
+    pipeline.prepare_paper(synthetic_pdfs[0], "results")
+    assert extraction_settings() == ExtractionSettings(page_timeout=5.0)
+    pipeline.prepare_paper(synthetic_pdfs[0], "results", options=pipeline.PipelineOptions(page_timeout=9.0))
+    assert extraction_settings() == ExtractionSettings(page_timeout=9.0)  # explicit options (worker processes)
+
+
+def _run(tmp_path):
+    failed = []
+    pipeline.run_sequential(
+        [Path("a.pdf"), Path("b.pdf")], "q", pipeline.OutputDirs(tmp_path, tmp_path, tmp_path), "key",
+        on_error=lambda path, e: failed.append(path), prefetch_depth=1,
+    )
+    return failed
+
+
+def test_sequential_run_prepares_ahead_on_a_background_thread(prepare_threads, tmp_path):
+    assert len(_run(tmp_path)) == 2
+    assert all(t is not threading.main_thread() for t in prepare_threads)
+
+
+def test_page_timeout_keeps_preparation_on_the_main_thread(prepare_threads, page_timeout, tmp_path):
+    assert len(_run(tmp_path)) == 2
+    assert all(t is threading.main_thread() for t in prepare_threads)
+
+
+def test_document_backends_must_read_pages():
+    class _NoFirstPage(Document):
+        def page_text(self, index):
+            return ""
+
+    with pytest.raises(TypeError):
+        _NoFirstPage()
+
+
+def test_batch_pulls_paths_a_bounded_distance_ahead(stub_llm, synthetic_pdfs, tmp_path):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    paths = [broken, *synthetic_pdfs * 3]
+    pulled, in_flight, failed, threads = [], [], [], []
+
+    def lazy():
+        for p in paths:
+            pulled.append(p)
+            yield p
+
+    def on_result(r):
+        in_flight.append(len(pulled) - len(in_flight) - len(failed))
+        threads.append(threading.current_thread())
+
+    results = pipeline.run_batch(
+        lazy(), "results", pipeline.OutputDirs(tmp_path, tmp_path, tmp_path), API_KEY,
+        parse_workers=1, llm_concurrency=1, on_result=on_result,
+        options=pipeline.PipelineOptions(dedup_threshold=0.0),
+        on_error=lambda path, e: failed.append(path),
+    )
+    assert failed == [broken]
+    assert len(results) == len(paths) - 1 and all(r.summary_path.exists() for r in results)
+    assert max(in_flight) <= 1 * 2 + 1  # 2 * parse_workers + llm_concurrency, however long the input
+    assert all(t is threading.main_thread() for t in threads)
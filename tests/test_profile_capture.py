@@ -0,0 +1,15 @@
+import pstats
+
+import main
+
+
+def test_cprofile_capture_sees_paper_preparation(stub_llm, synthetic_pdfs, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # results/ goes here
+    profile = tmp_path / "profile.json"
+    main.main([
+        "batch", "--data-dir", str(synthetic_pdfs[0].parent), "--no-cache", "--no-dedup",
+        "--profile", str(profile), "--profile-capture", "cprofile",
+    ])
+    functions = {func for _file, _line, func in pstats.Stats(str(profile.with_suffix(".prof"))).stats}
+    # parsing, metadata and TF-IDF must run on the profiled (main) thread, not a prefetch thread
+    assert {"prepare_paper", "extract_pdf", "build_index"} <= functions
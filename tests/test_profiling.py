@@ -0,0 +1,62 @@
+import pytest
+
+from src import profiling
+
+
+def _profiling(on):
+    was = profiling.is_enabled()
+    profiling.enable(on)
+    yield
+    profiling.enable(was)
+
+
+@pytest.fixture
+def profiling_on():
+    yield from _profiling(True)
+
+
+@pytest.fixture
+def profiling_off():
+    yield from _profiling(False)
+
+
+def test_percentile_interpolates():
+    values = [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert profiling.percentile(values, 50) == 3.0
+    assert profiling.percentile(values, 95) == pytest.approx(4.8)
+    assert profiling.percentile([], 99) == 0.0
+
+
+def test_stages_are_free_no_ops_while_disabled(profiling_off):
+    with profiling.paper_scope("p") as records, profiling.stage("x") as st:
+        st.add(chars=1)
+    assert records == []
+
+
+def test_paper_scope_collects_nested_stages(profiling_on):
+    with profiling.paper_scope("paper-1") as records:
+        with profiling.stage("outer") as st:
+            st.add(chars=10)
+            with profiling.stage("inner"):
+                profiling.add(tokens=3)
+                profiling.add(tokens=2)
+    assert [(r["stage"], r["parent"], r["paper"]) for r in records] == [
+        ("inner", "outer", "paper-1"), ("outer", None, "paper-1"),
+    ]
+    assert records[0]["tokens"] == 5 and records[1]["chars"] == 10
+
+
+def test_report_counts_nested_stages_once_per_paper():
+    recs = [
+        {"paper": "a", "stage": "extract", "parent": None, "wall_s": 2.0, "cpu_s": 1.0, "bytes": 100},
+        {"paper": "a", "stage": "ocr", "parent": "extract", "wall_s": 1.5, "cpu_s": 1.0},
+        {"paper": "b", "stage": "extract", "parent": None, "wall_s": 4.0, "cpu_s": 3.0, "bytes": 50},
+        {"paper": None, "stage": "index", "parent": None, "wall_s": 1.0, "cpu_s": 1.0},
+    ]
+    report = profiling.report(recs)
+    assert report["papers"]["a"]["wall_s"] == 2.0  # ocr ran inside extract
+    assert report["papers"]["a"]["stages"]["ocr"]["count"] == 1
+    extract = report["stages"]["extract"]
+    assert extract["count"] == 2 and extract["bytes"] == 150
+    assert extract["wall_s"] == {"total": 6.0, "p50": 3.0, "p95": 3.9, "p99": 3.98, "max": 4.0}
+    assert report["paper_wall_s"]["max"] == 4.0 and "index" in report["stages"]
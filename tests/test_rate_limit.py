@@ -0,0 +1,39 @@
+import pytest
+
+from src import llm_client
+from src.llm_client import RateLimiter, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_client.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_starts_full_and_reports_the_wait_for_overdraft(clock):
+    bucket = TokenBucket(60)  # one per second
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    assert bucket.reserve(2) == pytest.approx(3.0)  # queued behind the first overdraft
+
+
+def test_bucket_refills_continuously_up_to_capacity(clock):
+    bucket = TokenBucket(120)  # two per second
+    bucket.reserve(120)
+    clock[0] += 10
+    assert bucket.reserve(20) == 0.0
+    assert bucket.reserve(1) == pytest.approx(0.5)
+    clock[0] += 3600
+    assert bucket.reserve(120) == 0.0  # an hour idle still only holds one minute's worth
+
+
+def test_adjust_settles_estimates_against_real_usage(clock):
+    limiter = RateLimiter(rpm=None, tpm=600)  # ten tokens per second
+    assert limiter.reserve(600) == 0.0
+    limiter.settle(reserved=600, actual=500)  # refund the overestimate
+    assert limiter.reserve(100) == 0.0
+    limiter.settle(reserved=100, actual=200)  # charge the underestimate
+    assert limiter.reserve(0) == pytest.approx(10.0)
+    limiter.settle(reserved=0, actual=None)  # unknown usage keeps the estimate
+    assert limiter.reserve(0) == pytest.approx(10.0)
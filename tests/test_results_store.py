@@ -0,0 +1,93 @@
+import csv
+import shutil
+import sqlite3
+
+import main
+from src.report_utils import STORE_COLUMNS, write_report
+from src.results_store import ResultsStore
+
+
+def _on_disk(path):
+    with sqlite3.connect(str(path)) as db:
+        return db.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+
+def test_rows_are_written_a_batch_at_a_time(tmp_path):
+    db = tmp_path / "results.sqlite"
+    store = ResultsStore(db, batch_size=2, flush_interval=3600)
+    store.put({"pdf_path": tmp_path / "a.pdf", "file": "a.pdf"})
+    assert store.contains(tmp_path / "a.pdf")  # pending rows count as stored
+    assert _on_disk(db) == 0
+    store.put({"pdf_path": tmp_path / "b.pdf", "file": "b.pdf"})
+    assert _on_disk(db) == 2
+    store.put({"pdf_path": tmp_path / "a.pdf", "file": "a.pdf", "title": "again"})
+    store.close()
+    assert _on_disk(db) == 2  # one row per paper, the latest wins
+    rows = list(ResultsStore(db, readonly=True).rows(columns=("file", "title")))
+    assert rows == [{"file": "a.pdf", "title": "again"}, {"file": "b.pdf", "title": None}]
+
+
+def test_report_filters_on_run_id(tmp_path):
+    store = ResultsStore(tmp_path / "results.sqlite")
+    for name, run in (("a.pdf", "r1"), ("b.pdf", "r2"), ("c.pdf", "r2")):
+        store.put({"pdf_path": tmp_path / name, "file": name, "query": "q", "run_id": run})
+    out = tmp_path / "report.csv"
+    assert write_report(store.rows("WHERE run_id = ?", ("r2",), columns=STORE_COLUMNS), out) == 2
+    with out.open(newline="") as f:
+        assert [row["file"] for row in csv.DictReader(f)] == ["b.pdf", "c.pdf"]
+    store.mark_run(tmp_path / "a.pdf", "r2")  # reused as stored by run r2
+    assert [r["file"] for r in store.rows("WHERE run_id = ?", ("r2",), columns=("file",))] == ["a.pdf", "b.pdf", "c.pdf"]
+    store.close()
+
+
+def _report_files(path):
+    with path.open(newline="") as f:
+        return sorted(row["file"] for row in csv.DictReader(f))
+
+
+def test_batch_report_covers_only_the_current_run(stub_llm, synthetic_pdfs, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # results/ goes here
+    first, second = tmp_path / "first", tmp_path / "second"
+    for folder, pdf in ((first, synthetic_pdfs[0]), (second, synthetic_pdfs[1])):
+        folder.mkdir()
+        shutil.copy(pdf, folder / pdf.name)
+    common = ["--no-markdown", "--no-dedup", "--workers", "1", "--llm-concurrency", "1"]
+    report = tmp_path / "results" / "batch_report.csv"
+
+    main.main(["batch", "--data-dir", str(first), *common])
+    assert _report_files(report) == [synthetic_pdfs[0].name]
+    main.main(["batch", "--data-dir", str(second), *common])
+    assert _report_files(report) == [synthetic_pdfs[1].name]
+    main.main(["batch", "--data-dir", str(second), "--all-runs", *common])
+    assert {synthetic_pdfs[0].name, synthetic_pdfs[1].name} <= set(_report_files(report))
+    report.unlink()
+    main.main(["batch", "--data-dir", str(second), "--no-report", *common])
+    assert not report.exists()
+
+
+def test_resumed_run_reports_the_papers_it_skipped(stub_llm, synthetic_pdfs, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    data = tmp_path / "data"
+    data.mkdir()
+    for pdf in synthetic_pdfs[:2]:
+        shutil.copy(pdf, data / f"resumed_{pdf.name}")
+    common = ["batch", "--data-dir", str(data), "--no-markdown", "--no-dedup", "--workers", "1", "--llm-concurrency", "1"]
+    report = tmp_path / "results" / "batch_report.csv"
+    main.main(common)
+    before = _report_files(report)
+    assert len(before) == 2
+    main.main([*common, "--resume"])
+    assert "skipped 2 paper(s)" in capsys.readouterr().out
+    assert _report_files(report) == before  # the skipped papers are this run's results too
+
+
+def test_an_empty_run_keeps_the_existing_report(stub_llm, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    report = tmp_path / "results" / "batch_report.csv"
+    report.parent.mkdir()
+    report.write_text("timestamp,file\nx,a.pdf\n")
+    empty = tmp_path / "empty"
+    empty.mkdir()
+    main.main(["batch", "--data-dir", str(empty), "--workers", "1", "--llm-concurrency", "1"])
+    assert "kept" in capsys.readouterr().out
+    assert report.read_text() == "timestamp,file\nx,a.pdf\n"
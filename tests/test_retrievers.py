@@ -0,0 +1,78 @@
+import shutil
+
+import numpy as np
+import pytest
+
+from src import retrievers
+from src.corpus_index import CorpusIndex, paper_key
+from src.retrievers import RRF_K, DenseIndex, DenseRetriever, HybridRetriever, Retriever, get_retriever
+
+
+class _Fixed(Retriever):
+    def __init__(self, rows, corpus=None):
+        self.rows = rows
+        self.corpus = corpus
+
+    def rank_batch(self, queries, k=5, paper=None):
+        return [[(1.0, row) for row in self.rows[:k]] for _q in queries]
+
+
+def test_reciprocal_rank_fusion_sums_over_backends():
+    hybrid = HybridRetriever([_Fixed([7, 3, 5]), _Fixed([3, 9])], depth=1)
+    (fused,) = hybrid.rank_batch(["q"], k=3)
+    assert [row for _score, row in fused] == [3, 7, 9]
+    assert fused[0][0] == 1 / (RRF_K + 2) + 1 / (RRF_K + 1)
+    deeper = HybridRetriever([_Fixed([7, 3, 5]), _Fixed([3, 9])], depth=2)
+    assert deeper.rank_batch(["q"], k=1)[0][0][1] == 3  # fused over k*depth candidates per backend
+
+
+def test_same_named_papers_stay_separate(synthetic_pdfs, tmp_path):
+    paths = []
+    for i, pdf in enumerate(synthetic_pdfs[:2]):
+        folder = tmp_path / f"v{i}"
+        folder.mkdir()
+        paths.append(shutil.copy(pdf, folder / "paper.pdf"))
+    corpus = CorpusIndex.load(tmp_path / "index")
+    corpus.update(paths)
+    query = " ".join(corpus.chunk_text(0).split()[:6])
+    for name in ("tfidf", "dense", "hybrid"):
+        ranked = get_retriever(name, corpus).rank_batch([query], k=len(corpus))[0]
+        rows = [row for _score, row in ranked]
+        assert len(rows) == len(set(rows)) and 0 in rows
+        assert {corpus.row_paper(row)["path"] for row in rows} == {str(p) for p in paths}, name
+
+
+def test_retrievers_must_rank():
+    class _NoRank(Retriever):
+        pass
+
+    with pytest.raises(TypeError):
+        _NoRank()
+
+
+def _dense_after_append(synthetic_pdfs, tmp_path):
+    corpus = CorpusIndex.load(tmp_path / "index")
+    corpus.update(synthetic_pdfs[:2])
+    fitted = DenseRetriever.open(corpus).dense
+    fitted_meta, components = dict(fitted.meta), np.array(fitted.arrays["components"])
+    corpus.update(synthetic_pdfs)  # append-only: no rows die, no compaction
+    return corpus, fitted_meta, components, DenseRetriever.open(corpus).dense
+
+
+def test_small_appends_extend_the_dense_index(synthetic_pdfs, tmp_path, monkeypatch):
+    monkeypatch.setattr(retrievers, "DENSE_REFIT_FRACTION", 1.0)
+    corpus, fitted_meta, components, dense = _dense_after_append(synthetic_pdfs, tmp_path)
+    assert dense.meta["fit_rows"] == fitted_meta["fit_rows"] < len(corpus)
+    assert dense.meta["rows"] == corpus.n_rows
+    assert np.array_equal(np.asarray(dense.arrays["components"]), components)  # no refit
+    assert sorted(np.asarray(dense.arrays["ivf_rows"]).tolist()) == np.flatnonzero(corpus.alive).tolist()
+    new_paper = corpus.papers[paper_key(synthetic_pdfs[2])]["rows"]
+    ranked = DenseRetriever(corpus, dense, nprobe=dense.meta["nlist"]).rank_batch([corpus.chunk_text(new_paper[0])], k=1)
+    assert ranked[0][0][1] == new_paper[0]
+
+
+def test_large_appends_refit_the_dense_index(synthetic_pdfs, tmp_path, monkeypatch):
+    monkeypatch.setattr(retrievers, "DENSE_REFIT_FRACTION", 0.0)
+    corpus, _fitted_meta, _components, dense = _dense_after_append(synthetic_pdfs, tmp_path)
+    assert dense.meta["fit_rows"] == len(corpus)
+    assert dense.meta["corpus_version"] == DenseIndex.corpus_version(corpus)
@@ -0,0 +1,56 @@
+import shutil
+
+import pytest
+
+from src.options import PipelineOptions
+from src.pdf_utils import ExtractionSettings, extraction_settings, set_extraction
+from src.server import BadRequest, QueryService
+
+
+@pytest.fixture
+def service(synthetic_pdfs, tmp_path):
+    papers = tmp_path / "papers"
+    papers.mkdir()
+    for pdf in synthetic_pdfs:
+        shutil.copy(pdf, papers / pdf.name)
+    svc = QueryService(tmp_path / "index", lambda: sorted(papers.glob("*.pdf")))
+    svc.reload()
+    return svc, papers
+
+
+@pytest.mark.parametrize("k", ["five", 2.5, None, 0, True])
+def test_search_rejects_bad_k(service, k):
+    svc, _papers = service
+    with pytest.raises(BadRequest):
+        svc.search({"query": "results", "k": k})
+
+
+def test_search_returns_k_hits(service):
+    svc, _papers = service
+    assert len(svc.search({"query": "results", "k": 2})["hits"]) == 2
+
+
+def test_reload_survives_a_pdf_deleted_after_listing(service):
+    svc, papers = service
+    victim = sorted(papers.glob("*.pdf"))[0]
+    listed = sorted(papers.glob("*.pdf"))
+    victim.unlink()
+    svc.sources = lambda: listed  # still names the deleted file
+    stats = svc.reload()
+    assert stats["removed"] == 1 and stats["unchanged"] == len(listed) - 1
+    assert len(svc.index.papers) == len(listed) - 1
+
+
+def test_unindexed_papers_are_parsed_with_the_serve_options(service, synthetic_pdfs, tmp_path):
+    svc, _papers = service
+    outside = shutil.copy(synthetic_pdfs[0], tmp_path / "not_indexed.pdf")
+    previous = extraction_settings()
+    try:
+        set_extraction(ExtractionSettings(page_timeout=7.0))
+        assert svc._hits(outside, "results")  # a service without options keeps the process settings
+        assert extraction_settings() == ExtractionSettings(page_timeout=7.0)
+        svc.options = PipelineOptions(page_timeout=3.0)
+        assert svc._hits(outside, "results")
+        assert extraction_settings() == ExtractionSettings(page_timeout=3.0)
+    finally:
+        set_extraction(previous)
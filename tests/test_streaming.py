@@ -0,0 +1,50 @@
+import uuid
+
+import pytest
+
+from src import pipeline
+from src.io_utils import MarkdownStream
+from src.llm_client import get_client
+from tests.conftest import API_KEY
+
+
+def test_markdown_stream_writes_a_partial_file_until_finished(tmp_path):
+    out_path = tmp_path / "summaries" / "paper.md"
+    with MarkdownStream(out_path, "# Summary\n") as out:
+        assert out.ttft is None
+        out.write("first ")
+        out.write("second")
+        assert out.partial_path.read_text(encoding="utf-8") == "# Summary\nfirst second"  # flushed as it goes
+        assert not out_path.exists()
+        out.finish("# Summary\nfinal")
+    assert out.ttft is not None and out.ttft >= 0
+    assert out_path.read_text(encoding="utf-8") == "# Summary\nfinal"
+    assert not out.partial_path.exists()
+
+
+def test_an_interrupted_stream_keeps_its_partial_file(tmp_path):
+    with pytest.raises(RuntimeError):
+        with MarkdownStream(tmp_path / "paper.md") as out:
+            out.write("half a reply")
+            raise RuntimeError("connection dropped")
+    assert out.partial_path.read_text(encoding="utf-8") == "half a reply"
+    assert not (tmp_path / "paper.md").exists()
+
+
+def test_streamed_deltas_add_up_to_the_reply(stub_llm):
+    pieces = []
+    messages = [{"role": "user", "content": f"Summarize the streaming paper {uuid.uuid4().hex}"}]
+    content = get_client(API_KEY).complete(model="stub", messages=messages, on_delta=pieces.append)
+    assert len(pieces) > 1
+    assert "".join(pieces) == content
+
+
+def test_streamed_paper_reports_time_to_first_token(stub_llm, synthetic_pdfs, tmp_path):
+    dirs = pipeline.OutputDirs(tmp_path, tmp_path, tmp_path)
+    options = pipeline.PipelineOptions(stream=True)
+    paper = pipeline.prepare_paper(synthetic_pdfs[0], "main results", options=options)
+    result = pipeline.write_outputs(paper, "main results", dirs, API_KEY, options)
+    assert result.ttft is not None and result.ttft <= result.duration
+    assert result.summary_path.read_text(encoding="utf-8").strip()
+    assert "## Key Results" in result.analysis_path.read_text(encoding="utf-8")
+    assert not list(tmp_path.glob("*.partial"))
@@ -0,0 +1,128 @@
+import asyncio
+import itertools
+import uuid
+
+import pytest
+
+from src import llm_client
+from src.workflows import (
+    PromptTemplate, _Cluster, _vote, answers_agree, final_answer, normalize_answer, self_consistency,
+)
+from tests.conftest import API_KEY
+
+
+def test_render_fills_every_placeholder():
+    t = PromptTemplate("t", "Q: {query}\nC: {context}\nQ again: {query}")
+    assert t.fields == {"query", "context"}
+    assert t.render(query="why?", context="ctx", extra=1) == "Q: why?\nC: ctx\nQ again: why?"
+
+
+def test_render_names_missing_fields():
+    with pytest.raises(KeyError, match="context"):
+        PromptTemplate("t", "{query} {context}").render(query="q")
+
+
+def test_final_answer_takes_the_last_marked_line():
+    assert final_answer("x\nFINAL ANSWER: first\nmore\nfinal answer:  second \n") == "second"
+    assert final_answer("no marker\nlast line\n\n") == "last line"
+    assert final_answer("") == ""
+
+
+def test_answers_are_normalized_before_voting():
+    assert normalize_answer("The answer is 42.") == normalize_answer("42") == normalize_answer("It is 42.0!")
+    assert normalize_answer("It isn't true") == normalize_answer("it is NOT true")
+    assert normalize_answer("The answer is 42") != normalize_answer("The answer is 43")
+
+
+def test_only_longer_answers_agree_on_overlap():
+    long = "the model replaces recurrence with stacked self attention layers"
+    assert answers_agree(normalize_answer(long), normalize_answer(long.replace("stacked ", "")))
+    assert not answers_agree(normalize_answer("uses self attention"), normalize_answer("uses attention"))
+    assert not answers_agree(normalize_answer(long + " in 6 layers"), normalize_answer(long + " in 8 layers"))
+    assert not answers_agree(normalize_answer(long), normalize_answer(long.replace("replaces", "does not replace")))
+
+
+def test_vote_groups_replies_by_final_answer():
+    clusters = []
+    for reply in (
+        "Reasoning about layers...\nFINAL ANSWER: The answer is 42.",
+        "Different reasoning entirely.\nFINAL ANSWER: 42",
+        "FINAL ANSWER: 43",
+        "FINAL ANSWER: It is 42.0",
+    ):
+        _vote(clusters, reply, final_answer)
+    assert [len(c.replies) for c in clusters] == [3, 1]
+    assert isinstance(clusters[0], _Cluster)
+
+
+class _ScriptedClient:
+    """Answers by seed after a short delay and records when each sample starts and ends."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.events = []
+
+    async def acomplete(self, model, messages, temperature, random_seed=None):
+        if random_seed is None:
+            return "FINAL ANSWER: verified"
+        self.events.append(("start", random_seed))
+        await asyncio.sleep(0.01 * (1 + random_seed % 3))
+        self.events.append(("end", random_seed))
+        return f"FINAL ANSWER: {self.answers[random_seed]}"
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture
+def scripted(monkeypatch):
+    def install(answers):
+        client = _ScriptedClient(answers)
+        monkeypatch.setitem(llm_client._clients, "scripted-key", client)
+        return client
+    return install
+
+
+def test_agreeing_samples_stop_after_the_first_wave(scripted):
+    client = scripted(["The answer is 42.", "42", "It is 42.0", "7", "7"])
+    r = self_consistency("scripted-key", "q", "ctx", samples=5, agree=3)
+    assert r.stats.agreed and not r.stats.verified
+    assert r.final == "The answer is 42."
+    assert sorted(seed for kind, seed in client.events if kind == "start") == [0, 1, 2]
+
+
+def test_disagreeing_samples_start_the_rest_in_one_wave(scripted):
+    client = scripted(["1", "2", "3", "1", "1", "5", "6"])
+    r = self_consistency("scripted-key", "q", "ctx", samples=7, agree=3)
+    second = [i for i, (kind, seed) in enumerate(client.events) if seed >= 3]
+    starts = [i for i in second if client.events[i][0] == "start"]
+    ends = [i for i in second if client.events[i][0] == "end"]
+    assert len(starts) == 4 and max(starts) < min(ends)  # all remaining samples in flight together
+    assert r.stats.agreed and normalize_answer(r.final) == normalize_answer("1")
+
+
+def test_no_consensus_runs_the_verification_pass(scripted):
+    scripted(["1", "2", "3", "4", "5"])
+    r = self_consistency("scripted-key", "q", "ctx", samples=5, agree=3)
+    assert not r.stats.agreed and r.stats.verified
+    assert r.stats.samples_run + r.stats.samples_cancelled == 5  # stops once consensus is out of reach
+    assert r.stats.votes == [1] * r.stats.samples_run
+    assert r.final == "verified"
+
+
+def test_savings_leave_out_a_verification_that_never_ran(stub_llm):
+    r = self_consistency(API_KEY, f"q-{uuid.uuid4()}", "context", samples=5, agree=3, extract=lambda _r: "same")
+    assert r.stats.agreed and not r.stats.verified
+    assert (r.stats.samples_run, r.stats.samples_cancelled) == (3, 0)
+    assert r.stats.tokens_used > 0
+    # baseline is five samples only: two were saved
+    assert r.stats.tokens_saved == round(r.stats.tokens_used * 2 / 3)
+
+
+def test_savings_count_a_verification_that_ran_in_both_sides(stub_llm):
+    distinct = itertools.count()
+    r = self_consistency(API_KEY, f"q-{uuid.uuid4()}", "context", samples=3, agree=3,
+                         extract=lambda _r: f"answer {next(distinct)}")
+    assert r.stats.verified and not r.stats.agreed
+    assert r.stats.samples_run == 3
+    assert r.stats.tokens_saved == 0